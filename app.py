@@ -1,60 +1,50 @@
 
 import streamlit as st 
+import streamlit.components.v1 as components
 import requests
-import json
 import os
-from utils.schemas import RawMeasurement
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.dates as mdates
 import plotly.express as px
 
-import fitz
-from llm.agent import invoke
+from llm.agent import stream
+from llm import documents
+from ui import charts, live
+from ui.cache import MeasurementCache
+from data.store import import_json
+from data.tiers import TieredStore
+from utils import metrics
 
 st.set_page_config(page_title="Enerji AI Asistanı", layout="wide")
 
+# LLM/önbellek metrikleri bu süreçte toplanır; Prometheus APP_METRICS_PORT'tan kazır
+metrics.serve()
 
 
-# ----- PDF READER -----
-def read_pdf_text(uploaded_file):
-    text = ""
-    with fitz.open(stream=uploaded_file.read(), filetype="pdf") as doc:
-        for page in doc:
-            text += page.get_text()
-    return text.strip()
-
 
 PRED_ENDPOINT = "http://localhost:8002/predict"
+COLLECTOR_URL = os.getenv("COLLECTOR_URL", "http://localhost:8000")
 
 st.sidebar.title("Breaker ➞ Makine Eşleme")
 st.sidebar.text("Sürükle‑bırak diyagram ileride gelecek…")
 
-# ----- Verileri JSON dosyasından oku -----
-if "measurements" not in st.session_state:
-    st.session_state.measurements = []
-
-    with open(r"C:\Users\sozcu\Desktop\sample.json", "r") as f:
-        data = json.load(f)
-
-    for item in data:
-        measurement = RawMeasurement(
-            timestamp=datetime.fromisoformat(item["timestamp"]),
-            breaker_id=item["breaker_id"],
-            metrics={
-                "voltage": item.get("voltage", 0),
-                "current": item.get("current", 0),
-                "active_power": item.get("active_power", 0),
-                "energy": item.get("energy", 0),
-                "reactive_power": 0,
-                "apparent_power": 0,
-                "power_factor": 0.9,
-                "leakage_current": item.get("leakage_current", 0),
-                "temperature": 25
-            }
-        )
-        st.session_state.measurements.append(measurement)
+# ----- Ölçüm önbelleği (tüm oturumlar için süreç başına tek kopya) -----
+SAMPLE_JSON = os.getenv("SAMPLE_JSON", r"C:\Users\sozcu\Desktop\sample.json")
+
+
+@st.cache_resource
+def get_measurement_cache() -> MeasurementCache:
+    store = TieredStore()
+    # Depo boşsa örnek JSON bir kez içe aktarılır
+    if not store.breakers() and os.path.exists(SAMPLE_JSON):
+        import_json(SAMPLE_JSON, store.raw)
+    return MeasurementCache(store)
+
+
+cache = get_measurement_cache()
+cache.refresh()
 
 # ----- TABS -----
 tab_dash, tab_upload, tab_chat = st.tabs(["📊 Dashboard", "📂 PDF Upload", "🤖 Chatbot"])
@@ -73,40 +63,52 @@ with tab_dash:
         voltage = st.number_input("Gerilim (V)", value=230.0)
 
         if st.button("Gönder"):
-            measurement = RawMeasurement(
-                timestamp=datetime.utcnow(),
-                breaker_id=breaker_id,
-                metrics={
-                    "current": current,
-                    "voltage": voltage,
-                    "active_power": current * voltage / 1000,
-                    "energy": (current * voltage / 1000) * 1,
-                    "reactive_power": 0,
-                    "apparent_power": 0,
-                    "power_factor": 0.9,
-                    "leakage_current": 0,
-                    "temperature": 25
-                }
-            )
-            st.session_state.measurements.append(measurement)
+            # Okuma ortak depoya doğrudan yazılmaz; collector'ın doğrulama ve ingest yolundan geçer
+            active_power = current * voltage / 1000
+            try:
+                resp = requests.post(f"{COLLECTOR_URL}/ingest", timeout=5, json={
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "breaker_id": breaker_id,
+                    "metrics": {
+                        "current": current,
+                        "voltage": voltage,
+                        "active_power": active_power,
+                        "energy": active_power * 1,
+                        "reactive_power": 0,
+                        "apparent_power": 0,
+                        "power_factor": 0.9,
+                        "leakage_current": 0,
+                        "temperature": 25,
+                    },
+                })
+            except requests.RequestException as e:
+                st.warning(f"Collector'a ulaşılamadı: {e}")
+            else:
+                if resp.status_code == 200:
+                    st.success("Okuma gönderildi; depoya aktarıldığında grafiklerde görünür.")
+                else:
+                    st.warning(f"Collector okumayı kabul etmedi ({resp.status_code}): {resp.text[:200]}")
 
     with col2:
         if st.button("24 saat Tahmin"):
-            js = [m.model_dump_json() for m in st.session_state.measurements]
-            resp = requests.post(PRED_ENDPOINT, json={"data": js}).json()
-            st.metric("Beklenen Fatura (TL)", resp["expected_cost"])
+            # Geçmiş gönderilmez; servis özellikleri kendi deposundan son 24 saatten çıkarır
+            try:
+                resp = requests.post(PRED_ENDPOINT, timeout=10,
+                                     json={"breaker_ids": cache.breakers(), "horizon_hours": 24})
+            except requests.RequestException as e:
+                st.error(f"Tahmin servisine ulaşılamadı: {e}")
+            else:
+                if resp.status_code == 200:
+                    st.metric("Beklenen Fatura (TL)", resp.json()["expected_cost"])
+                else:
+                    st.warning(f"Tahmin servisi şu an cevap veremiyor ({resp.status_code}), lütfen tekrar deneyin.")
 
 # -----------------------------------------------------------
 # PDF UPLOAD TAB
 # -----------------------------------------------------------
 with tab_upload:
-    valid_measurements = st.session_state.measurements
-
-    breaker_energy = {}
-    for m in valid_measurements:
-        brk = m.breaker_id
-        energy = getattr(m.metrics, "energy", 0)
-        breaker_energy[brk] = breaker_energy.get(brk, 0) + energy
+    # Bölüm başına önceden hesaplanmış toplamlardan; satırlar üzerinde döngü yok
+    breaker_energy = cache.energy_by_breaker()
 
     st.subheader("⚡ Breaker'lara Göre Enerji Payı")
     if len(breaker_energy) >= 2:
@@ -128,7 +130,7 @@ with tab_upload:
     if "device_counter" not in st.session_state:
         st.session_state.device_counter = 0
     if "breakers" not in st.session_state:
-        st.session_state.breakers = list(set([m.breaker_id for m in st.session_state.measurements]))
+        st.session_state.breakers = cache.breakers()
 
     breakers_with_new = st.session_state.breakers + ["➕ Yeni Breaker…"]
     selection = st.selectbox("Breaker ID seç", breakers_with_new, key="sel_breaker")
@@ -161,8 +163,8 @@ with tab_upload:
                 try:
                     dev["cihaz_pdf"] = pdf_file.name
                     dev["file_obj"] = pdf_file
-                    pdf_text = read_pdf_text(pdf_file)
-                    dev["pdf_text"] = pdf_text
+                    # İçerik hash'iyle bir kez çıkarılıp parçalanır ve indekslenir; rerun'larda tekrar işlenmez
+                    dev["pdf_id"] = documents.index.add_pdf(pdf_file.getvalue())
 
                 except Exception as e:
                     st.error(f"PDF okunurken hata oluştu: {e}")
@@ -200,46 +202,47 @@ with tab_upload:
 
     if st.button("📊 Grafiği Göster"):
         metric_key = {"Aktif Güç": "active_power", "Akım": "current", "Gerilim": "voltage"}[grafik_tipi]
-        measurements = [m for m in st.session_state.measurements if m.breaker_id == grafik_breaker]
-        zamanlar = [m.timestamp for m in measurements]
-        degerler = [m.metrics.dict().get(metric_key, 0) for m in measurements]
-
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax.plot(zamanlar, degerler, marker="o", linestyle="-")
-        ax.set_title(f"{grafik_tipi} - {grafik_breaker} ({zaman_araligi})", fontsize=14)
-        ax.set_xlabel("Zaman", fontsize=12)
-        ax.set_ylabel(grafik_tipi, fontsize=12)
-        ax.grid(True)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b\n%H:%M'))
-        fig.autofmt_xdate()
-        st.pyplot(fig)
+        # Breaker + pencere indeksle okunur, grafik genişliği kadar noktaya indirgenir
+        seri = charts.series(grafik_breaker, metric_key, window=zaman_araligi, store=cache)
+
+        if seri.empty:
+            st.warning(f"{grafik_breaker} için {zaman_araligi.lower()} içinde ölçüm yok.")
+        else:
+            fig, ax = plt.subplots(figsize=(10, 4))
+            ax.plot(seri["timestamp"], seri[metric_key], linestyle="-", linewidth=1)
+            ax.set_title(f"{grafik_tipi} - {grafik_breaker} ({zaman_araligi})", fontsize=14)
+            ax.set_xlabel("Zaman", fontsize=12)
+            ax.set_ylabel(grafik_tipi, fontsize=12)
+            ax.grid(True)
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b\n%H:%M'))
+            fig.autofmt_xdate()
+            st.pyplot(fig)
         st.markdown("---")
 
     st.subheader("Anlık Grafik Takibi")
     alternatif_grafik_tipi = st.radio("Anlık Grafik Türü", ["Sıcaklık", "Güç Faktörü", "Kaçak Akım"], horizontal=True)
+    metric_key_b = {"Sıcaklık": "temperature", "Güç Faktörü": "power_factor",
+                    "Kaçak Akım": "leakage_current"}[alternatif_grafik_tipi]
 
-    if st.button("Grafiği Göster"):
-        saat_sayisi_b = 48
-        measurements = st.session_state.measurements[-saat_sayisi_b:]
-        zamanlar_b = [m.timestamp for m in measurements]
-
-        if alternatif_grafik_tipi == "Sıcaklık":
-            degerler_b = [getattr(m.metrics, "temperature", 25) for m in measurements]
-        elif alternatif_grafik_tipi == "Güç Faktörü":
-            degerler_b = [getattr(m.metrics, "power_factor", 0.9) for m in measurements]
-        elif alternatif_grafik_tipi == "Kaçak Akım":
-            degerler_b = [getattr(m.metrics, "leakage_current", 0) for m in measurements]
-        else:
-            degerler_b = [0 for _ in measurements]
+    # Tarayıcı collector'ın canlı akışına abone olur; yeni okumalar rerun/polling olmadan eklenir
+    components.html(live.chart_html(grafik_breaker, metric_key_b, alternatif_grafik_tipi), height=360)
+
+    if st.button("Son 48 Saati Göster"):
+        # Kısa süreli tepeler kaybolmasın diye min/max kovaları
+        seri_b = charts.series(grafik_breaker, metric_key_b, window="Son 48 Saat", method="minmax",
+                               store=cache)
 
-        fig_b, ax_b = plt.subplots(figsize=(10, 4))
-        ax_b.plot(zamanlar_b, degerler_b, color="orange", marker="x", linestyle="--")
-        ax_b.set_title(f"{alternatif_grafik_tipi} - {grafik_breaker} (Son 48 Saat)")
-        ax_b.set_xlabel("Zaman")
-        ax_b.set_ylabel(alternatif_grafik_tipi)
-        ax_b.grid(True)
-        fig_b.autofmt_xdate()
-        st.pyplot(fig_b)
+        if seri_b.empty:
+            st.warning(f"{grafik_breaker} için son 48 saatte ölçüm yok.")
+        else:
+            fig_b, ax_b = plt.subplots(figsize=(10, 4))
+            ax_b.plot(seri_b["timestamp"], seri_b[metric_key_b], color="orange", linestyle="--", linewidth=1)
+            ax_b.set_title(f"{alternatif_grafik_tipi} - {grafik_breaker} (Son 48 Saat)")
+            ax_b.set_xlabel("Zaman")
+            ax_b.set_ylabel(alternatif_grafik_tipi)
+            ax_b.grid(True)
+            fig_b.autofmt_xdate()
+            st.pyplot(fig_b)
 
 # -----------------------------------------------------------
 # CHATBOT TAB
@@ -274,9 +277,14 @@ with tab_chat:
     # 🧠 Cevap bekleniyorsa, invoke et ve input gizliyken cevapla
     elif st.session_state.awaiting_response and "last_prompt" in st.session_state:
         prompt = st.session_state.last_prompt
-        response = invoke({"input": prompt, "devices": st.session_state.get("devices", [])})
-        st.chat_message("assistant").markdown(response["output"])
-        st.session_state.messages.append({"role": "assistant", "content": response["output"]})
+        # Cevap token token akarken mesaj kutusu güncellenir
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            output = ""
+            for output in stream({"input": prompt, "devices": st.session_state.get("devices", [])}):
+                placeholder.markdown(output + "▌")
+            placeholder.markdown(output)
+        st.session_state.messages.append({"role": "assistant", "content": output})
         st.session_state.awaiting_response = False
         del st.session_state.last_prompt
         st.experimental_rerun()
@@ -0,0 +1,129 @@
+"""Ölçeklenebilir sentetik breaker verisi üreticisi.
+
+N breaker × M okuma için gerçekçi RawMeasurement akışları üretir: günlük yük eğrisi
+(sabah/akşam tepeleri), breaker başına farklı anma gücü, gürültü ve isteğe bağlı
+kaçak akım / arıza olayları. Tüm hesaplar vektöreldir; satır başına Python nesnesi oluşmaz.
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+
+METRIC_COLUMNS = [
+    "current", "voltage", "active_power", "reactive_power", "apparent_power",
+    "power_factor", "energy", "leakage_current", "temperature",
+]
+
+
+def _daily_shape(hours: np.ndarray) -> np.ndarray:
+    # Gece düşük, sabah 08 ve akşam 19 civarında tepe yapan yük eğrisi (0..1)
+    morning = np.exp(-0.5 * ((hours - 8.0) / 1.5) ** 2)
+    evening = np.exp(-0.5 * ((hours - 19.5) / 2.0) ** 2)
+    return 0.25 + 0.45 * morning + 0.75 * evening
+
+
+def generate(n_breakers: int = 10, n_readings: int = 1440, freq: str = "1min", start: str = "2025-04-01",
+             seed: int = 42, leakage_events: int = 0, fault_events: int = 0, event_length: int = 30) -> pd.DataFrame:
+    """Düz (sample.json biçiminde) ölçüm satırları döndürür; toplam n_breakers × n_readings satır.
+
+    Olaylar breaker ve zaman olarak rastgele seçilir; her biri event_length okuma sürer.
+    Enjekte edilen olaylar ``leakage_event`` ve ``fault_event`` kolonlarında işaretlenir.
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=n_readings, freq=freq)
+    step_h = pd.Timedelta(freq).total_seconds() / 3600
+    n = n_breakers * n_readings
+
+    # Breaker başına anma gücü (kW): aydınlatma ~0.3 kW, ısı pompası ~6 kW
+    rated = rng.lognormal(mean=np.log(1.5), sigma=0.8, size=n_breakers)
+    hours = (times.hour + times.minute / 60 + times.second / 3600).to_numpy(dtype=np.float64)
+    shape = _daily_shape(hours)
+
+    load = np.outer(rated, shape) * rng.normal(1.0, 0.08, size=(n_breakers, n_readings))
+    active_power = np.clip(load, 0.01, None).ravel()
+    voltage = rng.normal(230.0, 2.0, size=n)
+    power_factor = np.clip(rng.normal(0.92, 0.03, size=n), 0.5, 1.0)
+    apparent_power = active_power / power_factor
+    reactive_power = np.sqrt(np.maximum(apparent_power ** 2 - active_power ** 2, 0.0))
+    current = apparent_power * 1000.0 / voltage
+    leakage = rng.lognormal(mean=np.log(0.008), sigma=0.4, size=n)
+    temperature = 22.0 + 8.0 * (active_power / np.repeat(rated, n_readings)) + rng.normal(0, 0.5, size=n)
+
+    leakage_flag = np.zeros(n, dtype=bool)
+    fault_flag = np.zeros(n, dtype=bool)
+
+    def _windows(count):
+        b = rng.integers(0, n_breakers, size=count)
+        t = rng.integers(0, max(n_readings - event_length, 1), size=count)
+        offsets = np.arange(min(event_length, n_readings))
+        return ((b * n_readings + t)[:, None] + offsets[None, :]).ravel()
+
+    if leakage_events:
+        idx = _windows(leakage_events)
+        leakage[idx] = rng.uniform(0.03, 0.3, size=len(idx))
+        leakage_flag[idx] = True
+    if fault_events:
+        idx = _windows(fault_events)
+        voltage[idx] *= rng.choice([0.75, 1.15], size=len(idx))  # gerilim çökmesi / yükselmesi
+        current[idx] *= rng.uniform(1.8, 3.0, size=len(idx))     # akım sıçraması
+        temperature[idx] += rng.uniform(10, 25, size=len(idx))
+        fault_flag[idx] = True
+
+    return pd.DataFrame({
+        "breaker_id": np.repeat([f"CB-{i + 1:04d}" for i in range(n_breakers)], n_readings),
+        "timestamp": np.tile(times.to_numpy(), n_breakers),
+        "current": current,
+        "voltage": voltage,
+        "active_power": active_power,
+        "reactive_power": reactive_power,
+        "apparent_power": apparent_power,
+        "power_factor": power_factor,
+        "energy": active_power * step_h,
+        "leakage_current": leakage,
+        "temperature": temperature,
+        "leakage_event": leakage_flag,
+        "fault_event": fault_flag,
+    })
+
+
+def to_measurements(df: pd.DataFrame):
+    """Collector'ın /ingest ve /ingest/batch uçlarının beklediği RawMeasurement sözlükleri."""
+    metrics = df[METRIC_COLUMNS].to_dict("records")
+    timestamps = df["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S").tolist()
+    return [
+        {"timestamp": ts, "breaker_id": b, "metrics": m}
+        for ts, b, m in zip(timestamps, df["breaker_id"].tolist(), metrics)
+    ]
+
+
+def write_json(df: pd.DataFrame, path: str):
+    """sample.json biçiminde (düz satırlar) yazar."""
+    out = df[["breaker_id", "timestamp"] + METRIC_COLUMNS].copy()
+    out["timestamp"] = out["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(path, "w") as f:
+        json.dump(out.to_dict("records"), f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sentetik breaker verisi üret")
+    parser.add_argument("--breakers", type=int, default=10)
+    parser.add_argument("--readings", type=int, default=1440)
+    parser.add_argument("--freq", default="1min")
+    parser.add_argument("--start", default="2025-04-01")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--leakage-events", type=int, default=0)
+    parser.add_argument("--fault-events", type=int, default=0)
+    parser.add_argument("--json", help="sample.json biçiminde yazılacak dosya")
+    parser.add_argument("--store", help="verinin yazılacağı kolon deposu dizini")
+    args = parser.parse_args()
+
+    data = generate(args.breakers, args.readings, args.freq, args.start, args.seed,
+                    args.leakage_events, args.fault_events)
+    if args.json:
+        write_json(data, args.json)
+    if args.store:
+        from data.store import ColumnStore
+        ColumnStore(args.store).write(data.drop(columns=["leakage_event", "fault_event"]))
+    print(f"{len(data)} satır üretildi.")
@@ -0,0 +1,260 @@
+"""Kilowizard giriş noktaları için tekrarlanabilir benchmark.
+
+Kullanım:
+
+    python -m bench.run --breakers 50 --readings 2880 --repeat 5
+    python -m bench.run ... --compare bench/results/20250401-120000.json
+
+Her giriş noktası için verim (okuma/sn), gecikme yüzdelikleri (p50/p95/p99) ve tepe
+bellek (tracemalloc) ölçülür; sonuçlar bench/results/ altına JSON olarak yazılır.
+Tüm depolar geçici bir çalışma dizininde oluşturulur, repodaki veriye dokunulmaz.
+``shards`` durumu aynı partileri yönlendirici üzerinden 1 ve N shard'a gönderir (bench.shards).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _configure_env(workdir: str):
+    # Modüller yapılandırmayı import anında okuduğu için import'lardan önce ayarlanmalı
+    os.environ["RAW_DATA_DIR"] = os.path.join(workdir, "raw")
+    os.environ["STORE_DIR"] = os.path.join(workdir, "store")
+    os.environ["ROLLUP_PATH"] = os.path.join(workdir, "rollups.npz")
+    os.environ["DETECTOR_DIR"] = os.path.join(workdir, "detectors")
+    os.environ["TRAIN_CHECKPOINT_PATH"] = os.path.join(workdir, "train_checkpoint.npz")
+    os.environ["SEGMENT_FSYNC"] = os.environ.get("SEGMENT_FSYNC", "0")
+
+
+def measure(fn, repeat: int = 5, items: int = 1, warmup: int = 1) -> dict:
+    """fn'i repeat kez çalıştırır; gecikme yüzdelikleri, verim ve tepe bellek döndürür."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    lat = np.array(latencies)
+    return {
+        "repeat": repeat,
+        "items": items,
+        "throughput_per_s": items / lat.mean() if lat.mean() > 0 else None,
+        "latency_ms": {
+            "mean": lat.mean() * 1000,
+            "p50": float(np.percentile(lat, 50) * 1000),
+            "p95": float(np.percentile(lat, 95) * 1000),
+            "p99": float(np.percentile(lat, 99) * 1000),
+        },
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+
+
+def measure_requests(send, payloads, items_per_request: int) -> dict:
+    """Her isteğin gecikmesini ayrı ölçer (ingest uçları için)."""
+    latencies = np.empty(len(payloads))
+    tracemalloc.start()
+    try:
+        started_all = time.perf_counter()
+        for i, payload in enumerate(payloads):
+            started = time.perf_counter()
+            send(payload)
+            latencies[i] = time.perf_counter() - started
+        total = time.perf_counter() - started_all
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeat": len(payloads),
+        "items": len(payloads) * items_per_request,
+        "throughput_per_s": len(payloads) * items_per_request / total,
+        "latency_ms": {
+            "mean": latencies.mean() * 1000,
+            "p50": float(np.percentile(latencies, 50) * 1000),
+            "p95": float(np.percentile(latencies, 95) * 1000),
+            "p99": float(np.percentile(latencies, 99) * 1000),
+        },
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+
+
+def run(args) -> dict:
+    from bench.generator import generate, to_measurements, write_json
+
+    df = generate(args.breakers, args.readings, args.freq, seed=args.seed,
+                  leakage_events=max(args.breakers // 10, 1), fault_events=max(args.breakers // 10, 1))
+    flat = df.drop(columns=["leakage_event", "fault_event"])
+    json_path = os.path.join(args.workdir, "sample.json")
+    write_json(df, json_path)
+    n = len(df)
+    results = {}
+
+    # ----- collector ingest -----
+    if "ingest" in args.only:
+        from fastapi.testclient import TestClient
+        from collector.main import app
+
+        records = to_measurements(df.head(args.ingest_readings))
+        with TestClient(app) as client:
+            def _post_one(m):
+                r = client.post("/ingest", json=m)
+                r.raise_for_status()
+
+            def _post_batch(batch):
+                r = client.post("/ingest/batch", json=batch)
+                r.raise_for_status()
+
+            results["collector.ingest"] = measure_requests(_post_one, records, 1)
+            size = args.ingest_batch
+            batches = [records[i:i + size] for i in range(0, len(records), size)]
+            results["collector.ingest_batch"] = measure_requests(_post_batch, batches, size)
+
+            # Aynı partiler ikili çerçeve olarak (utils.wire); kodlama istemci tarafında, ölçüme dahil değil
+            from utils import wire
+            from utils.batch import MeasurementBatch
+
+            frames = [wire.encode(MeasurementBatch.from_records(b)) for b in batches]
+
+            def _post_frame(frame):
+                r = client.post("/ingest/batch", content=frame, headers={"Content-Type": wire.CONTENT_TYPE})
+                r.raise_for_status()
+
+            results["collector.ingest_binary"] = measure_requests(_post_frame, frames, size)
+            results["collector.ingest_binary"]["bytes_per_reading"] = sum(map(len, frames)) / len(records)
+            results["collector.ingest_batch"]["bytes_per_reading"] = \
+                sum(len(json.dumps(b)) for b in batches) / len(records)
+
+    # ----- sharded collector: 1 ve N shard -----
+    if "shards" in args.only:
+        from bench.shards import run_shards
+
+        records = to_measurements(df.head(args.ingest_readings))
+        results.update(run_shards(records, args.ingest_batch, args.shards, args.shard_concurrency, args.workdir))
+
+    # ----- depo ve analizler -----
+    from data.store import ColumnStore
+    store = ColumnStore()
+    started = time.perf_counter()
+    store.write(flat)
+    results["data.store.write"] = {"items": n, "seconds": time.perf_counter() - started}
+
+    from ml import predict
+    from ml.predict import breaker_based_billing, fault_detection, leakage_anomaly_detection, predict_energy
+
+    if "billing" in args.only:
+        results["billing.json"] = measure(lambda: breaker_based_billing(json_path), args.repeat, n)
+        results["billing.store"] = measure(lambda: predict.billing_from_frame(
+            predict.load_measurements(columns=["energy"])), args.repeat, n)
+        from data.rollups import BillingRollups
+        rollups = BillingRollups.rebuild(store)
+        results["billing.rollups"] = measure(lambda: breaker_based_billing(rollups=rollups), args.repeat * 20, n)
+        # Çok zamanlı + kademeli örnek tarife ile okuma bazında maliyet
+        from data.tariff import TariffBook
+        with open(os.path.join(os.path.dirname(__file__), "..", "data", "tariffs.example.json")) as f:
+            book = TariffBook.from_dict(json.load(f))
+        frame = predict.load_measurements(columns=["energy"])
+        results["billing.tariff"] = measure(lambda: predict.billing_from_frame(frame, tariffs=book), args.repeat, n)
+
+    if "faults" in args.only:
+        results["fault_detection"] = measure(lambda: fault_detection(json_path), args.repeat, n)
+    if "leakage" in args.only:
+        results["leakage_anomaly_detection"] = measure(lambda: leakage_anomaly_detection(json_path), args.repeat, n)
+    if "predict" in args.only:
+        results["predict_energy"] = measure(lambda: predict_energy(230.0, 12.0, 2.8, n_days=30), args.repeat * 20)
+
+    if "train" in args.only:
+        from ml import train
+        model_path = os.path.join(args.workdir, "bill_predictor.pkl")
+
+        def _train_memory():
+            data = train.load_data(json_path)
+            from sklearn.linear_model import LinearRegression
+            LinearRegression().fit(data[predict.FEATURES], data["energy"])
+
+        results["train.in_memory"] = measure(_train_memory, args.repeat, n)
+        results["train.streaming"] = measure(
+            lambda: train.train_streaming(store, resume=False, model_path=model_path,
+                                          checkpoint_path=os.path.join(args.workdir, "ck.npz")),
+            args.repeat, n)
+
+    return results
+
+
+def compare(current: dict, previous: dict):
+    print(f"\n{'giriş noktası':32s} {'p50 ms':>10s} {'önceki':>10s} {'değişim':>9s}")
+    for name, res in current["results"].items():
+        prev = previous["results"].get(name)
+        if "latency_ms" not in res or not prev or "latency_ms" not in prev:
+            continue
+        now, before = res["latency_ms"]["p50"], prev["latency_ms"]["p50"]
+        change = (now - before) / before * 100 if before else float("nan")
+        print(f"{name:32s} {now:10.2f} {before:10.2f} {change:8.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kilowizard benchmark")
+    parser.add_argument("--breakers", type=int, default=20)
+    parser.add_argument("--readings", type=int, default=1440)
+    parser.add_argument("--freq", default="1min")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ingest-readings", type=int, default=2000)
+    parser.add_argument("--ingest-batch", type=int, default=500)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, max(min(os.cpu_count() or 1, 4), 2)],
+                        help="karşılaştırılacak shard sayıları (ilki taban)")
+    parser.add_argument("--shard-concurrency", type=int, default=8, help="eşzamanlı istek sayısı")
+    parser.add_argument("--only", nargs="+",
+                        default=["ingest", "shards", "billing", "faults", "leakage", "predict", "train"])
+    parser.add_argument("--workdir", help="geçici veri dizini (varsayılan: yeni tmp dizini)")
+    parser.add_argument("--out", help="sonuç dosyası (varsayılan: bench/results/<zaman>.json)")
+    parser.add_argument("--compare", help="karşılaştırılacak önceki sonuç dosyası")
+    args = parser.parse_args(argv)
+
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="kilowizard-bench-")
+    _configure_env(args.workdir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    results = run(args)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "platform": {"python": platform.python_version(), "machine": platform.machine(),
+                     "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, default=float)
+
+    for name, res in results.items():
+        if "latency_ms" in res:
+            print(f"{name:32s} p50={res['latency_ms']['p50']:9.2f}ms p99={res['latency_ms']['p99']:9.2f}ms "
+                  f"verim={res['throughput_per_s'] or 0:12.0f}/s bellek={res['peak_mem_mb']:8.1f}MB")
+        else:
+            print(f"{name:32s} {res}")
+    print(f"Sonuçlar: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Sharded collector benchmark'ı: aynı partiler 1 ve N shard'a yönlendirici üzerinden gönderilir.
+
+uvicorn kuruluysa gerçek süreçler (``collector.cluster``) başlatılır ve istekler HTTP ile
+gider; aksi halde her shard ``collector.main``'in COLLECTOR_SHARD=i ile ayrı yüklenmiş bir
+kopyasıdır ve yönlendirici onlara ASGITransport ile bağlanır. Süreç içi modda tüm shard'lar
+aynı olay döngüsünü ve GIL'i paylaşır; sonuç ölçeklenmeyi değil bölme/yönlendirme
+maliyetini gösterir (``mode`` alanı hangisinin ölçüldüğünü yazar).
+"""
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import AsyncExitStack
+
+import httpx
+import numpy as np
+
+
+SHARD_BENCH_PORT = int(os.getenv("SHARD_BENCH_PORT", "18000"))
+READY_TIMEOUT = 30.0
+
+
+def uvicorn_available() -> bool:
+    return importlib.util.find_spec("uvicorn") is not None
+
+
+async def measure_concurrent(send, payloads, items_per_request: int, concurrency: int) -> dict:
+    """payloads'ı en fazla concurrency eşzamanlı istekle gönderir; istek başına gecikme ölçülür."""
+    latencies = np.empty(len(payloads))
+    queue = list(enumerate(payloads))[::-1]
+
+    async def worker():
+        while queue:
+            i, payload = queue.pop()
+            started = time.perf_counter()
+            await send(payload)
+            latencies[i] = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        started_all = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        total = time.perf_counter() - started_all
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeat": len(payloads),
+        "items": len(payloads) * items_per_request,
+        "throughput_per_s": len(payloads) * items_per_request / total,
+        "latency_ms": {
+            "mean": latencies.mean() * 1000,
+            "p50": float(np.percentile(latencies, 50) * 1000),
+            "p95": float(np.percentile(latencies, 95) * 1000),
+            "p99": float(np.percentile(latencies, 99) * 1000),
+        },
+        "peak_mem_mb": peak / 2 ** 20,
+    }
+
+
+# ----- süreç içi shard'lar -----
+class _ShardTransport(httpx.AsyncBaseTransport):
+    """http://shard-i/... isteklerini i. uygulamanın ASGITransport'una iletir."""
+
+    def __init__(self, apps: dict):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.host].handle_async_request(request)
+
+
+def _load_shard_apps(n: int, raw_dir: str) -> list:
+    # collector.main yapılandırmayı import anında okur; her shard ayrı modül adıyla yüklenir
+    origin = importlib.util.find_spec("collector.main").origin
+    saved = {k: os.environ.get(k) for k in ("COLLECTOR_SHARD", "RAW_DATA_DIR")}
+    apps = []
+    try:
+        os.environ["RAW_DATA_DIR"] = raw_dir
+        for i in range(n):
+            os.environ["COLLECTOR_SHARD"] = str(i)
+            spec = importlib.util.spec_from_file_location(f"_bench_collector_{n}_{i}", origin)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            apps.append(module.app)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return apps
+
+
+async def _run_inprocess(n: int, frames, size: int, concurrency: int, workdir: str) -> dict:
+    from collector import router as router_mod
+    from utils import wire
+
+    apps = _load_shard_apps(n, os.path.join(workdir, f"shards-{n}"))
+    hosts = {f"shard-{i}": app for i, app in enumerate(apps)}
+    router_mod.router = router_mod.ShardRouter([f"http://{h}" for h in hosts], transport=_ShardTransport(hosts))
+
+    async with AsyncExitStack() as stack:
+        for app in apps + [router_mod.app]:
+            await stack.enter_async_context(app.router.lifespan_context(app))
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=router_mod.app), base_url="http://router"))
+
+        async def send(frame):
+            r = await client.post("/ingest/batch", content=frame, headers={"Content-Type": wire.CONTENT_TYPE})
+            r.raise_for_status()
+
+        return await measure_concurrent(send, frames, size, concurrency)
+
+
+# ----- gerçek süreçler -----
+async def _wait_ready(client: httpx.AsyncClient, procs):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if any(p.poll() is not None for p in procs):
+            raise RuntimeError("Collector süreci başlatılamadı")
+        try:
+            # Yönlendirici durumu tüm shard'lardan toplar; 200 hepsi ayakta demektir
+            if (await client.get("/ingest/status")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Collector süreçleri zamanında hazır olmadı")
+
+
+async def _run_processes(n: int, frames, size: int, concurrency: int, workdir: str) -> dict:
+    from utils import wire
+
+    port = SHARD_BENCH_PORT
+    env = {**os.environ, "RAW_DATA_DIR": os.path.join(workdir, f"shards-{n}")}
+    proc = subprocess.Popen([sys.executable, "-m", "collector.cluster", "--workers", str(n),
+                             "--host", "127.0.0.1", "--port", str(port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            await _wait_ready(client, [proc])
+
+            async def send(frame):
+                r = await client.post("/ingest/batch", content=frame, headers={"Content-Type": wire.CONTENT_TYPE})
+                r.raise_for_status()
+
+            return await measure_concurrent(send, frames, size, concurrency)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_shards(records, size: int, shard_counts, concurrency: int, workdir: str, mode: str = None) -> dict:
+    """Her shard sayısı için yönlendirici üzerinden ingest verimi; {"collector.shards.N": sonuç}."""
+    from utils import wire
+    from utils.batch import MeasurementBatch
+
+    mode = mode or ("process" if uvicorn_available() else "inproc")
+    runner = _run_processes if mode == "process" else _run_inprocess
+    frames = [wire.encode(MeasurementBatch.from_records(records[i:i + size]))
+              for i in range(0, len(records), size)]
+    results = {}
+    for n in shard_counts:
+        res = asyncio.run(runner(n, frames, size, concurrency, workdir))
+        res.update(mode=mode, shards=n, concurrency=concurrency)
+        results[f"collector.shards.{n}"] = res
+    base = results.get(f"collector.shards.{shard_counts[0]}")
+    for res in results.values():
+        res["speedup"] = res["throughput_per_s"] / base["throughput_per_s"]
+    return results
@@ -0,0 +1,109 @@
+"""Collector için referans istemci: okumaları biriktirip /ingest/batch'e parti halinde gönderir.
+
+    python -m collector.client data/sample.json --url http://localhost:8000 --format frame
+
+Varsayılan biçim ikili çerçevedir (utils.wire); ``--format json`` aynı partileri JSON
+kolon sözlüğü olarak gönderir, böylece iki yolun boyutu ve süresi karşılaştırılabilir.
+Collector 503 (kuyruk dolu) döndürürse parti Retry-After kadar beklenip yeniden denenir.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from utils import wire
+from utils.batch import METRIC_FIELDS, MeasurementBatch
+
+
+COLLECTOR_URL = os.getenv("COLLECTOR_URL", "http://localhost:8000")
+CLIENT_BATCH_SIZE = int(os.getenv("CLIENT_BATCH_SIZE", "5000"))
+CLIENT_RETRIES = int(os.getenv("CLIENT_RETRIES", "5"))
+
+
+def _json_body(batch: MeasurementBatch) -> bytes:
+    columns = {"breaker_id": batch.breaker_id.tolist(),
+               "timestamp": np.datetime_as_string(batch.timestamp, unit="us").tolist()}
+    columns.update({f: batch.metrics[f].tolist() for f in METRIC_FIELDS})
+    return json.dumps(columns).encode()
+
+
+class CollectorClient:
+    def __init__(self, url: str = COLLECTOR_URL, batch_size: int = CLIENT_BATCH_SIZE, format: str = "frame",
+                 float32: bool = True, client: Optional[httpx.Client] = None):
+        if format not in ("frame", "json"):
+            raise ValueError(f"Bilinmeyen biçim: {format}")
+        self.batch_size = batch_size
+        self.format = format
+        self.float32 = float32
+        self.client = client or httpx.Client(base_url=url.rstrip("/"), timeout=30)
+        self.sent_rows = 0
+        self.sent_bytes = 0
+        self._rows = []
+
+    def encode(self, batch: MeasurementBatch) -> bytes:
+        return wire.encode(batch, float32=self.float32) if self.format == "frame" else _json_body(batch)
+
+    def send(self, batch: MeasurementBatch) -> dict:
+        body = self.encode(batch)
+        content_type = wire.CONTENT_TYPE if self.format == "frame" else "application/json"
+        for attempt in range(CLIENT_RETRIES + 1):
+            resp = self.client.post("/ingest/batch", content=body, headers={"Content-Type": content_type})
+            if resp.status_code != 503 or attempt == CLIENT_RETRIES:
+                break
+            time.sleep(float(resp.headers.get("retry-after", "1")))
+        resp.raise_for_status()
+        self.sent_rows += len(batch)
+        self.sent_bytes += len(body)
+        return resp.json()
+
+    def send_batch(self, batch: MeasurementBatch) -> None:
+        """Büyük partiyi batch_size'lık parçalarla gönderir."""
+        for i in range(0, len(batch), self.batch_size):
+            self.send(batch[i:i + self.batch_size])
+
+    def send_frame(self, df) -> None:
+        # breaker_id, timestamp ve metrik kolonlarıyla DataFrame
+        self.send_batch(MeasurementBatch.from_frame(df))
+
+    def add(self, breaker_id: str, timestamp, **metrics) -> None:
+        # Tek okuma; parti dolunca gönderilir
+        self._rows.append({"breaker_id": breaker_id, "timestamp": timestamp, "metrics": metrics})
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows:
+            rows, self._rows = self._rows, []
+            self.send(MeasurementBatch.from_records(rows))
+
+    def close(self) -> None:
+        self.flush()
+        self.client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collector referans istemcisi")
+    parser.add_argument("path", help="sample.json biçiminde ölçüm dosyası")
+    parser.add_argument("--url", default=COLLECTOR_URL)
+    parser.add_argument("--format", choices=["frame", "json"], default="frame")
+    parser.add_argument("--batch-size", type=int, default=CLIENT_BATCH_SIZE)
+    parser.add_argument("--float64", action="store_true", help="değerleri float64 olarak gönder")
+    args = parser.parse_args(argv)
+
+    with open(args.path, "rb") as f:
+        batch = MeasurementBatch.from_json(f.read())
+    client = CollectorClient(args.url, args.batch_size, args.format, float32=not args.float64)
+    started = time.perf_counter()
+    client.send_batch(batch)
+    client.close()
+    elapsed = time.perf_counter() - started
+    print(f"{client.sent_rows} okuma, {client.sent_bytes / 1e6:.2f} MB ({client.sent_bytes / max(client.sent_rows, 1):.1f} B/okuma), "
+          f"{elapsed:.2f} sn ({client.sent_rows / elapsed:,.0f} okuma/sn)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Sharded collector'ı tek makinede başlatır: N worker + ön yönlendirici.
+
+    python -m collector.cluster --workers 4 --port 8000
+
+Worker i, COLLECTOR_SHARD=i ile ``collector.main`` çalıştırır (port + 1 + i) ve
+{RAW_DATA_DIR}/shard-i altına yazar; yönlendirici ``port`` üzerinde dinler.
+Süreçlerden biri çıkarsa hepsi durdurulur.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+COLLECTOR_WORKERS = int(os.getenv("COLLECTOR_WORKERS", str(os.cpu_count() or 1)))
+
+
+def _uvicorn(app: str, host: str, port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", app, "--host", host, "--port", str(port)]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, env=env)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded collector")
+    parser.add_argument("--workers", type=int, default=COLLECTOR_WORKERS, help="shard (worker süreci) sayısı")
+    parser.add_argument("--router-workers", type=int, default=1, help="yönlendirici süreç sayısı")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    procs, urls = [], []
+    for i in range(args.workers):
+        port = args.port + 1 + i
+        procs.append(_uvicorn("collector.main:app", "127.0.0.1", port, {**os.environ, "COLLECTOR_SHARD": str(i)}))
+        urls.append(f"http://127.0.0.1:{port}")
+    router_env = {**os.environ, "COLLECTOR_SHARD_URLS": ",".join(urls)}
+    procs.append(_uvicorn("collector.router:app", args.host, args.port, router_env, args.router_workers))
+    print(f"Collector: {args.workers} shard, yönlendirici :{args.port}")
+
+    def shutdown(*_):
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+        for p in procs:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
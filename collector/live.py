@@ -0,0 +1,213 @@
+"""Canlı veri: breaker başına sabit boyutlu halka tamponlar ve abonelere delta yayını.
+
+Ingest edilen her parti ilgili breaker'ın tamponuna eklenir. Aboneler kuyruk tutmaz;
+her abonenin breaker başına bir imleci (son gördüğü sıra numarası) vardır ve
+uyandığında yalnızca imlecinden sonraki okumaları alır. Yavaş bir istemci arada
+kaçırdığı yayınları tek bir deltada toplu (coalesced) alır; tampondan daha fazla
+geride kalırsa en yeni ``capacity`` okumayı ve ``gap`` işaretini alır.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils import metrics
+from utils.batch import METRIC_FIELDS, MeasurementBatch
+
+
+LIVE_CAPACITY = int(os.getenv("LIVE_CAPACITY", "2048"))           # breaker başına okuma
+LIVE_MIN_INTERVAL = float(os.getenv("LIVE_MIN_INTERVAL_MS", "250")) / 1000  # abone başına en sık yayın
+LIVE_MAX_POINTS = int(os.getenv("LIVE_MAX_POINTS", "500"))        # tek deltada breaker başına en fazla okuma
+
+SUBSCRIBERS = metrics.gauge("kilowizard_live_subscribers", "Bağlı canlı veri abonesi")
+PUSHES = metrics.counter("kilowizard_live_pushes_total", "Abonelere gönderilen delta sayısı")
+DROPPED = metrics.counter("kilowizard_live_dropped_readings_total",
+                          "Yavaş aboneler için atlanan (tampondan taşan) okumalar")
+
+
+class RingBuffer:
+    """Son ``capacity`` okumayı geliş sırasıyla tutar; ``seq`` şimdiye kadar eklenen toplam okumadır."""
+
+    def __init__(self, capacity: int = LIVE_CAPACITY, fields=METRIC_FIELDS):
+        self.capacity = capacity
+        self.fields = list(fields)
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(self.fields)), np.nan)
+        self.seq = 0
+
+    def append(self, ts: np.ndarray, values: np.ndarray):
+        n = len(ts)
+        if n == 0:
+            return
+        skip = max(n - self.capacity, 0)  # tampondan büyük partinin yalnızca sonu sığar
+        ts, values = ts[skip:], values[skip:]
+        pos = (self.seq + skip) % self.capacity
+        first = min(len(ts), self.capacity - pos)
+        self.ts[pos:pos + first] = ts[:first]
+        self.values[pos:pos + first] = values[:first]
+        rest = len(ts) - first
+        if rest:
+            self.ts[:rest] = ts[first:]
+            self.values[:rest] = values[first:]
+        self.seq += n
+
+    def since(self, seq: int, limit: int = None):
+        """seq'ten sonraki okumalar: (başlangıç sırası, zamanlar, değerler [n, alan])."""
+        start = max(seq, self.seq - self.capacity, 0)
+        if limit is not None:
+            start = max(start, self.seq - limit)
+        idx = np.arange(start, self.seq) % self.capacity
+        return start, self.ts[idx], self.values[idx]
+
+
+class LiveHub:
+    def __init__(self, capacity: int = LIVE_CAPACITY):
+        self.capacity = capacity
+        self.buffers: Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self.subscribers = 0
+        SUBSCRIBERS.set_callback(lambda: self.subscribers)
+
+    # ----- yazma -----
+    def publish(self, batch: MeasurementBatch):
+        """Partiyi breaker'lara ayırıp tamponlara ekler ve bekleyen aboneleri uyandırır."""
+        if not len(batch):
+            return
+        ts = batch.timestamp.view(np.int64)
+        values = np.column_stack([batch.metrics[f] for f in METRIC_FIELDS])
+        names, inverse = np.unique(batch.breaker_id.astype(str), return_inverse=True)
+        order = np.argsort(inverse, kind="stable")  # breaker içinde geliş sırası korunur
+        bounds = np.searchsorted(inverse[order], np.arange(len(names) + 1))
+        with self._lock:
+            for i, name in enumerate(names.tolist()):
+                rows = order[bounds[i]:bounds[i + 1]]
+                buf = self.buffers.get(name)
+                if buf is None:
+                    buf = self.buffers[name] = RingBuffer(self.capacity)
+                buf.append(ts[rows], values[rows])
+        self._notify()
+
+    def _notify(self):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake()
+        else:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    # ----- okuma -----
+    def check_fields(self, fields: Optional[Iterable[str]]) -> List[str]:
+        fields = list(fields) if fields else list(METRIC_FIELDS)
+        unknown = set(fields) - set(METRIC_FIELDS)
+        if unknown:
+            raise ValueError(f"Bilinmeyen metrik: {', '.join(sorted(unknown))}")
+        return fields
+
+    def delta(self, cursors: Dict[str, int], breakers: Optional[Iterable[str]] = None,
+              fields: Optional[Iterable[str]] = None, limit: int = LIVE_MAX_POINTS) -> dict:
+        """İmleçlerden sonraki okumalar {breaker: {seq, gap, timestamp, <metrik>...}}; imleçler yerinde ilerler."""
+        fields = self.check_fields(fields)
+        cols = [METRIC_FIELDS.index(f) for f in fields]
+        out = {}
+        with self._lock:
+            names = list(breakers) if breakers else list(self.buffers)
+            for name in names:
+                buf = self.buffers.get(name)
+                if buf is None:
+                    continue
+                cursor = cursors.get(name, 0)
+                if buf.seq <= cursor:
+                    continue
+                start, ts, values = buf.since(cursor, limit)
+                gap = cursor > 0 and start > cursor  # imleç 0: ilk gönderim, atlanan yok
+                if gap:
+                    DROPPED.inc(start - cursor)
+                entry = {
+                    "seq": buf.seq,
+                    "gap": gap,
+                    "timestamp": ts.view("datetime64[ns]").astype("datetime64[ms]").astype(str).tolist(),
+                }
+                for f, c in zip(fields, cols):
+                    entry[f] = np.where(np.isnan(values[:, c]), None, np.round(values[:, c], 6)).tolist()
+                out[name] = entry
+                cursors[name] = buf.seq
+        return out
+
+    def snapshot(self, breakers=None, fields=None, n: int = LIVE_MAX_POINTS) -> dict:
+        return self.delta({}, breakers, fields, limit=n)
+
+    def cursors(self, breakers=None, backlog: int = 0) -> Dict[str, int]:
+        """Şu anki imleçler; backlog > 0 ise ilk delta son backlog okumayı da içerir."""
+        with self._lock:
+            names = list(breakers) if breakers else list(self.buffers)
+            return {b: max(self.buffers[b].seq - backlog, 0) for b in names if b in self.buffers}
+
+    async def subscribe(self, breakers=None, fields=None, cursors: Dict[str, int] = None,
+                        min_interval: float = LIVE_MIN_INTERVAL, limit: int = LIVE_MAX_POINTS,
+                        heartbeat: float = None):
+        """Yeni veri geldikçe deltaları üreten async jeneratör.
+
+        cursors verilmezse yalnızca abone olduktan sonra gelen okumalar gönderilir;
+        verilirse yerinde güncellenir. Gönderimler arasında en az min_interval beklenir,
+        bu sürede gelen tüm yayınlar tek deltada birleşir. heartbeat saniye boyunca
+        veri gelmezse boş sözlük üretilir (bağlantıyı canlı tutmak için).
+        """
+        fields = self.check_fields(fields)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._event = asyncio.Event()
+        if cursors is None:
+            cursors = self.cursors()
+        self.subscribers += 1
+        try:
+            last = 0.0
+            while True:
+                wait = min_interval - (time.monotonic() - last)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                event = self._event  # delta'dan önce alınır ki arada gelen yayın kaçmasın
+                payload = self.delta(cursors, breakers, fields, limit)
+                if payload:
+                    PUSHES.inc()
+                    last = time.monotonic()
+                    yield payload
+                    continue
+                try:
+                    await asyncio.wait_for(event.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield {}
+        finally:
+            self.subscribers -= 1
+
+
+def format_cursors(cursors: Dict[str, int]) -> str:
+    # SSE "id" alanı; yeniden bağlanan istemci Last-Event-ID ile kaldığı yerden devam eder
+    return ",".join(f"{name}={seq}" for name, seq in cursors.items())
+
+
+def parse_cursors(text: Optional[str]) -> Optional[Dict[str, int]]:
+    if not text:
+        return None
+    cursors = {}
+    for part in text.split(","):
+        name, _, seq = part.rpartition("=")
+        if name and seq.isdigit():
+            cursors[name] = int(seq)
+    return cursors
+
+
+hub = LiveHub()
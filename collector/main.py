@@ -1,17 +1,208 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from utils.schemas import RawMeasurement
-import json, datetime, os
-
-app = FastAPI(title="Breaker Collector")
+from utils.batch import BatchValidationError, MeasurementBatch
+from utils import wire
+from collector.storage import get_store
+from collector.pipeline import IngestPipeline, QueueFull
+from collector import live
+from collector.sharding import shard_path
+from data.rollups import BillingRollups, ROLLUP_PATH
+from data.store import ColumnStore, SegmentImporter
+from data.tiers import Compactor, COMPACTION_INTERVAL
+from typing import List, Optional
+from utils import metrics
+import json
+import os
+import time
 
 DATA_DIR = os.getenv("RAW_DATA_DIR", "data/raw")
+# Sharded modda (collector.cluster) her worker kendi log'una ve özet dosyasına yazar
+SHARD = os.getenv("COLLECTOR_SHARD")
+if SHARD is not None:
+    DATA_DIR = os.path.join(DATA_DIR, f"shard-{SHARD}")
+ROLLUP_FILE = shard_path(ROLLUP_PATH, f"shard-{SHARD}") if SHARD is not None else ROLLUP_PATH
+# Dashboard tarayıcıdan canlı akışa doğrudan bağlanır
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:8501").split(",")
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
 
-@app.post("/ingest")
-def ingest(measurement: RawMeasurement):
-    path = f"{DATA_DIR}/{measurement.breaker_id}_{measurement.timestamp}.json"
+# STORAGE_MODE=segment (varsayılan) → append-only segment log, STORAGE_MODE=legacy → ölçüm başına bir dosya
+store = get_store(DATA_DIR)
+
+# Handler'lar diske yazmaz; ölçümler kuyruğa girer ve arka planda toplu yazılır
+pipeline = IngestPipeline(store)
+
+# Fatura özetleri her flush'ta güncellenir ve periyodik olarak diske yazılır
+rollups = BillingRollups.load(ROLLUP_FILE)
+
+
+def _update_rollups(batch):
+    rollups.update_measurements(batch)
+    rollups.maybe_save(ROLLUP_FILE)
+
+
+pipeline.on_flush.append(_update_rollups)
+
+# Segment log'u (legacy modda ölçüm başına JSON dosyaları) kaldığı yerden kolon deposuna
+# aktarılır (STORE_IMPORT_INTERVAL); dashboard,
+# dedektörler, eğitim ve /predict depodan okur. Shard'ların breaker'ları ayrık olduğundan
+# her shard kendi log'unu aktarır.
+importer = SegmentImporter(DATA_DIR, ColumnStore())
+
+# Kolon deposundaki eski ham günler periyodik olarak özet katmanlarına sıkıştırılır (COMPACTION_INTERVAL=0 kapatır).
+# Depo shard'lar arasında ortak olduğundan sıkıştırmayı yalnızca ilk shard yapar.
+compactor = Compactor(interval=COMPACTION_INTERVAL if SHARD in (None, "0") else 0)
+
+INGEST_LATENCY = metrics.histogram("kilowizard_ingest_latency_seconds", "Ingest isteği gecikmesi")
+INGEST_READINGS = metrics.counter("kilowizard_ingest_readings_total", "Kabul edilen okuma sayısı")
+metrics.gauge("kilowizard_ingest_queue_depth", "Yazılmayı bekleyen okuma sayısı", callback=pipeline.depth)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await pipeline.start()
+    importer.start()
+    compactor.start()
+    yield
+    compactor.stop()
+    await pipeline.stop()
+    importer.stop()
+    rollups.save(ROLLUP_FILE)
+    store.close()
+
+
+app = FastAPI(title="Breaker Collector", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["GET"], allow_headers=["*"])
+
+
+# Fatura ve özetler energy'den hesaplanır; diğer metrikler (sample.json'daki gibi) eksik olabilir
+REQUIRED_METRICS = ("energy",)
+
+
+def _validated(batch: MeasurementBatch) -> MeasurementBatch:
+    # Geçersiz satır varsa hiçbiri kabul edilmez; hatalar satır numarasıyla döner
+    valid, errors = batch.check(required=REQUIRED_METRICS)
+    if not valid.all():
+        raise HTTPException(422, {"invalid_rows": int((~valid).sum()), "errors": errors})
+    return batch
+
+
+async def _submit(batch: MeasurementBatch, endpoint: str):
+    started = time.perf_counter()
     try:
-        with open(path, "w") as f:
-            json.dump(measurement.model_dump(), f)
-        return {"status": "ok", "path": path}
+        await pipeline.submit(batch)
+        INGEST_READINGS.inc(len(batch))
+        # Kuyruğa kabul edilen okumalar diske yazılmayı beklemeden canlı abonelere gider
+        live.hub.publish(batch)
+    except QueueFull as exc:
+        raise HTTPException(503, str(exc), headers={"Retry-After": "1"})
     except Exception as exc:
         raise HTTPException(500, str(exc))
+    finally:
+        INGEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+@app.post("/ingest")
+async def ingest(measurement: RawMeasurement):
+    await _submit(_validated(MeasurementBatch.from_models([measurement])), "ingest")
+    return {"status": "ok", "ack": pipeline.ack_mode}
+
+# Gövde Pydantic ile satır satır değil, MeasurementBatch ile kolon bazlı çözülür.
+# Satır listesi (RawMeasurement veya sample.json biçimi) ya da {alan: [değerler]} kabul edilir.
+# Content-Type application/x-kilowizard-frame → ikili çerçeve (utils.wire), application/msgpack → msgpack.
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request):
+    try:
+        batch = wire.decode_body(await request.body(), request.headers.get("content-type"))
+    except wire.UnsupportedFormat as exc:
+        raise HTTPException(415, str(exc))
+    except BatchValidationError as exc:
+        raise HTTPException(422, {"invalid_rows": exc.invalid_rows, "errors": exc.errors})
+    except ValueError as exc:
+        raise HTTPException(400, f"Geçersiz gövde: {exc}")
+    batch = _validated(batch)
+    if len(batch):
+        await _submit(batch, "ingest_batch")
+    return {"status": "ok", "count": len(batch), "ack": pipeline.ack_mode}
+
+@app.get("/ingest/status")
+def ingest_status():
+    return {
+        "shard": SHARD,
+        "queue_depth": pipeline.depth(),
+        "queue_size": pipeline.queue_size,
+        "flushed": pipeline.flushed,
+        "rejected": pipeline.rejected,
+        "imported": importer.imported,
+        "expired_segments": importer.expired,
+        "last_error": pipeline.last_error,
+        "last_callback_error": pipeline.last_callback_error,
+    }
+
+@app.get("/billing")
+def billing(breaker_id: Optional[List[str]] = Query(None), start: Optional[str] = None, end: Optional[str] = None):
+    return rollups.bill(breaker_id, start, end)
+
+# ----- canlı veri -----
+def _live_params(breaker_id, metric):
+    try:
+        return breaker_id or None, live.hub.check_fields(metric)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+@app.get("/live/snapshot")
+def live_snapshot(breaker_id: Optional[List[str]] = Query(None), metric: Optional[List[str]] = Query(None),
+                  n: int = live.LIVE_MAX_POINTS):
+    breakers, fields = _live_params(breaker_id, metric)
+    return live.hub.snapshot(breakers, fields, n)
+
+# Server-Sent Events: her olay {breaker: {seq, gap, timestamp, <metrik>...}} deltasıdır;
+# "id" alanı imleçleri taşır, yeniden bağlanan EventSource kaldığı yerden devam eder
+@app.get("/live/stream")
+async def live_stream(request: Request, breaker_id: Optional[List[str]] = Query(None),
+                      metric: Optional[List[str]] = Query(None), backlog: int = 0):
+    breakers, fields = _live_params(breaker_id, metric)
+    cursors = live.parse_cursors(request.headers.get("last-event-id")) or live.hub.cursors(breakers, backlog)
+
+    async def events():
+        yield "retry: 2000\n\n"
+        async for payload in live.hub.subscribe(breakers, fields, cursors, heartbeat=LIVE_HEARTBEAT):
+            if not payload:
+                yield ": ping\n\n"
+                continue
+            yield f"id: {live.format_cursors(cursors)}\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/live/ws")
+async def live_ws(websocket: WebSocket, breaker_id: Optional[List[str]] = Query(None),
+                  metric: Optional[List[str]] = Query(None), backlog: int = 0):
+    await websocket.accept()
+    try:
+        breakers, fields = breaker_id or None, live.hub.check_fields(metric)
+    except ValueError as exc:
+        await websocket.close(code=1008, reason=str(exc))
+        return
+    try:
+        async for payload in live.hub.subscribe(breakers, fields, live.hub.cursors(breakers, backlog),
+                                                heartbeat=LIVE_HEARTBEAT):
+            await websocket.send_text(json.dumps(payload))
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Örneklemeli profiler: üretimde yeniden deploy etmeden aç/kapat
+@app.post("/profiler/start")
+def profiler_start(interval_ms: float = Query(10, gt=0)):
+    metrics.profiler.start(interval_ms / 1000)
+    return {"running": True, "interval_ms": interval_ms}
+
+@app.post("/profiler/stop", response_class=PlainTextResponse)
+def profiler_stop():
+    return metrics.profiler.stop()
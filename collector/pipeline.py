@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from utils import metrics
+from utils.batch import MeasurementBatch
+
+
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100000"))
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50")) / 1000
+# enqueue: kuyruğa girince onayla (düşük gecikme), durable: diske yazılınca onayla
+ACK_MODE = os.getenv("INGEST_ACK_MODE", "enqueue")
+
+
+FLUSH_SECONDS = metrics.histogram("kilowizard_ingest_flush_seconds", "Toplu yazma (flush) süresi")
+FLUSH_BATCH = metrics.histogram("kilowizard_ingest_flush_batch_size", "Flush başına okuma sayısı",
+                                buckets=(1, 10, 100, 500, 1000, 5000, 10000, 50000))
+REJECTED = metrics.counter("kilowizard_ingest_rejected_total", "Kuyruk dolu olduğu için reddedilen okumalar")
+FLUSH_ERRORS = metrics.counter("kilowizard_ingest_flush_errors_total", "Başarısız flush sayısı")
+CALLBACK_ERRORS = metrics.counter("kilowizard_ingest_flush_callback_errors_total",
+                                  "Flush sonrası başarısız olan geri çağrılar")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IngestPipeline:
+    """Write-behind ingest: handler'lar ölçümleri sınırlı bir kuyruğa koyar,
+    arka plandaki yazıcı bunları boyut veya süre tetikleyicisiyle toplu halde depoya yazar.
+
+    Kuyruğa okuma başına değil istek başına bir MeasurementBatch girer; sınır okuma
+    sayısı üzerinden uygulanır."""
+
+    def __init__(self, store, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, ack_mode: str = ACK_MODE):
+        if ack_mode not in ("enqueue", "durable"):
+            raise ValueError(f"Bilinmeyen INGEST_ACK_MODE: {ack_mode}")
+        self.store = store
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ack_mode = ack_mode
+        # Her başarılı flush'tan sonra (yazıcı thread'inde) çağrılır, örn. rollup güncellemesi.
+        # Parti bu noktada diske yazılmıştır; geri çağrı hatası flush'ı başarısız saymaz.
+        self.on_flush = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._pending = 0  # kuyruktaki + yazılmakta olan okuma sayısı
+        self.flushed = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self.last_callback_error: Optional[str] = None
+
+    def depth(self) -> int:
+        return self._pending
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Kuyruktakileri yazıp yazıcıyı kapat
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+
+    async def submit(self, batch: MeasurementBatch):
+        """Ölçümleri kuyruğa ekler; yer yoksa hiçbirini eklemeden QueueFull fırlatır.
+
+        RawMeasurement listesi de kabul edilir ve bir MeasurementBatch'e çevrilir.
+        """
+        if not isinstance(batch, MeasurementBatch):
+            batch = MeasurementBatch.from_models(batch)
+        n = len(batch)
+        if self._pending + n > self.queue_size:
+            self.rejected += n
+            REJECTED.inc(n)
+            raise QueueFull(f"Kuyruk dolu ({self._pending}/{self.queue_size})")
+
+        done = asyncio.get_running_loop().create_future() if self.ack_mode == "durable" else None
+        self._pending += n
+        self._queue.put_nowait((batch, done))
+
+        if done is not None:
+            await done
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            chunks, waiters = [item[0]], [item[1]]
+            size = len(item[0])
+            deadline = loop.time() + self.flush_interval
+
+            while size < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                chunks.append(item[0])
+                waiters.append(item[1])
+                size += len(item[0])
+
+            await self._flush(MeasurementBatch.concat(chunks), waiters)
+
+    def _write(self, batch):
+        with FLUSH_SECONDS.time():
+            self.store.append(batch)
+            for callback in self.on_flush:
+                try:
+                    callback(batch)
+                except Exception as exc:
+                    # Yeniden deneme segment log'una aynı satırları ikinci kez yazardı
+                    CALLBACK_ERRORS.inc(callback=getattr(callback, "__name__", "callback"))
+                    self.last_callback_error = f"{time.strftime('%Y-%m-%dT%H:%M:%S')} {exc}"
+                    print(f"⚠️ Flush geri çağrısı başarısız: {exc}")
+        FLUSH_BATCH.observe(len(batch))
+
+    async def _flush(self, batch, waiters):
+        error = None
+        try:
+            # Disk I/O event loop'u bloklamasın
+            await asyncio.to_thread(self._write, batch)
+            self.flushed += len(batch)
+        except Exception as exc:
+            error = exc
+            FLUSH_ERRORS.inc()
+            self.last_error = f"{time.strftime('%Y-%m-%dT%H:%M:%S')} {exc}"
+        finally:
+            self._pending -= len(batch)
+        for fut in waiters:
+            if fut is None or fut.done():
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(True)
@@ -0,0 +1,378 @@
+"""Sharded collector'ın ön yönlendiricisi (port 8000).
+
+    python -m collector.cluster --workers 4
+
+Ingest istekleri breaker_id'nin halka üzerindeki sahibine (collector.sharding) iletilir;
+her worker kendi segment log'una, özet dosyasına ve canlı tamponlarına sahiptir, yani bir
+breaker'ın yazma sırası tek bir süreçte belirlenir. Karışık breaker'lı partiler shard'lara
+bölünür (JSON, msgpack ya da ikili çerçeve olarak, geldiği biçimde); tek shard'a düşen parti
+gövdesi yeniden kodlanmadan iletilir. Okumalar (fatura, durum, canlı veri) ilgili
+shard'lardan toplanıp birleştirilir.
+
+Yönlendirici durumsuzdur; gerekirse birden çok süreçle çalıştırılabilir. İstemciler
+GET /shards ile halkayı alıp doğrudan worker'lara da yazabilir.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from collector import live
+from collector.sharding import HashRing, SHARD_VNODES, shard_names
+from utils import metrics, wire
+from utils.batch import column_length
+
+
+SHARD_URLS = [u.strip().rstrip("/") for u in os.getenv("COLLECTOR_SHARD_URLS", "").split(",") if u.strip()]
+ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT", "10"))
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:8501").split(",")
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", "15"))
+
+ROUTED = metrics.counter("kilowizard_router_readings_total", "Shard'lara iletilen okuma sayısı")
+SPLITS = metrics.counter("kilowizard_router_split_batches_total", "Birden çok shard'a bölünen parti sayısı")
+
+
+class ShardRouter:
+    def __init__(self, urls: List[str], transport: httpx.AsyncBaseTransport = None):
+        self.urls = dict(zip(shard_names(len(urls)), urls))
+        self.ring = HashRing(self.urls) if urls else None
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self.ring is None:
+            raise RuntimeError("COLLECTOR_SHARD_URLS boş")
+        self.client = httpx.AsyncClient(timeout=ROUTER_TIMEOUT, transport=self.transport,
+                                        limits=httpx.Limits(max_keepalive_connections=64))
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    def nodes_for(self, breakers: Optional[List[str]]) -> List[str]:
+        if not breakers:
+            return list(self.urls)
+        owners = {self.ring.owner(b) for b in breakers}
+        return [n for n in self.urls if n in owners]
+
+    async def post(self, node: str, path: str, body: bytes, content_type: str = "application/json") -> httpx.Response:
+        return await self.client.post(self.urls[node] + path, content=body, headers={"Content-Type": content_type})
+
+    async def get_all(self, nodes: List[str], path: str, params=None) -> Dict[str, object]:
+        responses = await asyncio.gather(*(self.client.get(self.urls[n] + path, params=params) for n in nodes),
+                                         return_exceptions=True)
+        out = {}
+        for node, resp in zip(nodes, responses):
+            if isinstance(resp, Exception):
+                raise HTTPException(502, f"{node} erişilemiyor: {resp}")
+            if resp.status_code != 200:
+                _raise_for(resp)
+            out[node] = resp.json()
+        return out
+
+
+def _raise_for(resp: httpx.Response):
+    # Shard'ın hata cevabı olduğu gibi istemciye döner
+    try:
+        detail = resp.json().get("detail", resp.text)
+    except ValueError:
+        detail = resp.text
+    headers = {"Retry-After": resp.headers["retry-after"]} if "retry-after" in resp.headers else None
+    raise HTTPException(resp.status_code, detail, headers=headers)
+
+
+router = ShardRouter(SHARD_URLS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await router.start()
+    yield
+    await router.stop()
+
+
+app = FastAPI(title="Breaker Collector Router", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["GET"], allow_headers=["*"])
+
+
+def _passthrough(resp: httpx.Response) -> Response:
+    headers = {"Retry-After": resp.headers["retry-after"]} if "retry-after" in resp.headers else None
+    return Response(resp.content, resp.status_code, headers=headers, media_type="application/json")
+
+
+def _parse(body: bytes, media: str = "application/json"):
+    if media == wire.MSGPACK_CONTENT_TYPE:
+        if wire.msgpack is None:
+            raise HTTPException(415, "msgpack kurulu değil")
+        try:
+            return wire.msgpack.unpackb(body, timestamp=3)
+        except Exception as exc:
+            raise HTTPException(400, f"Geçersiz msgpack: {exc}")
+    try:
+        return json.loads(body)
+    except ValueError as exc:
+        raise HTTPException(400, f"Geçersiz JSON: {exc}")
+
+
+def _media(request: Request) -> str:
+    return (request.headers.get("content-type") or "").split(";")[0].strip().lower() or "application/json"
+
+
+def _route_key(value) -> str:
+    # Eksik breaker_id herhangi bir shard'a gider; orada doğrulamadan geçmez
+    return "" if value is None else str(value)
+
+
+# ----- ingest -----
+@app.post("/ingest")
+async def ingest(request: Request):
+    body = await request.body()
+    parsed = _parse(body)
+    breaker_id = parsed.get("breaker_id") if isinstance(parsed, dict) else None
+    resp = await router.post(router.ring.owner(_route_key(breaker_id)), "/ingest", body)
+    if resp.status_code == 200:
+        ROUTED.inc()
+    return _passthrough(resp)
+
+
+def _take(parsed, rows: np.ndarray, n: int):
+    """Satır listesinden ya da kolon sözlüğünden verilen satırları seçer."""
+    if isinstance(parsed, list):
+        return [parsed[i] for i in rows.tolist()]
+    out = {}
+    for key, value in parsed.items():
+        if isinstance(value, dict):
+            out[key] = _take(value, rows, n)
+        elif isinstance(value, list) and len(value) == n:
+            out[key] = [value[i] for i in rows.tolist()]
+        else:
+            out[key] = value
+    return out
+
+
+def _split_parsed(parsed, media: str):
+    """JSON/msgpack gövde: satır listesi ya da kolon sözlüğü; parçalar aynı biçimde kodlanır."""
+    if isinstance(parsed, list):
+        ids = [_route_key(r.get("breaker_id") if isinstance(r, dict) else None) for r in parsed]
+    elif isinstance(parsed, dict):
+        # Eksik/uzunluğu tutmayan kolonlar bölünmeden önce reddedilir (shard'lar da aynı kuralla 400 döner)
+        try:
+            column_length(parsed)
+        except ValueError as exc:
+            raise HTTPException(400, f"Geçersiz gövde: {exc}")
+        ids = [_route_key(b) for b in parsed["breaker_id"]]
+    else:
+        raise HTTPException(400, "Satır listesi ya da kolon sözlüğü bekleniyor")
+    dumps = wire.msgpack.packb if media == wire.MSGPACK_CONTENT_TYPE else lambda v: json.dumps(v).encode()
+    return ids, lambda rows: dumps(_take(parsed, rows, len(ids)))
+
+
+def _split_frame(body: bytes):
+    """İkili çerçeve: breaker id'leri dizi olarak çözülür; parçalar aynı düzenle yeniden kodlanır."""
+    try:
+        batch, layout = wire.decode(body), wire.layout(body)
+    except ValueError as exc:
+        raise HTTPException(400, f"Geçersiz çerçeve: {exc}")
+    return batch.breaker_id, lambda rows: wire.encode(batch[rows], **layout)
+
+
+@app.post("/ingest/batch")
+async def ingest_batch(request: Request):
+    body = await request.body()
+    media = _media(request)
+    if media == wire.CONTENT_TYPE:
+        ids, encode = _split_frame(body)
+    else:
+        ids, encode = _split_parsed(_parse(body, media), media)
+    if not len(ids):
+        return {"status": "ok", "count": 0, "shards": {}}
+
+    groups = router.ring.split(ids)
+    if len(groups) == 1:
+        # Tek shard: gövde olduğu gibi iletilir
+        node = next(iter(groups))
+        resp = await router.post(node, "/ingest/batch", body, media)
+        if resp.status_code != 200:
+            return _passthrough(resp)
+        ROUTED.inc(len(ids))
+        return {**resp.json(), "shards": {node: len(ids)}}
+
+    SPLITS.inc()
+    nodes = list(groups)
+    bodies = [encode(groups[n]) for n in nodes]
+    responses = await asyncio.gather(*(router.post(n, "/ingest/batch", b, media) for n, b in zip(nodes, bodies)),
+                                     return_exceptions=True)
+
+    # Her shard kendi parçasını bağımsız doğrular ve yazar; hata satırları asıl partideki
+    # numaralarına çevrilir, kabul edilen parçalar "accepted" altında bildirilir
+    accepted, errors, invalid, failed = {}, [], 0, []
+    for node, resp in zip(nodes, responses):
+        if isinstance(resp, Exception):
+            failed.append((502, f"{node} erişilemiyor: {resp}", None))
+        elif resp.status_code == 200:
+            accepted[node] = resp.json()["count"]
+        elif resp.status_code == 422 and isinstance(resp.json().get("detail"), dict):
+            detail = resp.json()["detail"]
+            invalid += detail["invalid_rows"]
+            rows = groups[node]
+            errors.extend({**e, "row": int(rows[e["row"]])} for e in detail["errors"])
+        else:
+            failed.append((resp.status_code, resp.text, resp.headers.get("retry-after")))
+    ROUTED.inc(sum(accepted.values()))
+
+    if failed:
+        # Aşırı yük (503) varsa istemci Retry-After ile yeniden denesin
+        status, detail, retry = max(failed, key=lambda f: f[0] == 503)
+        headers = {"Retry-After": retry} if retry else None
+        raise HTTPException(status, {"error": detail, "accepted": accepted}, headers=headers)
+    if errors:
+        errors.sort(key=lambda e: e["row"])
+        raise HTTPException(422, {"invalid_rows": invalid, "errors": errors, "accepted": accepted})
+    return {"status": "ok", "count": sum(accepted.values()), "shards": accepted}
+
+
+# ----- okumalar -----
+@app.get("/shards")
+def shards():
+    return {"shards": [{"name": n, "url": u} for n, u in router.urls.items()], "vnodes": SHARD_VNODES}
+
+
+@app.get("/ingest/status")
+async def ingest_status():
+    statuses = await router.get_all(list(router.urls), "/ingest/status")
+    return {
+        "queue_depth": sum(s["queue_depth"] for s in statuses.values()),
+        "flushed": sum(s["flushed"] for s in statuses.values()),
+        "rejected": sum(s["rejected"] for s in statuses.values()),
+        "imported": sum(s.get("imported", 0) for s in statuses.values()),
+        "shards": statuses,
+    }
+
+
+def _list_params(**lists) -> list:
+    return [(key, v) for key, values in lists.items() if values for v in values]
+
+
+@app.get("/billing")
+async def billing(breaker_id: Optional[List[str]] = Query(None), start: Optional[str] = None, end: Optional[str] = None):
+    params = _list_params(breaker_id=breaker_id)
+    params += [(k, v) for k, v in (("start", start), ("end", end)) if v is not None]
+    merged = {}
+    for bill in (await router.get_all(router.nodes_for(breaker_id), "/billing", params)).values():
+        for b, entry in bill.items():
+            # Yeniden shard'lama sonrası bir breaker iki shard'da görünebilir
+            prev = merged.get(b)
+            merged[b] = entry if prev is None else {
+                k: round(prev[k] + entry[k], 2) for k in ("total_energy_kWh", "total_cost_TL")}
+    return merged
+
+
+@app.get("/live/snapshot")
+async def live_snapshot(breaker_id: Optional[List[str]] = Query(None), metric: Optional[List[str]] = Query(None),
+                        n: int = live.LIVE_MAX_POINTS):
+    params = _list_params(breaker_id=breaker_id, metric=metric) + [("n", n)]
+    merged = {}
+    for snapshot in (await router.get_all(router.nodes_for(breaker_id), "/live/snapshot", params)).values():
+        merged.update(snapshot)
+    return merged
+
+
+async def _merged_live(breaker_id, metric, backlog: int, last_event_id: Optional[str]):
+    """Shard'ların SSE akışlarını birleştirir: (imleçler, data) ya da heartbeat için None üretir.
+
+    İmleçler breaker başınadır ve her breaker tek shard'a ait olduğundan birleşik "id"
+    tüm shard'ların imleçlerini taşır; kopan shard akışı kendi imleçleriyle yeniden bağlanır.
+    """
+    cursors = live.parse_cursors(last_event_id) or {}
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(node: str):
+        first = True
+        while True:
+            own = {b: s for b, s in cursors.items() if router.ring.owner(b) == node}
+            params = _list_params(breaker_id=breaker_id, metric=metric)
+            if first and not own:
+                params.append(("backlog", backlog))
+            headers = {"Last-Event-ID": live.format_cursors(own)} if own else {}
+            first = False
+            try:
+                async with router.client.stream("GET", router.urls[node] + "/live/stream", params=params,
+                                                headers=headers, timeout=None) as resp:
+                    event = {}
+                    async for line in resp.aiter_lines():
+                        if line:
+                            if not line.startswith(":"):
+                                field, _, value = line.partition(":")
+                                event[field] = value[1:] if value.startswith(" ") else value
+                            continue
+                        if "data" in event:
+                            await queue.put((node, event))
+                        event = {}
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(2)
+
+    tasks = [asyncio.create_task(pump(node)) for node in router.nodes_for(breaker_id)]
+    try:
+        while True:
+            try:
+                node, event = await asyncio.wait_for(queue.get(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            for name, seq in (live.parse_cursors(event.get("id")) or {}).items():
+                if router.ring.owner(name) == node:
+                    cursors[name] = seq
+            yield live.format_cursors(cursors), event["data"]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.get("/live/stream")
+async def live_stream(request: Request, breaker_id: Optional[List[str]] = Query(None),
+                      metric: Optional[List[str]] = Query(None), backlog: int = 0):
+    try:
+        live.hub.check_fields(metric)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+    async def events():
+        yield "retry: 2000\n\n"
+        async for item in _merged_live(breaker_id, metric, backlog, request.headers.get("last-event-id")):
+            if item is None:
+                yield ": ping\n\n"
+                continue
+            cursor, data = item
+            yield f"id: {cursor}\ndata: {data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.websocket("/live/ws")
+async def live_ws(websocket: WebSocket, breaker_id: Optional[List[str]] = Query(None),
+                  metric: Optional[List[str]] = Query(None), backlog: int = 0):
+    await websocket.accept()
+    try:
+        live.hub.check_fields(metric)
+    except ValueError as exc:
+        await websocket.close(code=1008, reason=str(exc))
+        return
+    try:
+        async for item in _merged_live(breaker_id, metric, backlog, None):
+            await websocket.send_text("{}" if item is None else item[1])
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
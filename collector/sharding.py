@@ -0,0 +1,57 @@
+"""breaker_id'ye göre tutarlı özetleme (consistent hashing) ile shard seçimi.
+
+Her shard halka üzerinde SHARD_VNODES sanal noktayla temsil edilir; bir breaker
+saat yönünde ilk noktanın sahibine gider. Shard eklendiğinde yalnızca yaklaşık
+1/N breaker yer değiştirir, geri kalanların sahibi (ve yazma sırası) aynı kalır.
+"""
+import hashlib
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "128"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def shard_names(n: int) -> List[str]:
+    # İsimler sıraya bağlıdır; sona shard eklemek mevcutların halkadaki yerini değiştirmez
+    return [f"shard-{i}" for i in range(n)]
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str], vnodes: int = SHARD_VNODES):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("Halkada en az bir shard olmalı")
+        points = sorted((_hash(f"{node}#{v}"), node) for node in self.nodes for v in range(vnodes))
+        self._points = np.array([p for p, _ in points], dtype=np.uint64)
+        self._owners = np.array([node for _, node in points], dtype=object)
+        self._cache: Dict[str, str] = {}
+
+    def owner(self, key: str) -> str:
+        node = self._cache.get(key)
+        if node is None:
+            i = int(np.searchsorted(self._points, np.uint64(_hash(key)), side="right")) % len(self._points)
+            node = self._cache[key] = self._owners[i]
+        return node
+
+    def owners(self, keys) -> np.ndarray:
+        """Anahtar dizisi için sahipler; her farklı breaker bir kez özetlenir."""
+        names, inverse = np.unique(np.asarray(keys, dtype=str), return_inverse=True)
+        return np.array([self.owner(name) for name in names.tolist()], dtype=object)[inverse]
+
+    def split(self, keys) -> Dict[str, np.ndarray]:
+        """{shard: satır indeksleri}; shard içinde geliş sırası korunur."""
+        owners = self.owners(keys)
+        return {node: np.flatnonzero(owners == node) for node in self.nodes if (owners == node).any()}
+
+
+def shard_path(path: str, shard: str) -> str:
+    # data/rollups.npz -> data/rollups.shard-0.npz
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{shard}{ext}"
@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+from utils.batch import MeasurementBatch
+
+
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+SEGMENT_FSYNC = os.getenv("SEGMENT_FSYNC", "1") == "1"
+
+
+class LegacyFileStore:
+    # Eski düzen: her ölçüm için ayrı bir {breaker_id}_{timestamp}.json dosyası
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+
+    def append(self, batch: MeasurementBatch) -> List[str]:
+        paths = []
+        for row in batch:
+            m = row.to_model()
+            path = f"{self.data_dir}/{m.breaker_id}_{m.timestamp}.json"
+            with open(path, "w") as f:
+                json.dump(m.model_dump(mode="json"), f)
+            paths.append(path)
+        return paths
+
+    def close(self):
+        pass
+
+
+class SegmentLogStore:
+    """Append-only, boyutu sınırlı segment dosyaları (JSON lines).
+
+    Eşzamanlı yazıcılar group commit ile tek bir write+fsync paylaşır:
+    kuyruğa ilk giren lider olur, bekleyen tüm kayıtları yazar ve diğerlerini uyandırır.
+    """
+
+    def __init__(self, data_dir: str, max_bytes: int = SEGMENT_MAX_BYTES, fsync: bool = SEGMENT_FSYNC):
+        self.data_dir = data_dir
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[int, bytes]] = []
+        self._writing = False
+        self._next_seq = 0        # sıradaki kuyruk numarası
+        self._committed_seq = 0   # diske yazılmış son numara (hariç)
+        # numara -> (yazıldığı segment, hata); her bekleyen yalnızca kendi sonucunu alır
+        self._results: Dict[int, Tuple[str, Exception]] = {}
+
+        self._segment_no = self._last_segment_no()
+        self._file = None
+        self._open_segment()
+
+    # ----- segment yönetimi -----
+    def _segment_path(self, no: int) -> str:
+        return os.path.join(self.data_dir, f"segment-{no:08d}.log")
+
+    def _last_segment_no(self) -> int:
+        nums = [int(name[8:16]) for name in os.listdir(self.data_dir)
+                if name.startswith("segment-") and name.endswith(".log")]
+        return max(nums) if nums else 1
+
+    def _open_segment(self):
+        self._file = open(self._segment_path(self._segment_no), "ab")
+
+    def _rotate(self):
+        self._file.close()
+        self._segment_no += 1
+        self._open_segment()
+
+    # ----- yazma -----
+    def append(self, batch: MeasurementBatch) -> List[str]:
+        # Satır başına düz JSON kaydı; serileştirme kolonlar üzerinden tek seferde yapılır
+        data = batch.to_json_lines()
+        with self._cond:
+            self._next_seq += 1
+            my_seq = self._next_seq
+            self._pending.append((my_seq, data))
+
+            while self._committed_seq < my_seq:
+                if not self._writing:
+                    self._commit_pending()
+                else:
+                    self._cond.wait()
+
+            path, error = self._results.pop(my_seq)
+            if error is not None:
+                raise error
+            return [path]
+
+    def _commit_pending(self):
+        # Lider: bekleyen grubu kilit dışında tek seferde diske yaz
+        batch, self._pending = self._pending, []
+        upto = self._next_seq
+        self._writing = True
+        self._cond.release()
+        paths, error = {}, None
+        try:
+            for seq, chunk in batch:
+                if self._file.tell() + len(chunk) > self.max_bytes and self._file.tell() > 0:
+                    self._file.flush()
+                    if self.fsync:
+                        os.fsync(self._file.fileno())
+                    self._rotate()
+                self._file.write(chunk)
+                paths[seq] = self._segment_path(self._segment_no)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except Exception as exc:
+            # fsync'i tamamlanmamış grubun hiçbir kaydı onaylanmaz
+            error = exc
+        finally:
+            self._cond.acquire()
+            for seq, _ in batch:
+                self._results[seq] = (paths.get(seq), error)
+            self._writing = False
+            self._committed_seq = upto
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ----- okuma -----
+    def segments(self) -> List[str]:
+        names = sorted(n for n in os.listdir(self.data_dir) if n.startswith("segment-") and n.endswith(".log"))
+        return [os.path.join(self.data_dir, n) for n in names]
+
+
+def iter_segment_records(data_dir: str) -> Iterator[dict]:
+    # Segment dosyalarındaki tüm kayıtları yazılma sırasıyla döndürür.
+    # Sharded collector'da her shard'ın log'u {data_dir}/shard-N altındadır; bir breaker'ın
+    # kayıtları tek shard'da olduğundan shard'lar art arda okunur.
+    if not os.path.isdir(data_dir):
+        return
+    for shard in sorted(n for n in os.listdir(data_dir) if n.startswith("shard-")):
+        yield from iter_segment_records(os.path.join(data_dir, shard))
+    names = sorted(n for n in os.listdir(data_dir) if n.startswith("segment-") and n.endswith(".log"))
+    for name in names:
+        with open(os.path.join(data_dir, name), "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):  # yarım kalmış son satırı atla
+                    yield json.loads(line)
+
+
+def flatten(record: dict) -> dict:
+    # RawMeasurement sözlüğünü sample.json'daki düz satır biçimine çevirir (düz kayıtlar olduğu gibi kalır)
+    if "metrics" not in record:
+        return record
+    row = {"breaker_id": record["breaker_id"], "timestamp": record["timestamp"]}
+    row.update(record.get("metrics", {}))
+    return row
+
+
+def get_store(data_dir: str, mode: str = None):
+    mode = mode or os.getenv("STORAGE_MODE", "segment")
+    if mode == "legacy":
+        return LegacyFileStore(data_dir)
+    if mode == "segment":
+        return SegmentLogStore(data_dir)
+    raise ValueError(f"Bilinmeyen STORAGE_MODE: {mode}")
+
@@ -0,0 +1,374 @@
+"""Breaker başına saatlik ve günlük enerji/maliyet özetleri (rollup).
+
+Ölçümler ingest edilirken güncellenir; fatura sorguları ham veriyi taramak yerine
+[breaker, gün] matrisinden cevaplanır, yani maliyet breaker × gün sayısıyla orantılıdır.
+
+Sharded collector'da her worker kendi dosyasını ({ROLLUP_PATH kökü}.shard-N.npz) yazar;
+``load`` ana dosyayı ve shard dosyalarını tek özet olarak birleştirir.
+
+Güncellemeler tekrarlara karşı korumalıdır: her breaker için son ROLLUP_DEDUP_DAYS
+içinde özetlenmiş zaman damgaları tutulur ve aynı (breaker, zaman damgası) ikinci kez
+eklenmez. Yeniden gönderilen partiler böylece iki kez faturalanmaz; sırası bozuk gelen
+geç ya da geriye dönük okumalar kendi gün/saat kovasına eklenir. Breaker'ın en yeni
+okumasından ROLLUP_DEDUP_DAYS'ten daha eski okumalar tekrar olup olmadıkları
+bilinemediği için atlanır (``skipped``) ve ``rebuild`` ile kolon deposundan yeniden
+hesaplanabilir.
+"""
+import glob
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.tariff import PRICE_TL_PER_KWH, TariffBook
+
+
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", "data/rollups.npz")
+ROLLUP_SAVE_INTERVAL = float(os.getenv("ROLLUP_SAVE_INTERVAL", "10"))
+ROLLUP_DEDUP_DAYS = float(os.getenv("ROLLUP_DEDUP_DAYS", "7"))
+
+_DAY_NS = 86_400 * 10**9
+_HOUR_NS = 3_600 * 10**9
+_NO_MARK = np.iinfo(np.int64).min
+
+_cache_lock = threading.Lock()
+_cache = {}  # path -> (dosya imzası, BillingRollups)
+
+
+class BillingRollups:
+    def __init__(self, price: float = PRICE_TL_PER_KWH, tariffs: TariffBook = None,
+                 dedup_days: float = ROLLUP_DEDUP_DAYS):
+        self.price = price
+        self.dedup_ns = int(dedup_days * _DAY_NS)
+        # Maliyetler tarife motoruyla okuma bazında hesaplanır (TARIFF_PATH yoksa sabit fiyat)
+        self.tariffs = tariffs if tariffs is not None else TariffBook.load(price=price)
+        self.breaker_ids: List[str] = []
+        self._index = {}
+        self.origin_day = None  # epoch'tan itibaren gün numarası
+        self.n_days = 0
+        # [breaker, gün, saat] ve [breaker, gün]
+        self.hourly_energy = np.zeros((0, 0, 24))
+        self.hourly_cost = np.zeros((0, 0, 24))
+        self.daily_energy = np.zeros((0, 0))
+        self.daily_cost = np.zeros((0, 0))
+        # breaker başına özetlenmiş en yeni zaman damgası (ns)
+        self.high_water = np.zeros(0, dtype=np.int64)
+        # breaker başına: bu zamandan eski okumalar atlanır; sonrası seen ile tekilleştirilir
+        self.settled = np.zeros(0, dtype=np.int64)
+        self.seen: List[np.ndarray] = []  # breaker başına özetlenmiş zaman damgaları (sıralı)
+        self.skipped = 0  # tekrar ya da çok geç geldiği için atlanan okumalar
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    # ----- boyut yönetimi -----
+    def _breaker_idx(self, ids: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(ids.astype(str), return_inverse=True)
+        mapped = np.empty(len(uniques), dtype=np.int64)
+        for i, b in enumerate(uniques.tolist()):
+            idx = self._index.get(b)
+            if idx is None:
+                idx = len(self.breaker_ids)
+                self._index[b] = idx
+                self.breaker_ids.append(b)
+            mapped[i] = idx
+        if len(self.high_water) < len(self.breaker_ids):
+            extra = len(self.breaker_ids) - len(self.high_water)
+            self.high_water = np.concatenate([self.high_water, np.full(extra, _NO_MARK, dtype=np.int64)])
+            self.settled = np.concatenate([self.settled, np.full(extra, _NO_MARK, dtype=np.int64)])
+            self.seen.extend(np.zeros(0, dtype=np.int64) for _ in range(extra))
+        return mapped[inverse]
+
+    def _ensure(self, n_breakers: int, day_min: int, day_max: int):
+        if self.origin_day is None:
+            self.origin_day = day_min
+        new_origin = min(self.origin_day, day_min)
+        need_days = max(self.origin_day + self.n_days, day_max + 1) - new_origin
+        cap_b, cap_d = self.daily_energy.shape
+        shift = self.origin_day - new_origin
+        if n_breakers <= cap_b and need_days <= cap_d and shift == 0:
+            self.n_days = max(self.n_days, need_days)
+            return
+
+        # Kapasiteyi geometrik büyüt, gerekirse başa gün ekle
+        new_b = max(n_breakers, cap_b * 2 if n_breakers > cap_b else cap_b, 8)
+        new_d = max(need_days, cap_d * 2 if need_days > cap_d else cap_d, shift + cap_d, 32)
+
+        def grow(arr, shape):
+            out = np.zeros(shape)
+            out[:arr.shape[0], shift:shift + arr.shape[1]] = arr
+            return out
+
+        self.hourly_energy = grow(self.hourly_energy, (new_b, new_d, 24))
+        self.hourly_cost = grow(self.hourly_cost, (new_b, new_d, 24))
+        self.daily_energy = grow(self.daily_energy, (new_b, new_d))
+        self.daily_cost = grow(self.daily_cost, (new_b, new_d))
+        self.origin_day = new_origin
+        self.n_days = need_days
+
+    # ----- güncelleme -----
+    def _fresh(self, b_idx: np.ndarray, ts: np.ndarray) -> np.ndarray:
+        """Daha önce özetlenmemiş ve parti içinde tekrar etmeyen satırların maskesi; seen'i günceller."""
+        fresh = ~pd.DataFrame({"b": b_idx, "t": ts}).duplicated(keep="last").to_numpy()
+        for b in np.unique(b_idx[fresh]).tolist():
+            rows = np.flatnonzero(fresh & (b_idx == b))
+            t = ts[rows]
+            seen = self.seen[b]
+            pos = np.minimum(np.searchsorted(seen, t), max(len(seen) - 1, 0))
+            known = seen[pos] == t if len(seen) else np.zeros(len(t), dtype=bool)
+            ok = ~known & (t >= self.settled[b])
+            fresh[rows[~ok]] = False
+            if not ok.any():
+                continue
+            self.high_water[b] = max(int(self.high_water[b]), int(t[ok].max()))
+            # Tekilleştirme penceresi en yeni okumadan geriye ROLLUP_DEDUP_DAYS kadardır
+            self.settled[b] = max(int(self.settled[b]), int(self.high_water[b]) - self.dedup_ns)
+            seen = np.union1d(seen, t[ok])
+            self.seen[b] = seen[np.searchsorted(seen, self.settled[b]):]
+        self.skipped += int(len(ts) - fresh.sum())
+        return fresh
+
+    def update(self, breaker_ids, timestamps, energy, cost=None):
+        """Ölçüm dizilerini özetlere ekler (vektörel, satır döngüsü yok)."""
+        breaker_ids = np.asarray(breaker_ids)
+        if len(breaker_ids) == 0:
+            return
+        ts = np.asarray(pd.to_datetime(timestamps)).astype("datetime64[ns]").astype(np.int64)
+        energy = np.nan_to_num(np.asarray(energy, dtype=np.float64))
+        with self._lock:
+            b_idx = self._breaker_idx(breaker_ids)
+            fresh = self._fresh(b_idx, ts)
+        if not fresh.all():
+            breaker_ids, ts, energy, b_idx = breaker_ids[fresh], ts[fresh], energy[fresh], b_idx[fresh]
+            cost = cost[fresh] if cost is not None else None
+            if not len(ts):
+                return
+        if cost is None:
+            # Aylık kademeler için ayın şimdiye kadarki tüketimi özetlerden alınır
+            cost = self.tariffs.cost(breaker_ids, ts.view("datetime64[ns]"), energy, prior=self.month_energy)
+        else:
+            cost = np.nan_to_num(np.asarray(cost, dtype=np.float64))
+        days = ts // _DAY_NS
+        hours = (ts % _DAY_NS) // _HOUR_NS
+
+        with self._lock:
+            self._ensure(len(self.breaker_ids), int(days.min()), int(days.max()))
+            d_idx = days - self.origin_day
+            np.add.at(self.hourly_energy, (b_idx, d_idx, hours), energy)
+            np.add.at(self.hourly_cost, (b_idx, d_idx, hours), cost)
+            np.add.at(self.daily_energy, (b_idx, d_idx), energy)
+            np.add.at(self.daily_cost, (b_idx, d_idx), cost)
+            self._dirty = True
+
+    def update_measurements(self, batch):
+        """MeasurementBatch ile güncelle (collector flush'ında kullanılır)."""
+        if not len(batch):
+            return
+        self.update(batch.breaker_id, batch.timestamp, batch.metrics["energy"])
+
+    def update_frame(self, df: pd.DataFrame):
+        self.update(df["breaker_id"].to_numpy(), df["timestamp"], df["energy"].to_numpy())
+
+    # ----- sorgu -----
+    def _day_range(self, start, end):
+        lo, hi = 0, self.n_days
+        if start is not None:
+            lo = max(lo, int(pd.Timestamp(start).value // _DAY_NS) - self.origin_day)
+        if end is not None:
+            # end hariç; gün ortasında biten end o günü dahil eder
+            end_ns = pd.Timestamp(end).value
+            hi = min(hi, int(-(-end_ns // _DAY_NS)) - self.origin_day)
+        return lo, max(lo, hi)
+
+    def month_energy(self, breakers: np.ndarray, months: np.ndarray) -> np.ndarray:
+        """(breaker, yerel ay numarası) çiftleri için o ay özetlenmiş toplam kWh (tarife kademeleri için).
+
+        Ay sınırları breaker'ın tarifesinin utc_offset_hours'una göre yerel saattir; özetler
+        saatlik olduğundan tam saatlik kaymalarda sınırlar kesindir.
+        """
+        out = np.zeros(len(breakers))
+        with self._lock:
+            if self.origin_day is None:
+                return out
+            first = np.asarray(months, dtype="datetime64[M]")
+            start_ns = first.astype("datetime64[ns]").view(np.int64)
+            end_ns = (first + 1).astype("datetime64[ns]").view(np.int64)
+            n_hours = self.n_days * 24
+            origin_hour = self.origin_day * 24
+            for i, b in enumerate(list(breakers)):
+                row = self._index.get(b)
+                if row is None:
+                    continue
+                offset = self.tariffs.tariff_for(b).offset_ns
+                a = min(max(int((start_ns[i] - offset) // _HOUR_NS) - origin_hour, 0), n_hours)
+                z = min(max(int((end_ns[i] - offset) // _HOUR_NS) - origin_hour, 0), n_hours)
+                if z > a:
+                    out[i] = self.hourly_energy[row, :self.n_days].reshape(-1)[a:z].sum()
+        return out
+
+    def _rows(self, breakers: Optional[Iterable[str]]):
+        if breakers is None:
+            return slice(0, len(self.breaker_ids)), list(self.breaker_ids)
+        names = [b for b in breakers if b in self._index]
+        return np.array([self._index[b] for b in names], dtype=np.int64), names
+
+    def bill(self, breakers=None, start=None, end=None) -> dict:
+        """breaker_based_billing ile aynı biçimde breaker başına toplam enerji ve maliyet.
+
+        Aralık gün çözünürlüğündedir: start'ın günü dahil, end'in günü (end gece yarısı değilse) dahil.
+        """
+        with self._lock:
+            if self.origin_day is None:
+                return {}
+            rows, names = self._rows(breakers)
+            lo, hi = self._day_range(start, end)
+            energy = self.daily_energy[rows, lo:hi].sum(axis=1)
+            cost = self.daily_cost[rows, lo:hi].sum(axis=1)
+        energy = np.round(energy, 2).tolist()
+        cost = np.round(cost, 2).tolist()
+        return {
+            b: {"total_energy_kWh": e, "total_cost_TL": c}
+            for b, e, c in zip(names, energy, cost)
+        }
+
+    def daily(self, breakers=None, start=None, end=None) -> pd.DataFrame:
+        with self._lock:
+            if self.origin_day is None:
+                return pd.DataFrame(columns=["breaker_id", "date", "energy", "cost_TL"])
+            rows, names = self._rows(breakers)
+            lo, hi = self._day_range(start, end)
+            energy = self.daily_energy[rows, lo:hi]
+            cost = self.daily_cost[rows, lo:hi]
+        dates = pd.to_datetime((np.arange(lo, hi) + self.origin_day) * _DAY_NS)
+        return pd.DataFrame({
+            "breaker_id": np.repeat(names, hi - lo),
+            "date": np.tile(dates.date, len(names)),
+            "energy": energy.ravel(),
+            "cost_TL": cost.ravel(),
+        })
+
+    def hourly(self, breaker_id: str, start=None, end=None) -> pd.DataFrame:
+        with self._lock:
+            if breaker_id not in self._index:
+                return pd.DataFrame(columns=["timestamp", "energy", "cost_TL"])
+            row = self._index[breaker_id]
+            lo, hi = self._day_range(start, end)
+            energy = self.hourly_energy[row, lo:hi].ravel()
+            cost = self.hourly_cost[row, lo:hi].ravel()
+        hours = (np.arange((hi - lo) * 24) + (lo + self.origin_day) * 24) * _HOUR_NS
+        return pd.DataFrame({"timestamp": pd.to_datetime(hours), "energy": energy, "cost_TL": cost})
+
+    # ----- kalıcılık -----
+    def save(self, path: str = ROLLUP_PATH):
+        with self._lock:
+            n_b, n_d = len(self.breaker_ids), self.n_days
+            payload = dict(
+                breaker_ids=np.array(self.breaker_ids, dtype=str),
+                origin_day=np.int64(self.origin_day if self.origin_day is not None else -1),
+                price=np.float64(self.price),
+                hourly_energy=self.hourly_energy[:n_b, :n_d],
+                hourly_cost=self.hourly_cost[:n_b, :n_d],
+                high_water=self.high_water[:n_b],
+                settled=self.settled[:n_b],
+                seen=np.concatenate(self.seen[:n_b]) if n_b else np.zeros(0, dtype=np.int64),
+                seen_counts=np.array([len(s) for s in self.seen[:n_b]], dtype=np.int64),
+            )
+            self._dirty = False
+            self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **payload)
+        os.replace(tmp, path)
+
+    def maybe_save(self, path: str = ROLLUP_PATH, interval: float = ROLLUP_SAVE_INTERVAL):
+        if self._dirty and time.monotonic() - self._last_save >= interval:
+            self.save(path)
+
+    @classmethod
+    def load(cls, path: str = ROLLUP_PATH) -> "BillingRollups":
+        parts = rollup_files(path)
+        if len(parts) > 1:
+            return cls.merge([cls._load_file(p) for p in parts])
+        return cls._load_file(path)
+
+    @classmethod
+    def load_cached(cls, path: str = ROLLUP_PATH) -> "BillingRollups":
+        """load() sonucunu dosyalar (mtime/boyut) değişene kadar paylaşır; yalnızca okuma için."""
+        parts = rollup_files(path)
+        signature = tuple((p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in parts)
+        with _cache_lock:
+            cached = _cache.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        r = cls.load(path)
+        with _cache_lock:
+            _cache[path] = (signature, r)
+        return r
+
+    @classmethod
+    def _load_file(cls, path: str) -> "BillingRollups":
+        r = cls()
+        if not os.path.exists(path):
+            return r
+        with np.load(path) as z:
+            r.price = float(z["price"])
+            r.breaker_ids = [str(b) for b in z["breaker_ids"]]
+            r._index = {b: i for i, b in enumerate(r.breaker_ids)}
+            r.high_water = z["high_water"].astype(np.int64) if "high_water" in z.files else \
+                np.full(len(r.breaker_ids), _NO_MARK, dtype=np.int64)
+            if "seen" in z.files:
+                r.settled = z["settled"].astype(np.int64)
+                counts = z["seen_counts"]
+                r.seen = np.split(z["seen"].astype(np.int64), np.cumsum(counts)[:-1]) if len(counts) else []
+            else:
+                # Eski dosyalarda özetlenen zaman damgaları yok; high-water mark'a kadarı tamam sayılır
+                r.settled = np.where(r.high_water == _NO_MARK, _NO_MARK, r.high_water + 1)
+                r.seen = [np.zeros(0, dtype=np.int64) for _ in r.breaker_ids]
+            origin = int(z["origin_day"])
+            if origin >= 0:
+                r.origin_day = origin
+                r.hourly_energy = z["hourly_energy"].copy()
+                r.hourly_cost = z["hourly_cost"].copy()
+                r.daily_energy = r.hourly_energy.sum(axis=2)
+                r.daily_cost = r.hourly_cost.sum(axis=2)
+                r.n_days = r.daily_energy.shape[1]
+        return r
+
+    @classmethod
+    def merge(cls, parts: List["BillingRollups"]) -> "BillingRollups":
+        """Özetleri toplar (shard'lar breaker'ları paylaşmaz, ama paylaşılan breaker da toplanır)."""
+        r = cls(parts[0].price if parts else PRICE_TL_PER_KWH)
+        for p in parts:
+            if p.origin_day is None:
+                continue
+            n_b, n_d = len(p.breaker_ids), p.n_days
+            b_idx = r._breaker_idx(np.array(p.breaker_ids, dtype=str))
+            np.maximum.at(r.high_water, b_idx, p.high_water[:n_b])
+            np.maximum.at(r.settled, b_idx, p.settled[:n_b])
+            for i, b in enumerate(b_idx.tolist()):
+                r.seen[b] = np.union1d(r.seen[b], p.seen[i])
+            r._ensure(len(r.breaker_ids), p.origin_day, p.origin_day + n_d - 1)
+            days = slice(p.origin_day - r.origin_day, p.origin_day - r.origin_day + n_d)
+            r.hourly_energy[b_idx, days] += p.hourly_energy[:n_b, :n_d]
+            r.hourly_cost[b_idx, days] += p.hourly_cost[:n_b, :n_d]
+            r.daily_energy[b_idx, days] += p.daily_energy[:n_b, :n_d]
+            r.daily_cost[b_idx, days] += p.daily_cost[:n_b, :n_d]
+        return r
+
+    @classmethod
+    def rebuild(cls, store, breakers=None, start=None, end=None) -> "BillingRollups":
+        """Özetleri kolon deposundaki ham veriden sıfırdan oluşturur."""
+        r = cls()
+        for breaker_id in (breakers if breakers is not None else store.breakers()):
+            r.update_frame(store.query([breaker_id], start, end, columns=["energy"]))
+        return r
+
+
+def rollup_files(path: str = ROLLUP_PATH) -> List[str]:
+    """Ana özet dosyası ve (varsa) shard dosyaları."""
+    stem, ext = os.path.splitext(path)
+    shards = sorted(glob.glob(f"{glob.escape(stem)}.shard-*{ext}"))
+    return ([path] if os.path.exists(path) else []) + shards
@@ -0,0 +1,513 @@
+"""Kolon bazlı, breaker_id ve güne göre bölümlenmiş ölçüm deposu.
+
+Disk düzeni:
+
+    {STORE_DIR}/{breaker_id}/{YYYY-MM-DD}/timestamp.npy
+    {STORE_DIR}/{breaker_id}/{YYYY-MM-DD}/{metrik}.npy
+
+Her kolon ayrı bir .npy dosyasıdır; sorgular yalnızca istenen breaker/gün
+bölümlerini ve kolonları memory-map ile açar.
+
+Yazma süreçler arası bir kilitle ({STORE_DIR}/.lock) sıralanır. Bölümün son okumasından
+yeni satırlar kolon dosyalarının sonuna eklenir (önce metrikler, en son timestamp;
+okuyucular satır sınırını timestamp'ten aldığı için yarım ekleme görünmez). Sıra dışı
+satırlar gelirse bölüm yan dizinde yeniden oluşturulur ve yeniden adlandırılarak eskisinin
+yerine geçer.
+"""
+import fcntl
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+STORE_DIR = os.getenv("STORE_DIR", "data/store")
+# Collector segment log'unu depoya bu aralıkla aktarır (sn; 0: aktarmaz)
+STORE_IMPORT_INTERVAL = float(os.getenv("STORE_IMPORT_INTERVAL", "5"))
+IMPORT_CHUNK_BYTES = int(os.getenv("IMPORT_CHUNK_BYTES", str(32 * 1024 * 1024)))
+IMPORT_OFFSETS_FILE = ".imported.json"  # segment adı -> depoya aktarılmış bayt sayısı
+# Tamamen aktarılmış, yazımı bitmiş segmentler bu süre sonra silinir (saat; <0: silinmez)
+SEGMENT_RETENTION_HOURS = float(os.getenv("SEGMENT_RETENTION_HOURS", "24"))
+LOCK_FILE = ".lock"
+PARTITION_RETRIES = 5
+
+METRIC_COLUMNS = [
+    "current", "voltage", "active_power", "reactive_power", "apparent_power",
+    "power_factor", "energy", "leakage_current", "temperature",
+]
+
+TimeLike = Union[str, date, datetime, pd.Timestamp, None]
+
+
+def _to_ts(value: TimeLike) -> Optional[pd.Timestamp]:
+    if value is None:
+        return None
+    return pd.Timestamp(value)
+
+
+def _fit(values: np.ndarray, n: int) -> np.ndarray:
+    # Kolonu timestamp uzunluğuna getirir (yarım kalmış eklemenin artığı atılır)
+    if len(values) >= n:
+        return values[:n]
+    return np.concatenate([values, np.full(n - len(values), np.nan)])
+
+
+def _dedup_order(ts: np.ndarray) -> np.ndarray:
+    # Zamana göre sıralama; aynı zaman damgası tekrar gelirse son yazılan kazanır
+    order = np.argsort(ts, kind="stable")
+    sorted_ts = ts[order]
+    return order[np.r_[sorted_ts[1:] != sorted_ts[:-1], True]]
+
+
+def _append_npy(path: str, n: int, values: np.ndarray) -> bool:
+    """values'u .npy dosyasının ilk n satırından sonra yazar ve başlığı yerinde günceller.
+
+    numpy başlıkta boyut büyümesi için boşluk bırakır; başlık uzunluğu değişecekse ya da
+    dosya beklenen biçimde değilse hiçbir şey yazılmaz ve False döner.
+    """
+    fmt = np.lib.format
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        if version not in ((1, 0), (2, 0)):
+            return False
+        read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        shape, fortran, dtype = read_header(f)
+        offset = f.tell()
+        if fortran or len(shape) != 1 or dtype != values.dtype or shape[0] < n:
+            return False
+        header = io.BytesIO()
+        write_header = fmt.write_array_header_1_0 if version == (1, 0) else fmt.write_array_header_2_0
+        write_header(header, {"descr": fmt.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (n + len(values),)})
+        if header.tell() != offset:
+            return False
+        f.seek(offset + n * dtype.itemsize)
+        f.write(values.tobytes())
+        f.truncate()
+        f.flush()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def swap_partition(new_dir: str, dest: str, old_dir: str):
+    """Yan dizinde hazırlanan bölümü dest'in yerine koyar; eski sürüm old_dir üzerinden silinir."""
+    if os.path.exists(dest):
+        os.replace(dest, old_dir)
+    os.replace(new_dir, dest)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class ColumnStore:
+    def __init__(self, root: str = STORE_DIR, columns: Optional[List[str]] = None):
+        self.root = root
+        # Yazılacak ve varsayılan olarak okunacak kolonlar (özet katmanları kendi kolonlarını verir)
+        self.columns = list(columns) if columns is not None else list(METRIC_COLUMNS)
+
+    # ----- bölüm yardımcıları -----
+    def _partition_dir(self, breaker_id: str, day: str) -> str:
+        return os.path.join(self.root, breaker_id, day)
+
+    def breakers(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root)
+                      if not n.startswith(".") and os.path.isdir(os.path.join(self.root, n)))
+
+    def days(self, breaker_id: str) -> List[str]:
+        path = os.path.join(self.root, breaker_id)
+        if not os.path.isdir(path):
+            return []
+        # "." ile başlayanlar sıkıştırma sırasında kullanılan geçici dizinlerdir
+        return sorted(n for n in os.listdir(path) if not n.startswith("."))
+
+    def _read_column(self, part_dir: str, column: str, n: int, mmap: bool = True) -> np.ndarray:
+        path = os.path.join(part_dir, f"{column}.npy")
+        if not os.path.exists(path):
+            return np.full(n, np.nan)
+        return np.load(path, mmap_mode="r" if mmap else None)
+
+    @staticmethod
+    def _stored_columns(part_dir: str) -> List[str]:
+        return sorted(f[:-4] for f in os.listdir(part_dir)
+                      if f.endswith(".npy") and not f.startswith(".") and f != "timestamp.npy")
+
+    def open_partition(self, breaker_id: str, day: str, columns: Iterable[str] = ()):
+        """Bölümün timestamp'ini ve kolonlarını aynı sürümden açar (mmap); bölüm yoksa None.
+
+        Açma sırasında bölüm yer değiştirirse (dizin inode'u değişir) yeniden denenir.
+        Kolonlar timestamp'ten uzun olabilir; geçerli satırlar ilk len(timestamp) kadardır.
+        """
+        part_dir = self._partition_dir(breaker_id, day)
+        for _ in range(PARTITION_RETRIES):
+            try:
+                ino = os.stat(part_dir).st_ino
+                ts = np.load(os.path.join(part_dir, "timestamp.npy"), mmap_mode="r")
+                cols = {c: self._read_column(part_dir, c, len(ts)) for c in columns}
+                if os.stat(part_dir).st_ino == ino:
+                    return ts, cols
+            except FileNotFoundError:
+                pass
+            time.sleep(0.01)
+        return None
+
+    @contextmanager
+    def lock(self):
+        """Depo genelinde süreçler arası özel kilit; yazma ve sıkıştırma bu kilidi alır."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ----- yazma -----
+    def write(self, df: pd.DataFrame):
+        """Düz ölçüm satırlarını (breaker_id, timestamp, metrikler) ilgili bölümlere ekler."""
+        if df.empty:
+            return
+        df = df.copy()
+        df["timestamp"] = pd.to_datetime(df["timestamp"]).astype("datetime64[ns]")
+        df["_day"] = df["timestamp"].dt.strftime("%Y-%m-%d")
+        columns = [c for c in self.columns if c in df.columns]
+
+        with self.lock():
+            for (breaker_id, day), part in df.groupby(["breaker_id", "_day"], sort=False):
+                ts = part["timestamp"].to_numpy().astype("int64")
+                order = _dedup_order(ts)
+                cols = {c: part[c].to_numpy(dtype="float64")[order] for c in columns}
+                self._write_partition(breaker_id, day, ts[order], cols)
+
+    def _write_partition(self, breaker_id: str, day: str, ts: np.ndarray, cols: Dict[str, np.ndarray]):
+        part_dir = self._partition_dir(breaker_id, day)
+        ts_path = os.path.join(part_dir, "timestamp.npy")
+        if not os.path.exists(ts_path):
+            self._replace_partition(breaker_id, day, ts, cols)
+            return
+
+        old_ts = np.load(ts_path, mmap_mode="r")
+        n = len(old_ts)
+        if (n == 0 or ts[0] > old_ts[-1]) and self._append(part_dir, n, ts, cols):
+            return
+
+        # Sıra dışı ya da tekrar gelen satırlar: bölüm birleştirilip yeniden yazılır
+        all_ts = np.concatenate([np.asarray(old_ts), ts])
+        order = _dedup_order(all_ts)
+        merged = {}
+        for c in set(cols) | set(self._stored_columns(part_dir)):
+            old = _fit(self._read_column(part_dir, c, n, mmap=False), n)
+            merged[c] = np.concatenate([old, cols.get(c, np.full(len(ts), np.nan))])[order]
+        self._replace_partition(breaker_id, day, all_ts[order], merged)
+
+    def _append(self, part_dir: str, n: int, ts: np.ndarray, cols: Dict[str, np.ndarray]) -> bool:
+        # Metrikler önce, timestamp en son: okuyucu yeni satırları ancak hepsi yazılınca görür
+        for c in sorted(set(cols) | set(self._stored_columns(part_dir))):
+            values = cols.get(c, np.full(len(ts), np.nan))
+            path = os.path.join(part_dir, f"{c}.npy")
+            if not os.path.exists(path):
+                self._save(part_dir, c, np.concatenate([np.full(n, np.nan), values]))
+            elif not _append_npy(path, n, values):
+                return False
+        return _append_npy(os.path.join(part_dir, "timestamp.npy"), n, ts)
+
+    def _replace_partition(self, breaker_id: str, day: str, ts: np.ndarray, cols: Dict[str, np.ndarray]):
+        # Yeni sürüm yan dizinde hazırlanır, sonra yeniden adlandırılarak yerine geçer
+        parent = os.path.join(self.root, breaker_id)
+        token = uuid.uuid4().hex[:12]
+        new_dir = os.path.join(parent, f".{day}.new-{token}")
+        os.makedirs(new_dir)
+        for c, values in cols.items():
+            np.save(os.path.join(new_dir, f"{c}.npy"), values)
+        np.save(os.path.join(new_dir, "timestamp.npy"), ts)
+        swap_partition(new_dir, self._partition_dir(breaker_id, day), os.path.join(parent, f".{day}.old-{token}"))
+
+    @staticmethod
+    def _save(part_dir: str, column: str, values: np.ndarray):
+        # Önce geçici dosyaya yaz, sonra atomik olarak yer değiştir
+        tmp = os.path.join(part_dir, f".{column}.tmp.npy")
+        np.save(tmp, values)
+        os.replace(tmp, os.path.join(part_dir, f"{column}.npy"))
+
+    def recover(self):
+        """Yarıda kalmış bölüm değişimlerini tamamlar ya da atar.
+
+        Eski sürüm ``.{gün}.old-{belirteç}`` adına taşınmışsa yeni sürüm tamdır ve yerine
+        konur; aksi halde yan dizin yarım kalmıştır ve silinir (kaynağı yeniden işlenir).
+        """
+        with self.lock():
+            for breaker_id in self.breakers():
+                parent = os.path.join(self.root, breaker_id)
+                names = set(os.listdir(parent))
+                for name in sorted(names):
+                    if not name.startswith(".") or ".new-" not in name:
+                        continue
+                    day, token = name[1:].split(".new-")
+                    old = f".{day}.old-{token}"
+                    if old in names and day not in names:
+                        swap_partition(os.path.join(parent, name), os.path.join(parent, day),
+                                       os.path.join(parent, old))
+                    else:
+                        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+                for name in os.listdir(parent):
+                    if name.startswith(".") and ".old-" in name:
+                        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+    # ----- okuma -----
+    def query(self, breakers: Optional[Iterable[str]] = None, start: TimeLike = None,
+              end: TimeLike = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """[start, end) aralığındaki ölçümleri döndürür.
+
+        Yalnızca aralıkla kesişen gün bölümleri ve istenen kolonlar okunur.
+        Dönen DataFrame her zaman ``breaker_id`` ve ``timestamp`` kolonlarını içerir.
+        """
+        start_ts, end_ts = _to_ts(start), _to_ts(end)
+        columns = list(columns) if columns is not None else list(self.columns)
+        breakers = list(breakers) if breakers is not None else self.breakers()
+
+        first_day = start_ts.strftime("%Y-%m-%d") if start_ts is not None else None
+        last_day = end_ts.strftime("%Y-%m-%d") if end_ts is not None else None
+        start_ns = start_ts.value if start_ts is not None else None
+        end_ns = end_ts.value if end_ts is not None else None
+
+        frames_ids, frames_ts = [], []
+        frames_cols = {c: [] for c in columns}
+        for breaker_id in breakers:
+            for day in self.days(breaker_id):
+                if first_day is not None and day < first_day:
+                    continue
+                if last_day is not None and day > last_day:
+                    break
+                opened = self.open_partition(breaker_id, day, columns)
+                if opened is None:
+                    continue
+                ts, cols = opened
+                lo = 0 if start_ns is None else int(np.searchsorted(ts, start_ns, side="left"))
+                hi = len(ts) if end_ns is None else int(np.searchsorted(ts, end_ns, side="left"))
+                if hi <= lo:
+                    continue
+                frames_ts.append(np.asarray(ts[lo:hi]))
+                frames_ids.append(np.full(hi - lo, breaker_id, dtype=object))
+                for c in columns:
+                    frames_cols[c].append(np.asarray(cols[c][lo:hi]))
+
+        if not frames_ts:
+            empty = {"breaker_id": pd.Series([], dtype=object),
+                     "timestamp": pd.Series([], dtype="datetime64[ns]")}
+            empty.update({c: pd.Series([], dtype="float64") for c in columns})
+            return pd.DataFrame(empty)
+
+        out = {
+            "breaker_id": np.concatenate(frames_ids),
+            "timestamp": np.concatenate(frames_ts).view("datetime64[ns]"),
+        }
+        for c in columns:
+            out[c] = np.concatenate(frames_cols[c])
+        return pd.DataFrame(out)
+
+    def max_timestamp(self, breakers: Optional[Iterable[str]] = None) -> Optional[pd.Timestamp]:
+        latest = None
+        for breaker_id in (breakers if breakers is not None else self.breakers()):
+            days = self.days(breaker_id)
+            opened = self.open_partition(breaker_id, days[-1]) if days else None
+            if opened is None:
+                continue
+            ts = opened[0]
+            if len(ts) and (latest is None or ts[-1] > latest):
+                latest = int(ts[-1])
+        return pd.Timestamp(latest) if latest is not None else None
+
+
+# ----- içe aktarma -----
+def import_json(json_path: str, store: Optional[ColumnStore] = None):
+    """sample.json biçimindeki düz ölçüm listesini depoya aktarır."""
+    store = store or ColumnStore()
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    store.write(pd.DataFrame(data))
+    return store
+
+
+class SegmentImporter:
+    """Collector segment log'unu kaldığı yerden depoya aktarır.
+
+    Her dizin için segment başına aktarılmış bayt sayısı {dizin}/.imported.json'da tutulur;
+    yalnızca tamamlanmış (satır sonuyla biten) satırlar okunur. Konum depo yazımından sonra
+    kaydedildiği için kesinti sonrası aynı satırlar yeniden yazılabilir; depo aynı zaman
+    damgasını tekrar eklemediğinden sonuç değişmez.
+
+    Sonuna kadar aktarılmış ve yazıcının artık kullanmadığı (en yüksek numaralı olmayan)
+    segmentler retention_hours sonra silinir; log diskte sınırsız büyümez.
+
+    STORAGE_MODE=legacy'nin ölçüm başına {breaker_id}_{timestamp}.json dosyaları da aynı
+    konum dosyasıyla (dosya adı -> boyut) aktarılır; bu dosyalar silinmez.
+    """
+
+    def __init__(self, raw_dir: str, store: Optional[ColumnStore] = None, interval: float = STORE_IMPORT_INTERVAL,
+                 chunk_bytes: int = IMPORT_CHUNK_BYTES, retention_hours: float = SEGMENT_RETENTION_HOURS):
+        self.raw_dir = raw_dir
+        self.store = store or ColumnStore()
+        self.interval = interval
+        self.chunk_bytes = chunk_bytes
+        self.retention_hours = retention_hours
+        self.imported = 0
+        self.expired = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _dirs(self) -> List[str]:
+        # Sharded collector'da her shard'ın log'u {raw_dir}/shard-N altındadır
+        if not os.path.isdir(self.raw_dir):
+            return []
+        shards = sorted(n for n in os.listdir(self.raw_dir) if n.startswith("shard-"))
+        return [self.raw_dir] + [os.path.join(self.raw_dir, n) for n in shards]
+
+    @staticmethod
+    def load_offsets(data_dir: str) -> Dict[str, int]:
+        try:
+            with open(os.path.join(data_dir, IMPORT_OFFSETS_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_offsets(data_dir: str, offsets: Dict[str, int]):
+        tmp = os.path.join(data_dir, f".{IMPORT_OFFSETS_FILE}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(offsets, f)
+        os.replace(tmp, os.path.join(data_dir, IMPORT_OFFSETS_FILE))
+
+    def run_once(self) -> int:
+        """Yeni satırları aktarır; aktarılan satır sayısını döndürür."""
+        from collector.storage import flatten
+
+        total = 0
+        for data_dir in self._dirs():
+            names = sorted(n for n in os.listdir(data_dir) if n.startswith("segment-") and n.endswith(".log"))
+            offsets = self.load_offsets(data_dir)
+            for name in names:
+                path = os.path.join(data_dir, name)
+                pos = offsets.get(name, 0)
+                while pos < os.path.getsize(path):
+                    with open(path, "rb") as f:
+                        f.seek(pos)
+                        chunk = f.read(self.chunk_bytes)
+                    end = chunk.rfind(b"\n") + 1
+                    if end == 0:
+                        break  # yarım satır; yazılması bitince alınır
+                    rows = [flatten(json.loads(line)) for line in chunk[:end].splitlines() if line.strip()]
+                    if rows:
+                        self.store.write(pd.DataFrame(rows))
+                    pos += end
+                    offsets[name] = pos
+                    self._save_offsets(data_dir, offsets)
+                    total += len(rows)
+            names = self._expire(data_dir, names, offsets)
+            legacy = self._import_legacy(data_dir, offsets)
+            total += legacy[0]
+            names += legacy[1]
+            # Silinmiş segmentlerin konumları atılır
+            if set(offsets) - set(names):
+                self._save_offsets(data_dir, {n: offsets[n] for n in names if n in offsets})
+        self.imported += total
+        return total
+
+    def _import_legacy(self, data_dir: str, offsets: Dict[str, int]):
+        """Ölçüm başına JSON dosyalarından yenilerini aktarır; (satır sayısı, dosya adları)."""
+        from collector.storage import flatten
+
+        names = sorted(n for n in os.listdir(data_dir) if n.endswith(".json") and not n.startswith("."))
+        rows, done = [], {}
+        for name in names:
+            path = os.path.join(data_dir, name)
+            size = os.path.getsize(path)
+            if offsets.get(name) == size:
+                continue
+            try:
+                with open(path) as f:
+                    rows.append(flatten(json.load(f)))
+            except ValueError:
+                continue  # hâlâ yazılıyor; sonraki turda alınır
+            done[name] = size
+        if rows:
+            self.store.write(pd.DataFrame(rows))
+            offsets.update(done)
+            self._save_offsets(data_dir, offsets)
+        return len(rows), names
+
+    def _expire(self, data_dir: str, names: List[str], offsets: Dict[str, int]) -> List[str]:
+        """Süresi dolan aktarılmış segmentleri siler; kalan segment adlarını döndürür."""
+        if self.retention_hours < 0 or not names:
+            return names
+        cutoff = time.time() - self.retention_hours * 3600
+        kept = [names[-1]]  # yazıcının açık segmenti
+        for name in names[:-1]:
+            path = os.path.join(data_dir, name)
+            st = os.stat(path)
+            if offsets.get(name, 0) >= st.st_size and st.st_mtime < cutoff:
+                os.remove(path)
+                self.expired += 1
+            else:
+                kept.append(name)
+        return sorted(kept)
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="segment-importer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            # Kapanışta son flush'lar da aktarılır
+            self._run_safely()
+
+    def _run_safely(self):
+        try:
+            self.run_once()
+        except Exception as e:
+            print(f"⚠️ Segment aktarımı başarısız: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._run_safely()
+
+
+def import_segments(raw_dir: str, store: Optional[ColumnStore] = None):
+    """Collector'ın segment log'undaki henüz aktarılmamış kayıtları depoya aktarır."""
+    store = store or ColumnStore()
+    SegmentImporter(raw_dir, store).run_once()
+    return store
+
+
+def last_days(n: int, end: TimeLike = None):
+    """Son n günü kapsayan (start, end) aralığı; end verilmezse bugünün sonu."""
+    end_ts = _to_ts(end) or pd.Timestamp(datetime.now().date() + timedelta(days=1))
+    return end_ts - pd.Timedelta(days=n), end_ts
+
+
+if __name__ == "__main__":
+    # python -m data.store import-json data/sample.json
+    # python -m data.store import-segments data/raw
+    cmd, path = sys.argv[1], sys.argv[2]
+    if cmd == "import-json":
+        import_json(path)
+    elif cmd == "import-segments":
+        import_segments(path)
+    else:
+        raise SystemExit(f"Bilinmeyen komut: {cmd}")
+    print(f"Depo güncellendi: {STORE_DIR}")
@@ -0,0 +1,297 @@
+"""Zaman dilimli (çok zamanlı) ve kademeli tarife motoru.
+
+Tarifeler bildirimsel bir JSON dosyasından (TARIFF_PATH) okunur:
+
+    {
+      "default": "mesken",
+      "assign": {"B7": "ticari"},                 # breaker -> tarife (site sözleşmeleri)
+      "tariffs": {
+        "mesken": {
+          "rate": 2.1,                            # bantların kapsamadığı saatler (TL/kWh)
+          "utc_offset_hours": 0,                  # zaman damgaları UTC ise yerel saate kaydırma
+          "bands": [
+            {"name": "gece", "start": "22:00", "end": "06:00", "rate": 1.3},
+            {"name": "puant", "start": "17:00", "end": "22:00", "rate": 3.2, "days": [0, 1, 2, 3, 4]}
+          ],
+          "tiers": [                              # aylık kademeler (breaker başına)
+            {"upto_kWh": 150, "multiplier": 1.0},
+            {"multiplier": 1.35}
+          ]
+        }
+      }
+    }
+
+Bant ataması vektöreldir: her okumanın hafta içindeki dakikası bant sınırlarında
+``searchsorted`` ile aranır (günler 0=Pazartesi; sonraki bant öncekini ezer). Kademeler
+için okumalar (breaker, ay) gruplarında kümülatif toplanır; bir kademe eşiğini aşan
+okuma iki kademe arasında bölünür. Dosya yoksa tek fiyatlı (PRICE_TL_PER_KWH) tarife
+kullanılır ve sonuçlar eski sabit çarpanla aynıdır.
+"""
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+TARIFF_PATH = os.getenv("TARIFF_PATH", "data/tariffs.json")
+PRICE_TL_PER_KWH = 2.1  # 1 kWh = 2.1 TL varsayımı
+
+_MINUTE_NS = 60 * 10**9
+_WEEK_MINUTES = 7 * 1440
+
+# (breaker adları, ay numaraları) -> o ay daha önce tüketilmiş kWh
+PriorFn = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def _minute(text: str) -> int:
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _factorize(breaker_ids):
+    # Hash tabanlı; sıralama yapmadığı için milyonlarca satırda np.unique'ten hızlı
+    codes, uniques = pd.factorize(np.asarray(breaker_ids, dtype=object))
+    return np.asarray(uniques, dtype=object).astype(str), codes
+
+
+class Tariff:
+    def __init__(self, name: str, rate: float, bands: List[dict] = (), tiers: List[dict] = (),
+                 utc_offset_hours: float = 0.0):
+        self.name = name
+        self.offset_ns = int(utc_offset_hours * 3600 * 10**9)
+        self.band_names = ["normal"] + [b["name"] for b in bands]
+        self.band_rates = np.array([rate] + [float(b["rate"]) for b in bands])
+
+        # Haftanın her dakikasına bant numarası boyanır, sonra değişim noktalarına sıkıştırılır
+        week = np.zeros(_WEEK_MINUTES, dtype=np.int64)
+        for i, band in enumerate(bands, start=1):
+            start = _minute(band.get("start", "00:00"))
+            end = _minute(band.get("end", "24:00"))
+            for day in band.get("days", range(7)):
+                lo = day * 1440 + start
+                hi = day * 1440 + end if end > start else (day + 1) * 1440 + end  # gece yarısını aşan bant
+                idx = np.arange(lo, hi) % _WEEK_MINUTES
+                week[idx] = i
+        change = np.flatnonzero(np.r_[True, week[1:] != week[:-1]])
+        self.bounds = change                 # segment başlangıç dakikaları
+        self.segment_band = week[change]
+        self.average_rate = float(self.band_rates[week].mean())  # düz yük profilinde ortalama fiyat
+
+        # Kademeler: [alt, üst) kWh aralıkları ve çarpanları
+        edges, mults, lo = [], [], 0.0
+        for tier in tiers:
+            hi = tier.get("upto_kWh")
+            hi = np.inf if hi is None else float(hi)
+            edges.append((lo, hi))
+            mults.append(float(tier.get("multiplier", 1.0)))
+            lo = hi
+        self.tier_edges = edges
+        self.tier_multipliers = mults
+
+    @classmethod
+    def from_dict(cls, name: str, spec: dict) -> "Tariff":
+        return cls(name, float(spec.get("rate", PRICE_TL_PER_KWH)), spec.get("bands", []),
+                   spec.get("tiers", []), float(spec.get("utc_offset_hours", 0.0)))
+
+    def local(self, ts_ns: np.ndarray) -> np.ndarray:
+        return ts_ns + self.offset_ns
+
+    def bands(self, ts_ns: np.ndarray) -> np.ndarray:
+        """Okuma başına bant numarası (band_names indeksi)."""
+        minutes = self.local(ts_ns) // _MINUTE_NS
+        # 1970-01-01 Perşembe: +3 gün ile 0=Pazartesi
+        minute_of_week = (minutes + 3 * 1440) % _WEEK_MINUTES
+        seg = np.searchsorted(self.bounds, minute_of_week, side="right") - 1
+        return self.segment_band[seg]
+
+    def tiered(self, energy: np.ndarray, before: np.ndarray) -> np.ndarray:
+        """Kademe çarpanlarıyla ağırlıklı enerji; before okumadan önceki aylık kümülatif kWh."""
+        if not self.tier_edges:
+            return energy
+        after = before + energy
+        weighted = np.zeros_like(energy)
+        for (lo, hi), mult in zip(self.tier_edges, self.tier_multipliers):
+            weighted += mult * (np.clip(after, lo, hi) - np.clip(before, lo, hi))
+        return weighted
+
+
+class TariffBook:
+    """Breaker'lara atanmış tarifeler; maliyetler okuma dizileri üzerinde vektörel hesaplanır."""
+
+    def __init__(self, tariffs: Dict[str, Tariff], default: str, assign: Dict[str, str] = None):
+        self.tariffs = tariffs
+        self.default = default
+        self.assign = dict(assign or {})
+        self._order = list(tariffs)
+        self._codes = {name: i for i, name in enumerate(self._order)}
+
+    @classmethod
+    def flat(cls, price: float = PRICE_TL_PER_KWH) -> "TariffBook":
+        return cls({"sabit": Tariff("sabit", price)}, "sabit")
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "TariffBook":
+        tariffs = {name: Tariff.from_dict(name, t) for name, t in spec["tariffs"].items()}
+        default = spec.get("default") or next(iter(tariffs))
+        unknown = {t for t in spec.get("assign", {}).values() if t not in tariffs} | ({default} - set(tariffs))
+        if unknown:
+            raise ValueError(f"Tanımsız tarife: {', '.join(sorted(unknown))}")
+        return cls(tariffs, default, spec.get("assign"))
+
+    @classmethod
+    def load(cls, path: str = TARIFF_PATH, price: float = PRICE_TL_PER_KWH) -> "TariffBook":
+        if not os.path.exists(path):
+            return cls.flat(price)
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def tariff_for(self, breaker_id: str) -> Tariff:
+        return self.tariffs[self.assign.get(breaker_id, self.default)]
+
+    @property
+    def has_tiers(self) -> bool:
+        return any(t.tier_edges for t in self.tariffs.values())
+
+    def month_start(self, ts) -> pd.Timestamp:
+        """ts'yi içeren yerel ayın başı (UTC, saf); tarifeler arasında en erkeni.
+
+        Sorgu ay ortasından başlıyorsa kademe kümülatifi için buradan itibaren okunur.
+        """
+        ts = pd.Timestamp(ts)
+        if ts.tz is not None:
+            ts = ts.tz_convert(None)
+        starts = []
+        for tariff in self.tariffs.values():
+            offset = pd.Timedelta(tariff.offset_ns, "ns")
+            starts.append((ts + offset).to_period("M").to_timestamp() - offset)
+        return min(starts)
+
+    def month_totals(self, breaker_ids, timestamps, energy) -> PriorFn:
+        """Okumaların (breaker, yerel ay) toplamlarını cost()'a verilecek prior olarak döndürür."""
+        ts = np.asarray(timestamps).astype("datetime64[ns]").view(np.int64)
+        energy = np.nan_to_num(np.asarray(energy, dtype=np.float64))
+        totals = {}
+        if len(ts):
+            names, inverse = _factorize(breaker_ids)
+            for tariff, rows in self._groups(names, inverse):
+                t, e, b = (ts, energy, inverse) if rows is None else (ts[rows], energy[rows], inverse[rows])
+                months = tariff.local(t).view("datetime64[ns]").astype("datetime64[M]").view(np.int64)
+                sums = pd.DataFrame({"b": names[b], "m": months, "e": e}).groupby(["b", "m"])["e"].sum()
+                totals.update(zip(sums.index.tolist(), sums.tolist()))
+
+        def prior(names: np.ndarray, months: np.ndarray) -> np.ndarray:
+            return np.array([totals.get((b, int(m)), 0.0) for b, m in zip(names.tolist(), np.asarray(months).tolist())])
+        return prior
+
+    def _groups(self, names: np.ndarray, inverse: np.ndarray):
+        # Tarife başına satır indeksleri; tek tarife varken indeksleme yapılmaz (rows=None)
+        codes = np.array([self._codes[self.assign.get(n, self.default)] for n in names.tolist()], dtype=np.int64)
+        used = np.unique(codes).tolist()
+        if len(used) == 1:
+            yield self.tariffs[self._order[used[0]]], None
+            return
+        row_codes = codes[inverse]
+        for code in used:
+            yield self.tariffs[self._order[code]], np.flatnonzero(row_codes == code)
+
+    # ----- okuma bazında -----
+    def cost(self, breaker_ids, timestamps, energy, prior: Optional[PriorFn] = None, return_bands: bool = False):
+        """Okuma başına TL (ve istenirse bant adı dizisi).
+
+        Kademeler için okumalar breaker ve ay içinde zaman sırasıyla birikir; prior
+        verilirse her (breaker, ay) grubunun başlangıç kümülatifi ondan alınır.
+        """
+        ts = np.asarray(timestamps).astype("datetime64[ns]").view(np.int64)
+        energy = np.nan_to_num(np.asarray(energy, dtype=np.float64))
+        out = np.empty(len(ts))
+        bands = np.empty(len(ts), dtype=object) if return_bands else None
+        if not len(ts):
+            return (out, bands) if return_bands else out
+        names, inverse = _factorize(breaker_ids)
+
+        for tariff, rows in self._groups(names, inverse):
+            t, e, b_code = (ts, energy, inverse) if rows is None else (ts[rows], energy[rows], inverse[rows])
+            band = tariff.bands(t)
+            rate = tariff.band_rates[band]
+            if tariff.tier_edges:
+                weighted = self._tier_weighted(tariff, names, b_code, t, e, prior)
+            else:
+                weighted = e
+            if rows is None:
+                out[:] = rate * weighted
+            else:
+                out[rows] = rate * weighted
+            if return_bands:
+                labels = np.array(tariff.band_names, dtype=object)[band]
+                if rows is None:
+                    bands[:] = labels
+                else:
+                    bands[rows] = labels
+        return (out, bands) if return_bands else out
+
+    @staticmethod
+    def _tier_weighted(tariff: Tariff, names, b_code, ts, energy, prior):
+        months = tariff.local(ts).view("datetime64[ns]").astype("datetime64[M]").view(np.int64)
+        key = b_code.astype(np.int64) * 100_000 + months
+        # Depodan gelen okumalar breaker ve zamana göre sıralıdır; değilse sıralanır
+        d_key, d_ts = np.diff(key), np.diff(ts)
+        order = None if ((d_key > 0) | ((d_key == 0) & (d_ts >= 0))).all() else np.lexsort((ts, key))
+        if order is not None:
+            key, energy, b_code, months = key[order], energy[order], b_code[order], months[order]
+
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        lengths = np.diff(np.r_[starts, len(key)])
+        cum = np.cumsum(energy)
+        group_base = cum[starts] - energy[starts]
+        if prior is not None:
+            group_base = group_base - np.asarray(prior(names[b_code[starts]], months[starts]), dtype=np.float64)
+        before = cum - energy - np.repeat(group_base, lengths)
+        weighted = tariff.tiered(energy, before)
+        if order is None:
+            return weighted
+        out = np.empty_like(weighted)
+        out[order] = weighted
+        return out
+
+    # ----- özetler -----
+    def bill(self, df: pd.DataFrame, prior: Optional[PriorFn] = None) -> dict:
+        """Breaker başına toplam enerji, maliyet ve bant dağılımı."""
+        if df.empty:
+            return {}
+        cost, bands = self.cost(df["breaker_id"].to_numpy(), df["timestamp"].to_numpy(), df["energy"].to_numpy(),
+                                prior, return_bands=True)
+        energy = np.nan_to_num(df["energy"].to_numpy(dtype=np.float64))
+        frame = pd.DataFrame({"breaker_id": df["breaker_id"].to_numpy(), "band": bands,
+                              "energy": energy, "cost": cost})
+        by_band = frame.groupby(["breaker_id", "band"], sort=True)[["energy", "cost"]].sum()
+        totals = by_band.groupby(level=0).sum()
+        out = {
+            b: {"total_energy_kWh": round(e, 2), "total_cost_TL": round(c, 2), "bands": {}}
+            for b, e, c in zip(totals.index.tolist(), totals["energy"].tolist(), totals["cost"].tolist())
+        }
+        for (b, band), e, c in zip(by_band.index.tolist(), by_band["energy"].tolist(), by_band["cost"].tolist()):
+            out[b]["bands"][band] = {"energy_kWh": round(e, 2), "cost_TL": round(c, 2)}
+        return out
+
+    def estimate(self, breaker_ids, energy_kWh, prior_kWh=None) -> np.ndarray:
+        """Tahmin edilen tüketim (senaryo başına kWh) için TL.
+
+        Zaman bilgisi olmadığından düz yük profilinde haftalık ortalama bant fiyatı
+        kullanılır; kademeler ayın başından (ya da prior_kWh'den) itibaren uygulanır.
+        """
+        energy = np.nan_to_num(np.asarray(energy_kWh, dtype=np.float64))
+        ids = np.broadcast_to(np.asarray(breaker_ids if breaker_ids is not None else "", dtype=object), energy.shape)
+        before = np.zeros_like(energy) if prior_kWh is None else np.broadcast_to(
+            np.asarray(prior_kWh, dtype=np.float64), energy.shape)
+        out = np.empty_like(energy)
+        names, inverse = _factorize(ids)
+        for tariff, rows in self._groups(names, inverse):
+            e, b = (energy, before) if rows is None else (energy[rows], before[rows])
+            cost = tariff.average_rate * tariff.tiered(e, b)
+            if rows is None:
+                out[:] = cost
+            else:
+                out[rows] = cost
+        return out
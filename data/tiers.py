@@ -0,0 +1,397 @@
+"""Kademeli saklama: ham okumaların 1 dakikalık ve 1 saatlik özetlere sıkıştırılması.
+
+Disk düzeni (her katman bir ColumnStore'dur, gün bölümleri aynıdır):
+
+    {STORE_DIR}/...                   ham okumalar
+    {TIER_DIR}/1min/{breaker_id}/{YYYY-MM-DD}/{kolon}.npy
+    {TIER_DIR}/1h/{breaker_id}/{YYYY-MM-DD}/{kolon}.npy
+
+Özet bölümlerinde her metrik için düz kolon (ortalama; ``energy`` için toplam),
+``{metrik}_min`` ve ``{metrik}_max`` kolonları ile kova başına okuma sayısı ``count``
+bulunur; diğer metriklerin toplamı ortalama × count olarak elde edilir. Düz kolonlar sayesinde özet katmanları ColumnStore.query
+sözleşmesiyle okunur ve ``energy`` toplamları fatura hesaplarında doğru kalır.
+
+Sıkıştırma gün bölümü bazındadır: RAW_RETENTION_DAYS'ten eski ham günler 1 dakikalık
+katmana, TIER_1MIN_RETENTION_DAYS'ten eski 1 dakikalık günler 1 saatlik katmana taşınır;
+TIER_1H_RETENTION_DAYS'ten eski saatlik günler silinir (0: süresiz saklanır).
+Bölüm taşıma/silme kaynak deponun kilidini, özet yazımı hedef katmanın kilidini alır;
+böylece ColumnStore.write'ın oku-değiştir-yaz adımıyla yarışmaz.
+
+    python -m data.tiers compact
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.store import ColumnStore, METRIC_COLUMNS, STORE_DIR, TimeLike, swap_partition
+from utils import metrics
+
+
+TIER_DIR = os.getenv("TIER_DIR", "data/tiers")
+RAW_RETENTION_DAYS = float(os.getenv("RAW_RETENTION_DAYS", "7"))
+TIER_1MIN_RETENTION_DAYS = float(os.getenv("TIER_1MIN_RETENTION_DAYS", "90"))
+TIER_1H_RETENTION_DAYS = float(os.getenv("TIER_1H_RETENTION_DAYS", "0"))   # 0: süresiz
+COMPACTION_INTERVAL = float(os.getenv("COMPACTION_INTERVAL", "3600"))      # sn; 0: arka planda çalışmaz
+
+AGGREGATES = ("min", "max")
+AGG_COLUMNS = list(METRIC_COLUMNS) + [f"{m}_{a}" for m in METRIC_COLUMNS for a in AGGREGATES] + ["count"]
+SUM_COLUMNS = {"energy"}  # düz kolonu ortalama değil toplam olan metrikler
+SOURCES_FILE = "_sources.json"  # bölüme işlenmiş kaynakların belirteçleri (tekrar işlemeye karşı)
+
+COMPACTED = metrics.counter("kilowizard_compacted_partitions_total", "Sıkıştırılan/silinen gün bölümleri")
+
+
+class Tier:
+    def __init__(self, name: str, step: pd.Timedelta, retention_days: float, root: str):
+        self.name = name
+        self.step = pd.Timedelta(step)
+        self.retention_days = retention_days
+        self.store = ColumnStore(root, AGG_COLUMNS)
+
+
+# ----- özetleme -----
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    # Bölümde bulunmayan kolonlar (ör. sample.json'dan gelen eksik metrikler) NaN okunur
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return df[name].to_numpy(dtype=np.float64)
+
+
+def _agg_form(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """Ham satırları tek okumalık özet biçimine çevirir (count=1, min=max=değer)."""
+    if "count" in df.columns:
+        return df
+    out = {"breaker_id": df["breaker_id"].to_numpy(), "timestamp": df["timestamp"].to_numpy(),
+           "count": np.ones(len(df))}
+    for m in columns:
+        values = _column(df, m)
+        out[m] = values
+        for a in AGGREGATES:
+            out[f"{m}_{a}"] = values
+    return pd.DataFrame(out)
+
+
+def aggregate(df: pd.DataFrame, step, columns: Iterable[str] = METRIC_COLUMNS) -> pd.DataFrame:
+    """Ham ya da özet satırları (breaker, step kovası) başına tek özet satırına indirger.
+
+    Kova zaman damgası kovanın başlangıcıdır. Ortalamalar okuma sayısıyla ağırlıklanır;
+    bir kovada metriğin yalnızca bazı okumaları eksikse ağırlık yaklaşık kalır. Girdide
+    bulunmayan metrikler çıktıda NaN olur.
+    """
+    columns = list(columns)
+    df = _agg_form(df, columns)
+    step_ns = pd.Timedelta(step).value
+    ts = df["timestamp"].to_numpy().view("int64")
+    work = {"breaker_id": df["breaker_id"].to_numpy(), "bucket": ts - ts % step_ns,
+            "count": df["count"].to_numpy(dtype=np.float64)}
+    for m in columns:
+        values = _column(df, m)
+        if m in SUM_COLUMNS:
+            work[f"{m}_sum"] = values
+        else:
+            present = ~np.isnan(values)
+            work[f"{m}_w"] = np.where(present, values * work["count"], 0.0)
+            work[f"{m}_n"] = np.where(present, work["count"], 0.0)
+        for a in AGGREGATES:
+            work[f"{m}_{a}"] = _column(df, f"{m}_{a}")
+    grouped = pd.DataFrame(work).groupby(["breaker_id", "bucket"], sort=True)
+
+    sums = grouped[[c for c in work if c.endswith(("_w", "_n", "_sum")) or c == "count"]].sum(min_count=1)
+    mins = grouped[[f"{m}_min" for m in columns]].min()
+    maxs = grouped[[f"{m}_max" for m in columns]].max()
+    out = pd.DataFrame(index=sums.index)
+    out["count"] = sums["count"]
+    for m in columns:
+        if m in SUM_COLUMNS:
+            out[m] = sums[f"{m}_sum"]
+        else:
+            out[m] = sums[f"{m}_w"] / sums[f"{m}_n"].replace(0.0, np.nan)
+        out[f"{m}_min"] = mins[f"{m}_min"]
+        out[f"{m}_max"] = maxs[f"{m}_max"]
+    out = out.reset_index()
+    out["timestamp"] = out.pop("bucket").to_numpy().view("datetime64[ns]")
+    return out
+
+
+def _read_partition(part_dir: str) -> pd.DataFrame:
+    ts = np.load(os.path.join(part_dir, "timestamp.npy"))
+    data = {"timestamp": ts.view("datetime64[ns]")}
+    for name in sorted(os.listdir(part_dir)):
+        if name.endswith(".npy") and not name.startswith(".") and name != "timestamp.npy":
+            data[name[:-4]] = np.load(os.path.join(part_dir, name))
+    return pd.DataFrame(data)
+
+
+def _read_sources(part_dir: str) -> List[str]:
+    try:
+        with open(os.path.join(part_dir, SOURCES_FILE)) as f:
+            return json.load(f)
+    except OSError:
+        return []
+
+
+class TieredStore:
+    """Ham depo ve özet katmanları üzerinde tek sorgu arayüzü."""
+
+    def __init__(self, raw: ColumnStore = None, root: str = TIER_DIR,
+                 raw_retention_days: float = RAW_RETENTION_DAYS, tiers: List[Tier] = None):
+        self.raw = raw or ColumnStore(STORE_DIR)
+        self.raw_retention_days = raw_retention_days
+        self.tiers = tiers if tiers is not None else [
+            Tier("1min", pd.Timedelta(minutes=1), TIER_1MIN_RETENTION_DAYS, os.path.join(root, "1min")),
+            Tier("1h", pd.Timedelta(hours=1), TIER_1H_RETENTION_DAYS, os.path.join(root, "1h")),
+        ]
+
+    @property
+    def stores(self) -> List[ColumnStore]:
+        """İnceden kabaya: ham depo, sonra katmanlar."""
+        return [self.raw] + [t.store for t in self.tiers]
+
+    @property
+    def steps(self) -> List[pd.Timedelta]:
+        return [pd.Timedelta(0)] + [t.step for t in self.tiers]
+
+    # ----- ColumnStore arayüzü -----
+    def write(self, df: pd.DataFrame):
+        # Yeni okumalar her zaman ham depoya yazılır
+        self.raw.write(df)
+
+    def breakers(self) -> List[str]:
+        return sorted(set().union(*(s.breakers() for s in self.stores)))
+
+    def max_timestamp(self, breakers: Optional[Iterable[str]] = None) -> Optional[pd.Timestamp]:
+        breakers = list(breakers) if breakers is not None else None
+        latest = [ts for ts in (s.max_timestamp(breakers) for s in self.stores) if ts is not None]
+        return max(latest) if latest else None
+
+    def tier_for(self, resolution=None) -> int:
+        """Kovası resolution'dan büyük olmayan en kaba seviye (0: ham)."""
+        if resolution is None:
+            return 0
+        resolution = pd.Timedelta(resolution)
+        return max(i for i, step in enumerate(self.steps) if step <= resolution)
+
+    def window_level(self, breakers: Iterable[str], start: TimeLike = None, end: TimeLike = None) -> int:
+        """[start, end) aralığında gün bölümü bulunan en kaba seviye (0: ham)."""
+        first_day = pd.Timestamp(start).strftime("%Y-%m-%d") if start is not None else None
+        last_day = (pd.Timestamp(end) - pd.Timedelta(1)).strftime("%Y-%m-%d") if end is not None else None
+        breakers = list(breakers)
+        for i in range(len(self.stores) - 1, 0, -1):
+            for breaker_id in breakers:
+                if any((first_day is None or day >= first_day) and (last_day is None or day <= last_day)
+                       for day in self.stores[i].days(breaker_id)):
+                    return i
+        return 0
+
+    def query(self, breakers: Optional[Iterable[str]] = None, start: TimeLike = None, end: TimeLike = None,
+              columns: Optional[List[str]] = None, resolution=None) -> pd.DataFrame:
+        """Tüm seviyelerden [start, end) aralığı; ColumnStore.query ile aynı sözleşme.
+
+        Kaynak seviye ``tier_for(resolution)`` ile aralıkta verisi bulunan en kaba seviyenin
+        büyüğüdür; daha ince seviyelerdeki (yeni) veri bu seviyenin kovasına özetlenir ve
+        sonuç tek çözünürlükte döner. Sıkıştırmadan sonra geç gelen okumalar aynı gün için
+        yeniden ham bölüm açabilir; bu satırlar ayrıca dönmez, özet kovasına katılır.
+        Kolonlar düz metrikler ya da ``{metrik}_min`` gibi özet kolonları olabilir.
+        """
+        columns = list(columns) if columns is not None else list(METRIC_COLUMNS)
+        breakers = list(breakers) if breakers is not None else self.breakers()
+        level = max(self.tier_for(resolution), self.window_level(breakers, start, end))
+        metrics_needed = sorted({c.rsplit("_", 1)[0] if c not in METRIC_COLUMNS and c != "count" else c
+                                 for c in columns} & set(METRIC_COLUMNS))
+
+        if level == 0:
+            df = self.raw.query(breakers, start, end, metrics_needed)
+            if set(columns) - set(METRIC_COLUMNS):
+                df = _agg_form(df, metrics_needed)
+            return df[["breaker_id", "timestamp", *columns]]
+
+        read = metrics_needed + [f"{m}_{a}" for m in metrics_needed for a in AGGREGATES] + ["count"]
+        frames = []
+        for i, store in enumerate(self.stores[:level + 1]):
+            df = store.query(breakers, start, end, metrics_needed if i == 0 else read)
+            if not df.empty:
+                frames.append(_agg_form(df, metrics_needed))
+        if not frames:
+            return self.raw.query([], columns=columns)
+        # Aynı kovaya düşen farklı seviyelerdeki satırlar tek özet satırında birleşir
+        out = aggregate(pd.concat(frames, ignore_index=True), self.steps[level], metrics_needed)
+        return out[["breaker_id", "timestamp", *columns]]
+
+    # ----- sıkıştırma -----
+    def compact(self, now: TimeLike = None) -> dict:
+        """Saklama süresi dolan gün bölümlerini bir üst katmana taşır; {seviye: bölüm sayısı}."""
+        now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+        self.recover()
+        done = {}
+        levels = [(self.raw, "raw", self.raw_retention_days)] + [(t.store, t.name, t.retention_days)
+                                                                for t in self.tiers]
+        for i, (source, name, retention) in enumerate(levels):
+            if retention <= 0:
+                continue
+            target = self.tiers[i] if i < len(self.tiers) else None
+            cutoff_day = (now - pd.Timedelta(days=retention)).strftime("%Y-%m-%d")
+            count = 0
+            for breaker_id in source.breakers():
+                for day in source.days(breaker_id):
+                    if day >= cutoff_day:
+                        break
+                    if target is None:
+                        with source.lock():
+                            shutil.rmtree(source._partition_dir(breaker_id, day), ignore_errors=True)
+                    else:
+                        try:
+                            self._move(source, target, breaker_id, day)
+                        except Exception as e:
+                            # Bozuk bir bölüm diğerlerinin sıkıştırılmasını engellemez
+                            print(f"⚠️ {name}/{breaker_id}/{day} sıkıştırılamadı: {e}")
+                            continue
+                    count += 1
+            if count:
+                COMPACTED.inc(count, tier=name)
+            done[name] = count
+        return done
+
+    def _move(self, source: ColumnStore, target: Tier, breaker_id: str, day: str):
+        # Kaynak önce geçici ada taşınır: geç gelen yazımlar yeni bir bölüm açar ve bu
+        # anlık görüntüye karışmaz. Belirteç hedefe kaydedildiği için kesinti sonrası
+        # yeniden işleme aynı veriyi iki kez eklemez. Taşıma kaynak kilidiyle yapılır ki
+        # yarım kalmış bir yazımın bölümü altından çekilmesin.
+        token = uuid.uuid4().hex[:12]
+        staging = os.path.join(source.root, breaker_id, f".compact-{day}-{token}")
+        with source.lock():
+            try:
+                os.replace(source._partition_dir(breaker_id, day), staging)
+            except FileNotFoundError:
+                return
+        self._absorb_or_restore(source, staging, target, breaker_id, day, token)
+
+    def _absorb_or_restore(self, source: ColumnStore, staging: str, target: Tier, breaker_id: str,
+                           day: str, token: str):
+        """Geçici dizini hedefe işler; işleme başarısız olursa gün kaynağa geri konur ve hata yükselir."""
+        try:
+            self._absorb(staging, target, breaker_id, day, token)
+        except Exception:
+            if token not in _read_sources(target.store._partition_dir(breaker_id, day)):
+                self._restore(source, staging, breaker_id, day)
+            raise
+        shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def _restore(source: ColumnStore, staging: str, breaker_id: str, day: str):
+        # Bu arada aynı gün için yeni bölüm açılmadıysa geri adlandırmak yeter;
+        # açıldıysa anlık görüntü ColumnStore.write ile ona birleştirilir
+        with source.lock():
+            try:
+                os.rename(staging, source._partition_dir(breaker_id, day))
+                return
+            except OSError:
+                pass
+        source.write(_read_partition(staging).assign(breaker_id=breaker_id))
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def _absorb(self, staging: str, target: Tier, breaker_id: str, day: str, token: str):
+        with target.store.lock():
+            self._absorb_locked(staging, target, breaker_id, day, token)
+
+    def _absorb_locked(self, staging: str, target: Tier, breaker_id: str, day: str, token: str):
+        dest = target.store._partition_dir(breaker_id, day)
+        sources = _read_sources(dest)
+        if token in sources:
+            return
+        rows = _read_partition(staging).assign(breaker_id=breaker_id)
+        if os.path.exists(os.path.join(dest, "timestamp.npy")):
+            existing = _read_partition(dest).assign(breaker_id=breaker_id)
+            rows = pd.concat([_agg_form(rows, METRIC_COLUMNS), existing], ignore_index=True)
+        agg = aggregate(rows, target.step)
+
+        # Yeni bölüm yan dizinde hazırlanır, sonra eskisinin yerine geçer
+        parent = os.path.dirname(dest)
+        new_dir = os.path.join(parent, f".{day}.new-{token}")
+        os.makedirs(new_dir, exist_ok=True)
+        np.save(os.path.join(new_dir, "timestamp.npy"), agg["timestamp"].to_numpy().view("int64"))
+        for c in AGG_COLUMNS:
+            np.save(os.path.join(new_dir, f"{c}.npy"), agg[c].to_numpy(dtype=np.float64))
+        with open(os.path.join(new_dir, SOURCES_FILE), "w") as f:
+            json.dump(sources + [token], f)
+        swap_partition(new_dir, dest, os.path.join(parent, f".{day}.old-{token}"))
+
+    def recover(self):
+        """Yarıda kalmış sıkıştırmaları tamamlar (geçici dizinler "." ile başlar)."""
+        # Yarım kalan bölüm değişimleri; atılan yan dizinlerin kaynağı aşağıda yeniden işlenir
+        for store in self.stores:
+            store.recover()
+
+        for i, source in enumerate(self.stores[:len(self.tiers)]):
+            for breaker_id in source.breakers():
+                parent = os.path.join(source.root, breaker_id)
+                for name in sorted(os.listdir(parent)):
+                    if not name.startswith(".compact-"):
+                        continue
+                    day, token = name[len(".compact-"):].rsplit("-", 1)
+                    staging = os.path.join(parent, name)
+                    try:
+                        self._absorb_or_restore(source, staging, self.tiers[i], breaker_id, day, token)
+                    except Exception as e:
+                        print(f"⚠️ {breaker_id}/{day} sıkıştırması geri alındı: {e}")
+
+    def disk_usage(self) -> dict:
+        """Seviye başına bayt."""
+        usage = {}
+        for name, store in zip(["raw"] + [t.name for t in self.tiers], self.stores):
+            total = 0
+            for dirpath, _, files in os.walk(store.root):
+                total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+            usage[name] = total
+        return usage
+
+
+class Compactor:
+    """compact() çağrısını arka plan thread'inde periyodik olarak çalıştırır."""
+
+    def __init__(self, store: TieredStore = None, interval: float = COMPACTION_INTERVAL):
+        self.store = store or TieredStore()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tier-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.store.compact()
+            except Exception as e:
+                print(f"⚠️ Sıkıştırma başarısız: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+if __name__ == "__main__":
+    # python -m data.tiers compact
+    # python -m data.tiers usage
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "compact"
+    tiered = TieredStore()
+    if cmd == "compact":
+        print(tiered.compact())
+    elif cmd == "usage":
+        print(tiered.disk_usage())
+    else:
+        raise SystemExit(f"Bilinmeyen komut: {cmd}")
@@ -1,11 +1,30 @@
 from langchain_openai import ChatOpenAI
-from ml.predict import predict_energy
-from ml.predict import  fault_detection
-from ml.predict import leakage_anomaly_detection
+from ml.engine import analyze
+from llm import cache
+from llm import documents
+from utils import metrics
+from concurrent.futures import ThreadPoolExecutor
+import os
 import re
-import json
+import time
 
 
+# analiz adı → prompt verisindeki anahtar
+ANALYSIS_KEYS = {
+    "predict": "predict_result",
+    "faults": "faults",
+    "leakage": "leakage_result",
+}
+
+PROMPT_CHARS = metrics.histogram("kilowizard_prompt_chars", "Oluşturulan prompt uzunluğu (karakter)",
+                                 buckets=metrics.SIZE_BUCKETS)
+LLM_SECONDS = metrics.histogram("kilowizard_llm_latency_seconds", "LLM çağrısı gecikmesi")
+LLM_FIRST_TOKEN_SECONDS = metrics.histogram("kilowizard_llm_first_token_seconds", "İlk token'a kadar geçen süre")
+CACHE_LOOKUPS = metrics.counter("kilowizard_llm_cache_total", "Agent önbellek isabet/ıska sayısı")
+PRINT_PROMPT = os.getenv("PRINT_PROMPT", "0") == "1"
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent")
+
 llm = ChatOpenAI(
     model="gpt-4o-mini",
     temperature=0.2,
@@ -37,8 +56,12 @@ def build_prompt(data: dict) -> str:
             if not_:
                 prompt_parts.append(f"Kullanıcı Notu: {not_}")
 
+            chunks = dev.get("pdf_chunks")
             text = dev.get("pdf_text", "")
-            if text:
+            if chunks:
+                # Dokümanın tamamı yerine soruyla en ilgili parçalar
+                prompt_parts.append("PDF Teknik İçeriği (ilgili bölümler):\n" + "\n...\n".join(chunks) + "\n---")
+            elif text:
                 prompt_parts.append("PDF Teknik İçeriği:\n" + text[:2000] + "\n---")
 
 
@@ -95,31 +118,130 @@ def fix_output(text: str) -> str:
 
     return "\n".join(fixed_lines).strip()
 
-# LLM çağırıcı
-def invoke(data: dict):
-    if "predict_result" not in data:
-        try:
-            with open("C:\\Users\\sozcu\\Desktop\\sample.json", "r") as f:
-                measurements = json.load(f)
-            voltage = sum([row["voltage"] for row in measurements]) / len(measurements)
-            current = sum([row["current"] for row in measurements]) / len(measurements)
-            active_power = sum([row["active_power"] for row in measurements]) / len(measurements)
-            data["predict_result"] = predict_energy(voltage, current, active_power, n_days=30)
-        except Exception as e:
-            print(f"⚠️ Tahmin verisi yüklenemedi: {e}")
-            data["predict_result"] = {}
-
-    if "faults" not in data:
+# Analiz bağlamı: veri ve model değişmediyse önbellekten gelir
+def gather_context(data: dict, data_fp: str = None, model_fp: str = None):
+    needed = [name for name, key in ANALYSIS_KEYS.items() if key not in data]
+    if not needed:
+        return
+    data_fp = data_fp or cache.data_fingerprint()
+    model_fp = model_fp or cache.model_fingerprint()
+    key = cache.context_key(data_fp, model_fp, needed)
+
+    context = cache.context_cache.get(key)
+    CACHE_LOOKUPS.inc(cache="context", result="hit" if context is not None else "miss")
+    if context is None:
         try:
-            faults = fault_detection("C:\\Users\\sozcu\\Desktop\\sample.json")
-            data["faults"] = faults
-            print("✅ fault_detection çalıştı, sonuç:", faults)
+            # Analizler kolon deposundan tek seferde okur; eğitilmiş dedektörler ve fatura özetleri varsa onları kullanır
+            result = analyze(needed, n_days=30)
+            context = {ANALYSIS_KEYS[name]: getattr(result, ANALYSIS_KEYS[name]) for name in needed}
+            cache.context_cache.put(key, context)
+            print("✅ analiz motoru çalıştı, arızalar:", result.faults)
         except Exception as e:
-            print(f"⚠️ Arıza verisi yüklenemedi: {e}")
-            data["faults"] = {}
-
+            print(f"⚠️ Analiz verisi yüklenemedi: {e}")
+            context = {ANALYSIS_KEYS[name]: {} for name in needed}
+    data.update(context)
+
+# Her cihazın PDF'inden soruyla en ilgili parçaları getir
+def gather_documents(data: dict):
+    question = data.get("input", "")
+    for dev in data.get("devices", []):
+        if dev.get("pdf_id"):
+            hits = documents.index.search(question, [dev["pdf_id"]], k=documents.TOP_K)
+            dev["pdf_chunks"] = [chunk for _, chunk, _ in hits]
+
+def _prepare(data: dict):
+    """Cevap anahtarını ve (önbellekte yoksa) promptu hazırlar.
+
+    Önce cevap önbelleğine bakılır; isabette analiz ve doküman araması hiç başlatılmaz.
+    Iskada ikisi thread havuzunda eşzamanlı toplanır. Dönüş: (anahtar, önbellekteki cevap, prompt).
+    """
+    data_fp = cache.data_fingerprint()
+    model_fp = cache.model_fingerprint()
+    # Çağıran analiz sonuçlarını kendisi verdiyse onlar da anahtara girer
+    given = {key: data[key] for key in ANALYSIS_KEYS.values() if key in data}
+    # Oturumdaki cihaz sözlükleri değişmesin diye kopyalanır
+    data["devices"] = [dict(dev) for dev in data.get("devices", [])]
+
+    response_key = cache.response_key(
+        data.get("input", ""), data_fp, model_fp, cache.devices_fingerprint(data.get("devices", [])), given
+    )
+    cached = cache.response_cache.get(response_key)
+    CACHE_LOOKUPS.inc(cache="response", result="hit" if cached is not None else "miss")
+    if cached is not None:
+        return response_key, cached, None
+
+    context_future = _pool.submit(gather_context, data, data_fp, model_fp)
+    documents_future = _pool.submit(gather_documents, data)
+    context_future.result()
+    documents_future.result()
     final_prompt = build_prompt(data)
-    print("📢 Final Prompt:\n", final_prompt)  # prompt içeriğini görmek için
+    PROMPT_CHARS.observe(len(final_prompt))
+    if PRINT_PROMPT:
+        print("📢 Final Prompt:\n", final_prompt)  # prompt içeriğini görmek için
+    return response_key, None, final_prompt
+
+# LLM çağırıcı
+def invoke(data: dict):
+    response_key, cached, final_prompt = _prepare(data)
+    if cached is not None:
+        return {"output": cached}
 
+    started = time.perf_counter()
     raw_output = llm.invoke(final_prompt)
-    return {"output": fix_output(raw_output.content)}
+    LLM_SECONDS.observe(time.perf_counter() - started)
+
+    output = fix_output(raw_output.content)
+    cache.response_cache.put(response_key, output)
+    return {"output": output}
+
+class StreamFixer:
+    """fix_output'u akan cevaba artımlı uygular.
+
+    Yeni tamamlanan satırlar düzeltilip öncekilere eklenir (her satır bir kez işlenir),
+    yarım kalan son satır ham haliyle gösterilir. finish() tüm metne fix_output uygular;
+    sonuç akışsız invoke ile aynıdır.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self._fixed = ""
+        self._fixed_upto = 0
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        cut = self.raw.rfind("\n")
+        if cut > self._fixed_upto:
+            part = self.raw[self._fixed_upto:cut]
+            fixed = fix_output(part)
+            # Yalnızca boş satırlardan oluşan parça bir sonrakine katılır ki aradaki boşluk korunsun
+            if fixed:
+                lead = len(part) - len(part.lstrip("\n"))
+                self._fixed += ("\n" * min(lead, 2) if self._fixed else "") + fixed
+                self._fixed_upto = cut
+        return self._fixed + self.raw[self._fixed_upto:]
+
+    def finish(self) -> str:
+        return fix_output(self.raw)
+
+# Akışlı LLM çağırıcı: her yeni token'da o ana kadarki (düzeltilmiş) cevabı verir
+def stream(data: dict):
+    response_key, cached, final_prompt = _prepare(data)
+    if cached is not None:
+        yield cached
+        return
+
+    fixer = StreamFixer()
+    started = time.perf_counter()
+    first_token = None
+    for chunk in llm.stream(final_prompt):
+        if not chunk.content:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - started
+            LLM_FIRST_TOKEN_SECONDS.observe(first_token)
+        yield fixer.feed(chunk.content)
+    LLM_SECONDS.observe(time.perf_counter() - started)
+
+    output = fixer.finish()
+    cache.response_cache.put(response_key, output)
+    yield output
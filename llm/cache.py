@@ -0,0 +1,149 @@
+"""LLM agent'ı için cevap ve bağlam önbelleği.
+
+Cevaplar normalize edilmiş soru + bağlam parmak izi (ölçüm watermark'ı, cihaz PDF'leri,
+model sürümü) ile anahtarlanır. Bellekte TTL + LRU ile tutulur; LLM_CACHE_DIR verilirse
+diske de yazılır ve süreç yeniden başladığında oradan okunur.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+CACHE_DIR = os.getenv("LLM_CACHE_DIR")  # boşsa sadece bellek
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL, directory: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.directory = directory
+        self._data = OrderedDict()  # key -> (oluşturulma zamanı, değer)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if now - item[0] <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._data[key]
+
+        if self.directory:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    created, value = json.load(f)
+                if now - created <= self.ttl:
+                    with self._lock:
+                        self._insert(key, created, value)
+                        self.hits += 1
+                    return value
+                os.remove(self._path(key))
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _insert(self, key, created, value):
+        self._data[key] = (created, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def put(self, key: str, value):
+        created = time.time()
+        with self._lock:
+            self._insert(key, created, value)
+        if self.directory:
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([created, value], f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def normalize_question(text: str) -> str:
+    # Büyük/küçük harf, fazla boşluk ve sondaki noktalama farkları aynı soru sayılır
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+def data_fingerprint(json_path: str = None) -> str:
+    """Ölçüm verisinin değişip değişmediğini ucuzca yakalayan iz."""
+    if json_path is not None:
+        try:
+            st = os.stat(json_path)
+            return f"json:{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return "json:none"
+    from data.rollups import rollup_files
+    from data.store import ColumnStore
+    # Geç gelen okumalar en yeni zaman damgasını değiştirmez; fatura özetleri her flush'ta yazılır
+    rollups = [(p, os.stat(p).st_mtime_ns) for p in rollup_files()]
+    return f"store:{ColumnStore().max_timestamp()}:{_hash(rollups)}"
+
+
+def model_fingerprint() -> str:
+    from ml.registry import registry
+    try:
+        return registry.current_version()
+    except OSError:
+        return "none"
+
+
+def devices_fingerprint(devices) -> str:
+    # PDF metninin tamamı yerine hash'i anahtara girer
+    return _hash([
+        {
+            "id": d.get("Cihaz_id"),
+            "name": d.get("cihaz_adi"),
+            "breaker": d.get("breaker_id"),
+            "pdf": d.get("cihaz_pdf"),
+            "pdf_id": d.get("pdf_id"),
+            "note": d.get("kullanici_promptu") or d.get("kullanıcı_promptu"),
+            "text": hashlib.sha256((d.get("pdf_text") or "").encode("utf-8")).hexdigest(),
+        }
+        for d in devices or []
+    ])
+
+
+def context_key(data_fp: str, model_fp: str, analyses) -> str:
+    return _hash("context", data_fp, model_fp, sorted(analyses))
+
+
+def response_key(question: str, data_fp: str, model_fp: str, devices_fp: str, extra=None) -> str:
+    return _hash("response", normalize_question(question), data_fp, model_fp, devices_fp, extra)
+
+
+response_cache = TTLCache(directory=os.path.join(CACHE_DIR, "responses") if CACHE_DIR else None)
+context_cache = TTLCache(directory=os.path.join(CACHE_DIR, "context") if CACHE_DIR else None)
@@ -0,0 +1,172 @@
+"""Cihaz PDF'leri için parçalı (chunk) erişim indeksi.
+
+Her PDF içerik hash'i ile bir kez çıkarılır, parçalara bölünür ve yerel bir vektör
+indeksine eklenir. Prompt'a tüm dokümanın ilk 2000 karakteri yerine yalnızca soruyla
+en ilgili k parça girer. Gömme (embedding) tamamen çevrimdışıdır: karakter n-gram'larının
+hash'lenmesiyle elde edilen log-ağırlıklı, L2-normalize vektörler; Türkçe ek yapısına da dayanıklıdır.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+try:
+    import faiss
+except ImportError:  # faiss yoksa numpy ile tam tarama
+    faiss = None
+
+
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", "data/docs")
+CHUNK_SIZE = int(os.getenv("DOC_CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("DOC_CHUNK_OVERLAP", "150"))
+TOP_K = int(os.getenv("DOC_TOP_K", "4"))
+EMBED_DIM = 2 ** 12
+
+_vectorizer = HashingVectorizer(
+    analyzer="char_wb", ngram_range=(3, 5), n_features=EMBED_DIM, alternate_sign=False, norm=None, lowercase=True,
+)
+
+
+def embed(texts) -> np.ndarray:
+    # log(1 + tf): tekrar eden kalıp metinler nadir ama ilgili ifadeleri bastırmasın
+    vectors = np.log1p(_vectorizer.transform(texts).toarray()).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return vectors
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:24]
+
+
+def extract_pdf_text(data: bytes) -> str:
+    import fitz
+
+    text = ""
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            text += page.get_text()
+    return text.strip()
+
+
+def split_chunks(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+    """Metni paragraf/cümle sınırlarına yakın, örtüşen parçalara böler."""
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    chunks, pos = [], 0
+    while pos < len(text):
+        end = min(pos + size, len(text))
+        if end < len(text):
+            # Mümkünse paragraf, sonra cümle sonunda kes
+            window = text[pos + size // 2:end]
+            for sep in ("\n\n", "\n", ". "):
+                cut = window.rfind(sep)
+                if cut != -1:
+                    end = pos + size // 2 + cut + len(sep)
+                    break
+        chunk = text[pos:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        pos = max(end - overlap, pos + 1)
+    return chunks
+
+
+class _Doc:
+    def __init__(self, doc_id, chunks, vectors):
+        self.doc_id = doc_id
+        self.chunks = chunks
+        self.vectors = vectors
+        self.index = None
+        if faiss is not None and len(chunks):
+            self.index = faiss.IndexFlatIP(vectors.shape[1])
+            self.index.add(vectors)
+
+    def search(self, query_vec: np.ndarray, k: int):
+        k = min(k, len(self.chunks))
+        if k == 0:
+            return []
+        if self.index is not None:
+            scores, idx = self.index.search(query_vec[None, :], k)
+            return list(zip(idx[0].tolist(), scores[0].tolist()))
+        scores = self.vectors @ query_vec
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return list(zip(top.tolist(), scores[top].tolist()))
+
+
+class DocumentIndex:
+    def __init__(self, cache_dir: str = DOC_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, doc_id):
+        base = os.path.join(self.cache_dir, doc_id)
+        return base + ".json", base + ".npy"
+
+    def add_pdf(self, data: bytes) -> str:
+        """PDF baytlarını indeksler ve doküman kimliğini (içerik hash'i) döndürür.
+
+        Aynı içerik daha önce işlendiyse çıkarma ve gömme tekrarlanmaz.
+        """
+        doc_id = content_hash(data)
+        if self._get(doc_id) is None:
+            self._build(doc_id, extract_pdf_text(data))
+        return doc_id
+
+    def add_text(self, text: str) -> str:
+        doc_id = content_hash(text.encode("utf-8"))
+        if self._get(doc_id) is None:
+            self._build(doc_id, text)
+        return doc_id
+
+    def _build(self, doc_id: str, text: str):
+        chunks = split_chunks(text)
+        vectors = embed(chunks) if chunks else np.zeros((0, EMBED_DIM), dtype=np.float32)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            meta_path, vec_path = self._paths(doc_id)
+            np.save(vec_path, vectors)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"chunks": chunks, "chars": len(text)}, f, ensure_ascii=False)
+        with self._lock:
+            self._docs[doc_id] = _Doc(doc_id, chunks, vectors)
+
+    def _get(self, doc_id: str):
+        with self._lock:
+            doc = self._docs.get(doc_id)
+        if doc is not None or not self.cache_dir:
+            return doc
+        meta_path, vec_path = self._paths(doc_id)
+        if not (os.path.exists(meta_path) and os.path.exists(vec_path)):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)["chunks"]
+        doc = _Doc(doc_id, chunks, np.load(vec_path))
+        with self._lock:
+            self._docs[doc_id] = doc
+        return doc
+
+    def text(self, doc_id: str) -> str:
+        doc = self._get(doc_id)
+        return "\n".join(doc.chunks) if doc else ""
+
+    def search(self, query: str, doc_ids, k: int = TOP_K):
+        """Verilen dokümanlar içinde soruya en yakın k parçayı [(doc_id, parça, skor)] döndürür."""
+        query_vec = embed([query])[0]
+        hits = []
+        for doc_id in dict.fromkeys(doc_ids):
+            doc = self._get(doc_id)
+            if doc is None:
+                continue
+            hits.extend((doc_id, doc.chunks[i], score) for i, score in doc.search(query_vec, k))
+        hits.sort(key=lambda h: -h[2])
+        return hits[:k]
+
+
+index = DocumentIndex()
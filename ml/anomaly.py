@@ -0,0 +1,316 @@
+"""Bir kez eğitilen, artımlı skorlanan anomali dedektörleri (kaçak akım ve arıza).
+
+Eğitim adımı IsolationForest'ı geçmiş veriye bir kez fit eder ve ml/ altında sürümlü
+olarak kaydeder. Skorlama adımı her breaker için o breaker'ın son skorlanan zaman
+damgasından (watermark) yeni ölçümleri değerlendirir; geride kalan bir breaker'ın geç
+gelen verisi de böylece skorlanır. Sonuçlar breaker/gün bazında önbellekte birikir.
+
+Veri varsayılan olarak TieredStore'dan okunur: RAW_RETENTION_DAYS'ten eski günler özet
+katmanlarından (kova ortalamaları) gelir, böylece eğitim geçmişi ve uzun süre geride kalan
+breaker'ların skorlanmamış verisi sıkıştırmayla kaybolmaz.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from data.tiers import TieredStore
+from ml.registry import registry, MODEL_DIR
+
+
+DETECTOR_DIR = os.getenv("DETECTOR_DIR", MODEL_DIR)
+# global: tüm breaker'lar için tek dedektör, per_breaker: breaker (veya küme) başına bir dedektör
+ANOMALY_MODE = os.getenv("ANOMALY_MODE", "global")
+ANOMALY_WORKERS = int(os.getenv("ANOMALY_WORKERS", "0")) or os.cpu_count()
+MIN_SAMPLES = 16
+
+DETECTORS = {
+    "leakage": ["leakage_current"],
+    "fault": ["voltage", "current", "active_power"],
+}
+
+_lock = threading.Lock()
+_states = {}  # kind -> bellekteki skor önbelleği
+
+
+def _prefix(kind: str, mode: str = None) -> str:
+    mode = mode or ANOMALY_MODE
+    return kind if mode == "global" else f"{kind}_{mode}"
+
+
+def detector_path(kind: str, mode: str = None) -> str:
+    return os.path.join(DETECTOR_DIR, f"{_prefix(kind, mode)}_detector.pkl")
+
+
+def state_path(kind: str, mode: str = None) -> str:
+    return os.path.join(DETECTOR_DIR, f"{_prefix(kind, mode)}_scores.json")
+
+
+def has_detector(kind: str, mode: str = None) -> bool:
+    return os.path.exists(detector_path(kind, mode))
+
+
+# ----- eğitim -----
+def train_detector(kind: str, df: pd.DataFrame = None, store=None, breakers=None,
+                   start=None, end=None, contamination: float = 0.05, mode: str = None,
+                   workers: int = None, groups: dict = None) -> str:
+    """Dedektörü eğitir, {kind}_detector.pkl olarak kaydeder ve sürümünü döndürür.
+
+    mode="per_breaker" ile her breaker (groups verilirse her küme) için ayrı dedektör
+    süreç havuzunda eğitilir. Önceki sürümler {..}_detector_{sürüm}.pkl olarak arşivde kalır.
+    """
+    mode = mode or ANOMALY_MODE
+    features = DETECTORS[kind]
+    if df is None:
+        store = store or TieredStore()
+        df = store.query(breakers=breakers, start=start, end=end, columns=features)
+    df = df.dropna(subset=features)
+    if df.empty:
+        raise ValueError(f"{kind} dedektörü için eğitim verisi yok")
+
+    # Aynı saniyede iki eğitim aynı arşiv dosyasını ezmesin
+    version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    payload = {
+        "features": features,
+        "version": version,
+        "mode": mode,
+        "trained_until": str(df["timestamp"].max()),
+    }
+    if mode == "global":
+        model = IsolationForest(contamination=contamination, random_state=42)
+        model.fit(df[features])
+        payload["model"] = model
+    elif mode == "per_breaker":
+        df = df.copy()
+        df["_group"] = df["breaker_id"].map(groups).fillna(df["breaker_id"]) if groups else df["breaker_id"]
+        models, scores = fit_score_groups(df, features, contamination, workers)
+        payload["models"] = models
+        payload["groups"] = dict(groups or {})
+    else:
+        raise ValueError(f"Bilinmeyen ANOMALY_MODE: {mode}")
+
+    os.makedirs(DETECTOR_DIR, exist_ok=True)
+    joblib.dump(payload, os.path.join(DETECTOR_DIR, f"{_prefix(kind, mode)}_detector_{version}.pkl"))
+    tmp = detector_path(kind, mode) + ".tmp"
+    joblib.dump(payload, tmp)
+    os.replace(tmp, detector_path(kind, mode))
+
+    if mode == "per_breaker":
+        # Eğitimde zaten skorlandı; önbelleği bu skorlarla başlat
+        with _lock:
+            state = {"version": version, "watermark": payload["trained_until"], "watermarks": {}, "days": {}}
+            _merge_scores(state, df, np.where(scores < 0, -1, 1), scores)
+            _advance_watermarks(state, df)
+            _states[_prefix(kind, mode)] = state
+            _save_state(kind, state, mode)
+    return version
+
+
+def _fit_score_slice(shm_name: str, out_name: str, shape, lo: int, hi: int, contamination: float):
+    # Süreç havuzunda çalışır: veri paylaşımlı bellekten kopyasız okunur, skorlar oraya yazılır
+    shm = shared_memory.SharedMemory(name=shm_name)
+    out = shared_memory.SharedMemory(name=out_name)
+    try:
+        X = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[lo:hi]
+        model = IsolationForest(contamination=contamination, random_state=42, n_jobs=1)
+        model.fit(X)
+        np.ndarray(shape[0], dtype=np.float64, buffer=out.buf)[lo:hi] = model.decision_function(X)
+        del X
+        return model
+    finally:
+        shm.close()
+        out.close()
+
+
+def fit_score_groups(df: pd.DataFrame, features, contamination: float = 0.05, workers: int = None):
+    """df'yi _group kolonuna göre böler, her grup için dedektörü paralel eğitip skorlar.
+
+    Girdi matrisi bir kez paylaşımlı belleğe kopyalanır; işçilere yalnızca
+    (bellek adı, satır aralığı) gönderilir, DataFrame pickle edilmez.
+    Dönüş: ({grup: model}, df satır sırasıyla skor dizisi).
+    """
+    workers = workers or ANOMALY_WORKERS
+    codes, names = pd.factorize(df["_group"])
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    X = df[features].to_numpy(dtype=np.float64)[order]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    out = shared_memory.SharedMemory(create=True, size=max(len(X) * 8, 1))
+    try:
+        np.ndarray(X.shape, dtype=np.float64, buffer=shm.buf)[:] = X
+        sorted_scores = np.ndarray(len(X), dtype=np.float64, buffer=out.buf)
+        sorted_scores[:] = 0.0  # az örnekli gruplar normal kabul edilir
+
+        models = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for i, name in enumerate(names):
+                lo, hi = int(bounds[i]), int(bounds[i + 1])
+                if hi - lo < MIN_SAMPLES:
+                    continue
+                futures[name] = pool.submit(_fit_score_slice, shm.name, out.name, X.shape, lo, hi, contamination)
+            for name, fut in futures.items():
+                models[name] = fut.result()
+
+        scores = np.empty(len(X))
+        scores[order] = sorted_scores
+        del sorted_scores
+        return models, scores
+    finally:
+        shm.close()
+        shm.unlink()
+        out.close()
+        out.unlink()
+
+
+def _decision(payload: dict, df: pd.DataFrame) -> np.ndarray:
+    features = payload["features"]
+    if "model" in payload:
+        return payload["model"].decision_function(df[features])
+
+    # Breaker başına model: her grubun satırlarını kendi modeliyle skorla
+    groups = payload.get("groups") or {}
+    keys = df["breaker_id"].map(groups).fillna(df["breaker_id"]) if groups else df["breaker_id"]
+    scores = np.zeros(len(df))
+    X = df[features].to_numpy(dtype=np.float64)
+    for name, idx in keys.groupby(keys.to_numpy()).indices.items():
+        model = payload["models"].get(name)
+        if model is not None:
+            scores[idx] = model.decision_function(X[idx])
+    return scores
+
+
+# ----- skor önbelleği -----
+def _load_state(kind: str, version: str, mode: str = None) -> dict:
+    state = _states.get(_prefix(kind, mode))
+    if state is None:
+        path = state_path(kind, mode)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+    # Dedektör değiştiyse eski skorlar geçersiz
+    if state is None or state.get("version") != version:
+        state = {"version": version, "watermark": None, "watermarks": {}, "days": {}}
+    if "watermarks" not in state:
+        # Eski önbellek tek watermark tutuyordu; bilinen breaker'lar ondan devam eder
+        state["watermarks"] = {b: state["watermark"] for b in state["days"]} if state.get("watermark") else {}
+    _states[_prefix(kind, mode)] = state
+    return state
+
+
+def _save_state(kind: str, state: dict, mode: str = None):
+    tmp = state_path(kind, mode) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path(kind, mode))
+
+
+def _merge_scores(state: dict, df: pd.DataFrame, labels: np.ndarray, scores: np.ndarray):
+    # breaker/gün bazında [okuma sayısı, anomali sayısı, en düşük skor] biriktir
+    scored = pd.DataFrame({
+        "breaker_id": df["breaker_id"].to_numpy(),
+        "date": df["timestamp"].dt.strftime("%Y-%m-%d").to_numpy(),
+        "anomaly": (labels == -1).astype(np.int64),
+        "score": scores,
+    })
+    agg = scored.groupby(["breaker_id", "date"], sort=False).agg(
+        n=("anomaly", "size"), n_anomaly=("anomaly", "sum"), min_score=("score", "min"),
+    )
+    days = state["days"]
+    for (breaker, date), n, n_anom, min_score in zip(
+            agg.index, agg["n"].tolist(), agg["n_anomaly"].tolist(), agg["min_score"].tolist()):
+        cell = days.setdefault(breaker, {}).get(date)
+        if cell is None:
+            days[breaker][date] = [n, n_anom, min_score]
+        else:
+            days[breaker][date] = [cell[0] + n, cell[1] + n_anom, min(cell[2], min_score)]
+
+
+def _advance_watermarks(state: dict, df: pd.DataFrame):
+    marks = state["watermarks"]
+    for breaker, ts in df.groupby("breaker_id")["timestamp"].max().items():
+        if breaker not in marks or pd.Timestamp(marks[breaker]) < ts:
+            marks[breaker] = str(ts)
+    if marks:
+        state["watermark"] = max(marks.values(), key=pd.Timestamp)
+
+
+def score_new(kind: str, store=None, mode: str = None) -> dict:
+    """Her breaker'ın watermark'ından yeni ölçümleri skorlar ve önbelleği günceller.
+
+    Skorlanan okuma sayısını ve en yeni watermark'ı döndürür.
+    """
+    payload = registry.get(detector_path(kind, mode))
+    features = payload["features"]
+    store = store or TieredStore()
+
+    with _lock:
+        state = _load_state(kind, payload["version"], mode)
+        frames = []
+        for breaker in store.breakers():
+            mark = state["watermarks"].get(breaker)
+            start = pd.Timestamp(mark) + pd.Timedelta(1, "ns") if mark else None
+            part = store.query([breaker], start=start, columns=features)
+            if not part.empty:
+                frames.append(part)
+        if not frames:
+            return {"scored": 0, "watermark": state["watermark"]}
+        new = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = new.dropna(subset=features)
+
+        if not df.empty:
+            scores = _decision(payload, df)
+            labels = np.where(scores < 0, -1, 1)
+            _merge_scores(state, df, labels, scores)
+        # Eksik metrikli satırlar da watermark'ı ilerletir; her seferinde yeniden okunmaz
+        _advance_watermarks(state, new)
+        _save_state(kind, state, mode)
+        return {"scored": len(df), "watermark": state["watermark"]}
+
+
+def anomalies(kind: str, breakers=None, start=None, end=None, mode: str = None) -> dict:
+    """Önbellekten {breaker_id: [şüpheli günler]} döndürür."""
+    payload = registry.get(detector_path(kind, mode))
+    with _lock:
+        state = _load_state(kind, payload["version"], mode)
+        # score_new önbelleği kilit altında değiştirir; burada kopyası üzerinde dolaşılır
+        all_days = {breaker: dict(days) for breaker, days in state["days"].items()}
+    first = str(pd.Timestamp(start).date()) if start is not None else None
+    last = str(pd.Timestamp(end).date()) if end is not None else None
+
+    result = {}
+    for breaker, days in all_days.items():
+        if breakers is not None and breaker not in breakers:
+            continue
+        dates = sorted(
+            d for d, (_, n_anom, _) in days.items()
+            if n_anom and (first is None or d >= first) and (last is None or d <= last)
+        )
+        if dates:
+            result[breaker] = dates
+    return result
+
+
+def detect(kind: str, store=None, breakers=None, start=None, end=None, mode: str = None) -> dict:
+    """Yeni verileri skorla, sonra önbellekten anomali günlerini döndür."""
+    score_new(kind, store=store, mode=mode)
+    return anomalies(kind, breakers=breakers, start=start, end=end, mode=mode)
+
+
+if __name__ == "__main__":
+    # python -m ml.anomaly [global|per_breaker] [işçi sayısı]
+    # → iki dedektörü de kolon deposundaki veriyle eğit
+    import sys
+    cli_mode = sys.argv[1] if len(sys.argv) > 1 else None
+    cli_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for name in DETECTORS:
+        print(name, train_detector(name, mode=cli_mode, workers=cli_workers))
@@ -0,0 +1,97 @@
+"""Tek geçişli analiz motoru.
+
+Veri bir kez okunur (tüm analizlerin ihtiyaç duyduğu kolonların birleşimi), zaman
+damgaları bir kez çözülür ve fatura, tahmin, arıza ve kaçak akım analizleri aynı
+DataFrame üzerinde çalışır. Sonuç agent ve dashboard'un kullandığı tek bir AnalysisResult'tır.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from data.rollups import BillingRollups, rollup_files
+from ml import anomaly
+from ml.predict import (
+    FEATURES, LEAKAGE_FEATURES, billing_from_frame, isolation_anomalies, load_measurements,
+    month_to_date_prior, predict_energy,
+)
+from utils import metrics
+from utils.schemas import AnalysisResult
+
+
+ENGINE_SECONDS = metrics.histogram("kilowizard_engine_seconds", "Tek geçişli analiz motoru süresi")
+
+
+ALL_ANALYSES = ("billing", "predict", "faults", "leakage")
+
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", "4"))
+_pool = ThreadPoolExecutor(max_workers=ENGINE_WORKERS, thread_name_prefix="analysis")
+
+
+def _columns(analyses, use_detectors, use_rollups):
+    columns = []
+    if "billing" in analyses and not use_rollups:
+        columns.append("energy")
+    if "predict" in analyses or ("faults" in analyses and not use_detectors["fault"]):
+        columns += FEATURES
+    if "leakage" in analyses and not use_detectors["leakage"]:
+        columns += LEAKAGE_FEATURES
+    return list(dict.fromkeys(columns))
+
+
+@metrics.timed(ENGINE_SECONDS)
+def analyze(analyses=ALL_ANALYSES, json_path=None, breakers=None, start=None, end=None,
+            n_days: int = 30, store=None, parallel: bool = True) -> AnalysisResult:
+    """İstenen analizleri tek veri yüklemesiyle çalıştırır.
+
+    json_path verilmezse kolon deposu kullanılır; fatura özetleri ve eğitilmiş dedektörler
+    varsa fatura, arıza ve kaçak akım sonuçları bunlardan gelir ve ilgili kolonlar hiç okunmaz.
+    parallel=True ise veri yüklendikten sonra analizler eşzamanlı çalışır.
+    """
+    analyses = set(analyses)
+    use_detectors = {
+        kind: json_path is None and anomaly.has_detector(kind) for kind in ("fault", "leakage")
+    }
+    use_rollups = json_path is None and bool(rollup_files())
+    result = AnalysisResult()
+
+    # Sonuç alanı → hesaplayan fonksiyon; hepsi aynı DataFrame'i paylaşır
+    tasks = {}
+    columns = _columns(analyses, use_detectors, use_rollups)
+    if columns:
+        df = load_measurements(json_path, columns=columns, breakers=breakers, start=start, end=end, store=store)
+        result.rows = len(df)
+
+        if "billing" in analyses and not use_rollups:
+            tasks["billing"] = lambda: billing_from_frame(
+                df, prior=month_to_date_prior(json_path, breakers, start, store=store))
+
+        if "predict" in analyses and not df.empty:
+            def _predict():
+                means = df[FEATURES].mean()
+                return predict_energy(
+                    float(means["voltage"]), float(means["current"]), float(means["active_power"]), n_days=n_days
+                )
+            tasks["predict_result"] = _predict
+
+        if "faults" in analyses and not use_detectors["fault"]:
+            tasks["faults"] = lambda: isolation_anomalies(df, FEATURES)
+
+        if "leakage" in analyses and not use_detectors["leakage"]:
+            tasks["leakage_result"] = lambda: isolation_anomalies(df, LEAKAGE_FEATURES)
+
+    if "billing" in analyses and use_rollups:
+        tasks["billing"] = lambda: BillingRollups.load_cached().bill(breakers, start, end)
+    if "faults" in analyses and use_detectors["fault"]:
+        tasks["faults"] = lambda: anomaly.detect("fault", store=store, breakers=breakers, start=start, end=end)
+    if "leakage" in analyses and use_detectors["leakage"]:
+        tasks["leakage_result"] = lambda: anomaly.detect("leakage", store=store, breakers=breakers, start=start, end=end)
+
+    # Birbirinden bağımsız analizler thread havuzunda eşzamanlı çalışır
+    if parallel and len(tasks) > 1:
+        futures = {field: _pool.submit(fn) for field, fn in tasks.items()}
+        for field, fut in futures.items():
+            setattr(result, field, fut.result())
+    else:
+        for field, fn in tasks.items():
+            setattr(result, field, fn())
+
+    return result
@@ -1,118 +1,189 @@
-import joblib
+import numpy as np
 import pandas as pd
 import json
 
 from utils.schemas import RawMeasurement
+from utils.batch import MeasurementBatch
 from sklearn.ensemble import IsolationForest
-
-
-def predict_energy(voltage: float, current: float, active_power: float, n_days: int = 5):
-    # Modeli yükle
-    model = joblib.load("C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\ml\\bill_predictor.pkl")
-
-    # n_days kadar aynı ölçüm değerleriyle tahmin yapılacak
-    input_data = pd.DataFrame([{
-        "voltage": voltage,
-        "current": current,
-        "active_power": active_power
-    }] * n_days)
-
-    predictions = model.predict(input_data)
-    total_energy = predictions.sum()
-    estimated_cost = total_energy * 2.1  # 1 kWh = 2.1 TL varsayımı
+from data.tiers import TieredStore
+from data.rollups import BillingRollups, rollup_files
+from data.tariff import TariffBook
+from ml.registry import registry, BILL_MODEL_PATH
+from ml import anomaly
+from utils import metrics
+
+
+DATA_LOAD_SECONDS = metrics.histogram("kilowizard_data_load_seconds", "Ölçüm verisi yükleme süresi")
+DATA_LOAD_ROWS = metrics.counter("kilowizard_data_load_rows_total", "Yüklenen ölçüm satırı sayısı")
+ANALYSIS_SECONDS = metrics.histogram("kilowizard_analysis_seconds", "Analiz fonksiyonlarının süresi")
+
+
+def load_measurements(json_path=None, columns=None, breakers=None, start=None, end=None, store=None):
+    with DATA_LOAD_SECONDS.time(source="json" if json_path is not None else "store"):
+        df = _load_measurements(json_path, columns, breakers, start, end, store)
+    DATA_LOAD_ROWS.inc(len(df))
+    return df
+
+
+def _load_measurements(json_path, columns, breakers, start, end, store):
+    # json_path verilirse tüm JSON kolon bazlı okunur (geçersiz satırlar atlanır). Verilmezse kolon deposundan
+    # yalnızca istenen breaker/gün bölümleri ve kolonlar okunur.
+    if json_path is not None:
+        with open(json_path, "rb") as f:
+            batch = MeasurementBatch.from_json(f.read()).validated(drop_invalid=True)
+        mask = np.ones(len(batch), dtype=bool)
+        if breakers is not None:
+            mask &= np.isin(batch.breaker_id, list(breakers))
+        if start is not None:
+            mask &= batch.timestamp >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            mask &= batch.timestamp < np.datetime64(pd.Timestamp(end))
+        if not mask.all():
+            batch = batch[mask]
+        return batch.to_frame(columns)
+
+    # Saklama süresi dolan günler özet katmanlarından gelir (energy kova toplamıdır)
+    store = store or TieredStore()
+    return store.query(breakers=breakers, start=start, end=end, columns=columns)
+
+
+FEATURES = ["voltage", "current", "active_power"]
+LEAKAGE_FEATURES = ["leakage_current"]
+
+
+@metrics.timed(ANALYSIS_SECONDS, analysis="predict_energy_batch")
+def predict_energy_batch(scenarios, n_days=5, model_path: str = BILL_MODEL_PATH, model_version: str = None,
+                         price: float = None, tariffs: TariffBook = None) -> pd.DataFrame:
+    """Çok sayıda senaryo (breaker × ölçüm × ufuk) için tek seferde tahmin.
+
+    scenarios: voltage/current/active_power kolonlarını içeren DataFrame ya da dizi sözlüğü;
+    isteğe bağlı breaker_id ve senaryo başına n_days kolonu olabilir. n_days kolonu yoksa
+    n_days parametresi (sayı veya dizi) kullanılır.
+
+    Özellikler günden güne değişmediği için günlük tahmin senaryo başına bir kez hesaplanır
+    ve ufukla çarpılır; tek bir model.predict çağrısı yapılır.
+
+    Maliyet breaker'ın tarifesinden (data.tariff) hesaplanır; price verilirse sabit fiyat kullanılır.
+    """
+    df = scenarios if isinstance(scenarios, pd.DataFrame) else pd.DataFrame(scenarios)
+    model = registry.get(model_path, model_version)
+
+    daily = np.asarray(model.predict(df[FEATURES]), dtype=np.float64)
+    horizon = df["n_days"].to_numpy() if "n_days" in df.columns else np.broadcast_to(n_days, len(df))
+    total = daily * horizon
+    if price is not None:
+        cost = total * price
+    else:
+        tariffs = tariffs or _tariffs()
+        cost = tariffs.estimate(df["breaker_id"].to_numpy() if "breaker_id" in df.columns else None, total)
+
+    out = pd.DataFrame({
+        "daily_kWh": daily,
+        "n_days": horizon,
+        "total_energy_kWh": total,
+        "estimated_cost_TL": cost,
+    }, index=df.index)
+    if "breaker_id" in df.columns:
+        out.insert(0, "breaker_id", df["breaker_id"].to_numpy())
+    return out
+
+
+def predict_energy(voltage: float, current: float, active_power: float, n_days: int = 5,
+                   model_path: str = BILL_MODEL_PATH, model_version: str = None):
+    # Tek senaryo için batch API'nin ince sarmalayıcısı; süre predict_energy_batch'te ölçülür
+    result = predict_energy_batch(
+        {"voltage": [voltage], "current": [current], "active_power": [active_power]},
+        n_days=n_days, model_path=model_path, model_version=model_version,
+    )
+    daily = float(result["daily_kWh"].iloc[0])
 
     return {
-        "daily_predictions_kWh": [round(p, 2) for p in predictions],
-        "total_energy_kWh": round(float(total_energy), 2),
-        "estimated_cost_TL": round(float(estimated_cost), 2)
+        "daily_predictions_kWh": [round(daily, 2)] * n_days,
+        "total_energy_kWh": round(float(result["total_energy_kWh"].iloc[0]), 2),
+        "estimated_cost_TL": round(float(result["estimated_cost_TL"].iloc[0]), 2)
     }
 
-def breaker_based_billing(json_path="C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\data\\sample.json"):
-    # JSON dosyasını oku
-    with open(json_path, "r") as f:
-        data = json.load(f)
-
-    # Veriyi pandas DataFrame'e çevir
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['date'] = df['timestamp'].dt.date
-
-    # Devre ve güne göre enerji tüketimini topla
-    grouped = df.groupby(['breaker_id', 'date'])['energy'].sum().reset_index()
-
-    # Günlük tüketimi TL'ye çevir (örnek: 2.1 TL/kWh)
-    grouped['daily_cost_TL'] = grouped['energy'] * 2.1
+@metrics.timed(ANALYSIS_SECONDS, analysis="breaker_based_billing")
+def breaker_based_billing(json_path=None, breakers=None, start=None, end=None, rollups=None):
+    # Ham veri yerine ingest sırasında güncellenen günlük özetlerden cevapla
+    if json_path is None:
+        if rollups is None and rollup_files():
+            rollups = BillingRollups.load_cached()
+        if rollups is not None:
+            return rollups.bill(breakers, start, end)
+
+    # Sadece istenen zaman aralığındaki enerji kolonunu oku
+    df = load_measurements(json_path, columns=['energy'], breakers=breakers, start=start, end=end)
+    return billing_from_frame(df, prior=month_to_date_prior(json_path, breakers, start))
+
+def month_to_date_prior(json_path=None, breakers=None, start=None, store=None, tariffs: TariffBook = None):
+    # Sorgu ay ortasından başlıyorsa kademe sayacı sıfırdan değil, ayın başından start'a
+    # kadarki tüketimden başlar (özet yolundaki month_energy ile aynı sonuç)
+    tariffs = tariffs or _tariffs()
+    if start is None or not tariffs.has_tiers:
+        return None
+    pre = load_measurements(json_path, columns=['energy'], breakers=breakers,
+                            start=tariffs.month_start(start), end=start, store=store)
+    return tariffs.month_totals(pre['breaker_id'].to_numpy(), pre['timestamp'].to_numpy(), pre['energy'].to_numpy())
+
+def billing_from_frame(df: pd.DataFrame, tariffs: TariffBook = None, prior=None) -> dict:
+    # Her okumanın maliyeti tarifeden (zaman bandı + aylık kademe) vektörel hesaplanır;
+    # prior (month_to_date_prior) aralık öncesindeki aylık tüketimi verir
+    tariffs = tariffs or _tariffs()
+    cost = tariffs.cost(df['breaker_id'].to_numpy(), df['timestamp'].to_numpy(), df['energy'].to_numpy(), prior)
 
     # Her devre için toplam enerji ve toplam maliyeti hesapla
-    total = grouped.groupby('breaker_id').agg({
-        'energy': 'sum',
-        'daily_cost_TL': 'sum'
-    }).reset_index()
+    total = pd.DataFrame({'energy': df['energy'].to_numpy(), 'cost_TL': cost}, index=df['breaker_id'].to_numpy())
+    total = total.groupby(level=0).sum().round(2)
 
     # JSON formatında çıktı hazırla
     result = {
-        row['breaker_id']: {
-            "total_energy_kWh": round(row['energy'], 2),
-            "total_cost_TL": round(row['daily_cost_TL'], 2)
-        }
-        for _, row in total.iterrows()
+        breaker: {"total_energy_kWh": energy, "total_cost_TL": cost}
+        for breaker, energy, cost in zip(total.index, total['energy'].tolist(), total['cost_TL'].tolist())
     }
 
     return result
 
-def leakage_anomaly_detection(json_path="C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\data\\sample.json"):
-    # JSON verisini oku
-    with open(json_path, "r") as f:
-        data = json.load(f)
-
-    # Pandas DataFrame'e çevir
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Gerekli alanları seç
-    leakage_data = df[['breaker_id', 'timestamp', 'leakage_current']]
-
-    # Isolation Forest modelini kur
+_tariff_book = None
+
+def _tariffs() -> TariffBook:
+    # TARIFF_PATH süreç başına bir kez okunur
+    global _tariff_book
+    if _tariff_book is None:
+        _tariff_book = TariffBook.load()
+    return _tariff_book
+
+def anomaly_dates(df: pd.DataFrame, mask) -> dict:
+    # Anomali satırlarını breaker'a göre grupla: {breaker_id: [şüpheli günler]}
+    flagged = df.loc[mask, ['breaker_id']].assign(date=df.loc[mask, 'timestamp'].dt.strftime('%Y-%m-%d'))
+    flagged = flagged.drop_duplicates().sort_values(['breaker_id', 'date'])
+    return {breaker: dates.tolist() for breaker, dates in flagged.groupby('breaker_id')['date']}
+
+def isolation_anomalies(df: pd.DataFrame, features) -> dict:
+    # Isolation Forest'ı verilen pencereye fit edip anomali günlerini döndür
+    if df.empty:
+        return {}
     model = IsolationForest(contamination=0.05, random_state=42)
-    leakage_data['anomaly'] = model.fit_predict(leakage_data[['leakage_current']])
-
-    # Anomali (-1) olanları grupla
-    result = {}
-    for _, row in leakage_data.iterrows():
-        if row['anomaly'] == -1:
-            breaker = row['breaker_id']
-            date = str(row['timestamp'].date())
-            if breaker not in result:
-                result[breaker] = []
-            result[breaker].append(date)
-
-    return result
-
-def fault_detection(json_path="C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\data\\sample.json"):
-    with open(json_path, "r") as f:
-        data = json.load(f)
-
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Gerekli alanlar
-    fault_data = df[['breaker_id', 'timestamp', 'voltage', 'current', 'active_power']]
-
-    # Modeli kur
-    model = IsolationForest(contamination=0.05, random_state=42)
-    fault_data['anomaly'] = model.fit_predict(fault_data[['voltage', 'current', 'active_power']])
-
-    # Anomali (-1) olanları grupla
-    result = {}
-    for _, row in fault_data.iterrows():
-        if row['anomaly'] == -1:
-            breaker = row['breaker_id']
-            date = str(row['timestamp'].date())
-            if breaker not in result:
-                result[breaker] = []
-            result[breaker].append(date)
-
-    return result
+    labels = model.fit_predict(df[features])
+    return anomaly_dates(df, labels == -1)
+
+@metrics.timed(ANALYSIS_SECONDS, analysis="leakage_anomaly_detection")
+def leakage_anomaly_detection(json_path=None, breakers=None, start=None, end=None):
+    # Eğitilmiş dedektör varsa sadece yeni ölçümleri skorla, sonucu önbellekten ver
+    if json_path is None and anomaly.has_detector("leakage"):
+        return anomaly.detect("leakage", breakers=breakers, start=start, end=end)
+
+    # Veriyi oku (sadece kaçak akım kolonu)
+    df = load_measurements(json_path, columns=LEAKAGE_FEATURES, breakers=breakers, start=start, end=end)
+    return isolation_anomalies(df, LEAKAGE_FEATURES)
+
+@metrics.timed(ANALYSIS_SECONDS, analysis="fault_detection")
+def fault_detection(json_path=None, breakers=None, start=None, end=None):
+    if json_path is None and anomaly.has_detector("fault"):
+        return anomaly.detect("fault", breakers=breakers, start=start, end=end)
+
+    df = load_measurements(json_path, columns=FEATURES, breakers=breakers, start=start, end=end)
+    return isolation_anomalies(df, FEATURES)
 
 if __name__ == "__main__":
     output = fault_detection()
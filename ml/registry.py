@@ -0,0 +1,175 @@
+"""Süreç içi model kayıt defteri.
+
+Her model dosyası süreç başına bir kez yüklenir ve (yol, içerik hash'i) ile anahtarlanır.
+Dosya diskte değişirse bir sonraki çağrıda yeni sürüm yüklenip atomik olarak devreye alınır;
+eski sürümler A/B testi veya geri dönüş için saklanır. Değişen dosya okunamazsa (ör. hâlâ
+yazılıyorsa) hata kaydedilir ve sonraki bir yükleme başarılı olana kadar mevcut sürüm
+kullanılmaya devam eder.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+from utils import metrics
+
+
+MODEL_LOAD_SECONDS = metrics.histogram("kilowizard_model_load_seconds", "Model dosyası yükleme süresi")
+MODEL_CACHE = metrics.counter("kilowizard_model_cache_total", "Model önbelleği isabet/ıska sayısı")
+MODEL_LOAD_ERRORS = metrics.counter("kilowizard_model_load_errors_total", "Başarısız model yeniden yükleme sayısı")
+
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+BILL_MODEL_PATH = os.getenv("BILL_MODEL_PATH", os.path.join(MODEL_DIR, "bill_predictor.pkl"))
+
+MAX_VERSIONS = int(os.getenv("MODEL_MAX_VERSIONS", "3"))
+CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "1.0"))
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+class _Entry:
+    def __init__(self, path):
+        self.path = path
+        self.versions = OrderedDict()  # version -> model (en yeni sonda)
+        self.current = None
+        self.pinned = None
+        self.stat = None
+        self.checked_at = 0.0
+        self.load_lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, max_versions: int = MAX_VERSIONS, check_interval: float = CHECK_INTERVAL,
+                 loader=joblib.load):
+        self.max_versions = max_versions
+        self.check_interval = check_interval
+        self.loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "load_errors": 0,
+            "load_seconds_total": 0.0,
+            "last_load_seconds": 0.0,
+        }
+
+    def _entry(self, path: str) -> _Entry:
+        path = os.path.abspath(path)
+        entry = self._entries.get(path)
+        if entry is None:
+            entry = self._entries.setdefault(path, _Entry(path))
+        return entry
+
+    def _load(self, entry: _Entry, stat) -> str:
+        # Yükleme kilit dışında yapılır; hazır olunca tek atamayla devreye alınır
+        started = time.perf_counter()
+        version = file_hash(entry.path)
+        model = entry.versions.get(version)
+        if model is None:
+            model = self.loader(entry.path)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.metrics["misses"] += 1
+            self.metrics["load_seconds_total"] += elapsed
+            self.metrics["last_load_seconds"] = elapsed
+            MODEL_LOAD_SECONDS.observe(elapsed, model=os.path.basename(entry.path))
+            MODEL_CACHE.inc(result="miss")
+            if entry.current is not None:
+                self.metrics["reloads"] += 1
+            entry.versions[version] = model
+            entry.versions.move_to_end(version)
+            # En eski sürümleri at; sabitlenen ve yeni yüklenen sürüm korunur
+            for old in list(entry.versions):
+                if len(entry.versions) <= self.max_versions:
+                    break
+                if old not in (entry.pinned, version):
+                    del entry.versions[old]
+            entry.current = version
+            entry.stat = (stat.st_mtime_ns, stat.st_size)
+        return version
+
+    def _refresh(self, entry: _Entry):
+        now = time.monotonic()
+        if entry.current is not None and now - entry.checked_at < self.check_interval:
+            return
+        entry.checked_at = now
+        try:
+            stat = os.stat(entry.path)
+            if entry.current is None or (stat.st_mtime_ns, stat.st_size) != entry.stat:
+                # Aynı dosyayı aynı anda yalnızca bir thread yüklesin
+                with entry.load_lock:
+                    if entry.current is None or (stat.st_mtime_ns, stat.st_size) != entry.stat:
+                        self._load(entry, stat)
+        except Exception as e:
+            if entry.current is None:
+                raise  # sunulacak sürüm yok
+            # entry.stat değişmediği için bir sonraki kontrolde yeniden denenir
+            with self._lock:
+                self.metrics["load_errors"] += 1
+            MODEL_LOAD_ERRORS.inc(model=os.path.basename(entry.path))
+            print(f"⚠️ Model yeniden yüklenemedi, {entry.current} sürümüyle devam ediliyor: {e}")
+
+    def get(self, path: str = BILL_MODEL_PATH, version: str = None):
+        """Modeli döndürür. version verilirse saklanan o sürüm, yoksa sabitlenen ya da en güncel sürüm."""
+        model, _ = self.get_with_version(path, version)
+        return model
+
+    def get_with_version(self, path: str = BILL_MODEL_PATH, version: str = None):
+        entry = self._entry(path)
+        self._refresh(entry)
+        with self._lock:
+            wanted = version or entry.pinned or entry.current
+            model = entry.versions.get(wanted)
+            if model is None:
+                raise KeyError(f"Model sürümü bulunamadı: {path}@{wanted}")
+            self.metrics["hits"] += 1
+            MODEL_CACHE.inc(result="hit")
+        return model, wanted
+
+    def versions(self, path: str = BILL_MODEL_PATH):
+        entry = self._entry(path)
+        with self._lock:
+            return list(entry.versions)
+
+    def current_version(self, path: str = BILL_MODEL_PATH) -> str:
+        entry = self._entry(path)
+        self._refresh(entry)
+        return entry.pinned or entry.current
+
+    def pin(self, version: str, path: str = BILL_MODEL_PATH):
+        """Geri dönüş: dosya değişse bile bu sürümü kullan."""
+        entry = self._entry(path)
+        with self._lock:
+            if version not in entry.versions:
+                raise KeyError(f"Model sürümü bulunamadı: {path}@{version}")
+            entry.pinned = version
+
+    def unpin(self, path: str = BILL_MODEL_PATH):
+        entry = self._entry(path)
+        with self._lock:
+            entry.pinned = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.metrics)
+            out["models"] = {
+                e.path: {"current": e.current, "pinned": e.pinned, "versions": list(e.versions)}
+                for e in self._entries.values()
+            }
+        return out
+
+
+registry = ModelRegistry()
@@ -0,0 +1,321 @@
+"""Tahmin servisi: dashboard'un çağırdığı POST /predict (port 8002).
+
+    uvicorn ml.server:app --port 8002
+
+İstekler geçmişin tamamı yerine breaker listesi ve zaman aralığı taşır; özellikler
+(ortalama gerilim/akım/aktif güç) kolon deposundan sunucu tarafında çıkarılır.
+Eşzamanlı istekler birkaç milisaniyelik pencerede mikro-partilere toplanır ve her
+parti için tek bir vektörel ``predict_energy_batch`` çağrısı yapılır. Model registry
+üzerinden bellekte kalır. Kuyruk sınırı (admission control) aşılırsa 503, isteğin
+süresi (deadline) dolarsa 504 döner; süresi dolmuş istekler partiye hiç girmez.
+Kuyruk sınırına partideki istekler kadar depodan özellik çıkaran thread'ler de sayılır.
+İstenen breaker'lar için özellik çıkmazsa 0 TL yerine 404 (gönderilen veride geçerli
+satır yoksa 422) döner.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from data.tiers import TieredStore
+from ml.predict import FEATURES, predict_energy_batch
+from ml.registry import registry, BILL_MODEL_PATH
+from utils import metrics
+from utils.batch import BatchValidationError, MeasurementBatch
+
+
+MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "256"))           # parti başına en fazla istek
+MAX_WAIT = float(os.getenv("PREDICT_MAX_WAIT_MS", "5")) / 1000    # partiyi doldurmak için bekleme
+MAX_QUEUE = int(os.getenv("PREDICT_MAX_QUEUE", "1000"))           # kabul edilen en fazla bekleyen istek
+DEFAULT_DEADLINE = float(os.getenv("PREDICT_DEADLINE_MS", "2000")) / 1000
+FEATURE_WINDOW = pd.Timedelta(hours=float(os.getenv("PREDICT_FEATURE_WINDOW_HOURS", "24")))
+FEATURE_CACHE_TTL = float(os.getenv("PREDICT_FEATURE_CACHE_TTL", "5"))
+FEATURE_CACHE_SIZE = 1024
+
+REQUEST_SECONDS = metrics.histogram("kilowizard_predict_request_seconds", "Tahmin isteği gecikmesi")
+BATCH_SIZE = metrics.histogram("kilowizard_predict_batch_size", "Mikro-parti başına istek sayısı",
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+OUTCOMES = metrics.counter("kilowizard_predict_requests_total", "Tahmin isteği sonuçları")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class MicroBatcher:
+    """İstekleri kısa bir pencerede toplayıp ``fn(items)`` ile tek seferde işler.
+
+    fn bir thread'de çalışır ve her öğe için bir sonuç listesi döndürür.
+    """
+
+    def __init__(self, fn, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT, max_queue: int = MAX_QUEUE):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.pending = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, item, deadline: float):
+        """deadline: loop.time() cinsinden mutlak son an."""
+        if self.pending >= self.max_queue:
+            raise Overloaded(f"Tahmin kuyruğu dolu ({self.pending}/{self.max_queue})")
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.pending += 1
+        self._queue.put_nowait((item, deadline, fut))
+        try:
+            return await asyncio.wait_for(fut, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("İstek süresi doldu") from None
+        finally:
+            self.pending -= 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            window_end = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = window_end - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Süresi dolmuş ya da iptal edilmiş istekler için iş yapılmaz
+            now = loop.time()
+            live = [(item, fut) for item, deadline, fut in batch if not fut.done() and deadline > now]
+            if not live:
+                continue
+            BATCH_SIZE.observe(len(live))
+            try:
+                results = await asyncio.to_thread(self.fn, [item for item, _ in live])
+            except Exception as exc:
+                for _, fut in live:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            for (_, fut), result in zip(live, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+
+# ----- özellikler -----
+class _FeatureCache:
+    # (breaker'lar, aralık) -> özellik tablosu; kısa TTL, aynı anda açık çok sayıda dashboard için
+    def __init__(self, ttl: float = FEATURE_CACHE_TTL, maxsize: int = FEATURE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+store = TieredStore()
+_features = _FeatureCache()
+
+
+def features_from_store(breakers: Optional[List[str]], start=None, end=None) -> pd.DataFrame:
+    """Breaker başına ortalama özellikler [breaker_id, voltage, current, active_power, n]."""
+    breakers = sorted(breakers) if breakers else store.breakers()
+    if end is None:
+        latest = store.max_timestamp(breakers)
+        end = latest + pd.Timedelta(1, "ns") if latest is not None else None
+    if start is None and end is not None:
+        start = pd.Timestamp(end) - FEATURE_WINDOW
+    key = (tuple(breakers), str(start), str(end))
+    cached = _features.get(key)
+    if cached is not None:
+        return cached
+    df = store.query(breakers=breakers, start=start, end=end, columns=FEATURES)
+    out = _mean_features(df)
+    _features.put(key, out)
+    return out
+
+
+def _mean_features(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(subset=FEATURES)
+    if df.empty:
+        return pd.DataFrame(columns=["breaker_id", *FEATURES, "n"])
+    grouped = df.groupby("breaker_id", sort=True)
+    out = grouped[FEATURES].mean()
+    out["n"] = grouped.size()
+    return out.reset_index()
+
+
+# ----- parti tahmini -----
+def predict_items(items: List[dict]) -> List[dict]:
+    """Tüm isteklerin senaryolarını birleştirip tek model çağrısıyla tahmin eder."""
+    # Partideki tüm istekler aynı model sürümüyle cevaplanır
+    version = registry.current_version(BILL_MODEL_PATH)
+    frames = [item["features"].assign(_req=i, n_days=item["n_days"])
+              for i, item in enumerate(items) if len(item["features"])]
+    scenarios = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    results = [{"expected_cost": 0.0, "total_energy_kWh": 0.0, "breakers": {}, "model_version": version}
+               for _ in items]
+    if scenarios.empty:
+        return results
+
+    pred = predict_energy_batch(scenarios, model_version=version)
+    req = scenarios["_req"].to_numpy()
+    energy = pred["total_energy_kWh"].to_numpy()
+    cost = pred["estimated_cost_TL"].to_numpy()
+    totals_e = np.bincount(req, weights=energy, minlength=len(items))
+    totals_c = np.bincount(req, weights=cost, minlength=len(items))
+    for i, b, d, e, c in zip(req.tolist(), scenarios["breaker_id"].tolist(), pred["daily_kWh"].tolist(),
+                             energy.tolist(), cost.tolist()):
+        results[i]["breakers"][b] = {"daily_kWh": round(d, 4), "energy_kWh": round(e, 4), "cost_TL": round(c, 2)}
+    for i, result in enumerate(results):
+        result["total_energy_kWh"] = round(float(totals_e[i]), 4)
+        result["expected_cost"] = round(float(totals_c[i]), 2)
+    return results
+
+
+batcher = MicroBatcher(predict_items)
+# Depodan özellik çıkaran thread sayısı; zaman aşımında bile thread bitene kadar sayılır
+extracting = 0
+
+
+def _extraction_done(_):
+    global extracting
+    extracting -= 1
+
+
+async def _extract(req, timeout: float) -> pd.DataFrame:
+    global extracting
+    extracting += 1
+    task = asyncio.ensure_future(asyncio.to_thread(features_from_store, req.breaker_ids, req.start, req.end))
+    task.add_done_callback(_extraction_done)
+    # shield: wait_for süresi dolunca görev iptal edilmez, sayaç thread gerçekten bitince düşer
+    return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+
+def _features_from_data(data: List[Union[dict, str]]) -> pd.DataFrame:
+    # Eski istemciler satırları JSON metni olarak gönderir
+    try:
+        rows = [json.loads(r) if isinstance(r, str) else r for r in data]
+        batch = MeasurementBatch.from_records(rows)
+    except BatchValidationError as exc:
+        raise HTTPException(422, {"invalid_rows": exc.invalid_rows, "errors": exc.errors})
+    except ValueError as exc:
+        raise HTTPException(422, f"Geçersiz ölçüm verisi: {exc}")
+    return _mean_features(batch.validated(drop_invalid=True).to_frame(FEATURES))
+
+
+class PredictRequest(BaseModel):
+    breaker_ids: Optional[List[str]] = None   # boşsa tüm breaker'lar
+    start: Optional[datetime] = None          # özellik penceresi; boşsa son PREDICT_FEATURE_WINDOW_HOURS
+    end: Optional[datetime] = None
+    horizon_hours: float = 24.0
+    deadline_ms: Optional[float] = None
+    data: Optional[List[Union[dict, str]]] = None  # eski biçim: ölçüm satırları (sözlük ya da JSON metni)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model ilk istekte değil açılışta yüklensin
+    try:
+        registry.get(BILL_MODEL_PATH)
+    except OSError:
+        pass
+    await batcher.start()
+    yield
+    await batcher.stop()
+
+
+app = FastAPI(title="Kilowizard Predict", lifespan=lifespan)
+
+
+@app.post("/predict")
+async def predict(req: PredictRequest):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + (req.deadline_ms / 1000 if req.deadline_ms else DEFAULT_DEADLINE)
+    if batcher.pending + extracting >= batcher.max_queue:
+        # Özellik çıkarmaya başlamadan reddet
+        OUTCOMES.inc(outcome="rejected")
+        raise HTTPException(503, "Tahmin servisi yoğun", headers={"Retry-After": "1"})
+    try:
+        if req.data is not None:
+            features = _features_from_data(req.data)
+            if features.empty:
+                OUTCOMES.inc(outcome="no_data")
+                raise HTTPException(422, "Gönderilen veride geçerli ölçüm yok")
+        else:
+            features = await _extract(req, max(deadline - loop.time(), 0))
+            if features.empty:
+                OUTCOMES.inc(outcome="no_data")
+                raise HTTPException(404, "İstenen breaker'lar ve aralık için ölçüm bulunamadı")
+        result = await batcher.submit({"features": features, "n_days": req.horizon_hours / 24}, deadline)
+    except Overloaded as exc:
+        OUTCOMES.inc(outcome="rejected")
+        raise HTTPException(503, str(exc), headers={"Retry-After": "1"})
+    except (DeadlineExceeded, asyncio.TimeoutError):
+        OUTCOMES.inc(outcome="deadline")
+        raise HTTPException(504, "İstek süresi doldu")
+    finally:
+        REQUEST_SECONDS.observe(loop.time() - started)
+    OUTCOMES.inc(outcome="ok")
+    return {**result, "horizon_hours": req.horizon_hours, "readings": int(features["n"].sum())}
+
+
+@app.get("/predict/status")
+def status():
+    return {"pending": batcher.pending, "extracting": extracting, "max_queue": batcher.max_queue, "max_batch": batcher.max_batch,
+            "models": registry.stats()["models"]}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,15 +1,24 @@
 import pandas as pd
-import json
+import numpy as np
+import os
+import sys
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 import joblib
 
+from data.tiers import TieredStore
+from ml.predict import load_measurements, FEATURES
+from ml.registry import BILL_MODEL_PATH, MODEL_DIR
 
-def load_data(json_path="C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\data\\sample.json"):
-    with open(json_path, "r") as f:
-        data = json.load(f)
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+
+CHECKPOINT_PATH = os.getenv("TRAIN_CHECKPOINT_PATH", os.path.join(MODEL_DIR, "train_checkpoint.npz"))
+BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "500000"))
+
+
+def load_data(json_path=None, breakers=None, start=None, end=None):
+    # json_path verilmezse kolon deposundan sadece eğitimde kullanılan kolonlar okunur
+    df = load_measurements(json_path, columns=['voltage', 'current', 'active_power', 'energy'],
+                           breakers=breakers, start=start, end=end)
     df = df.sort_values(by='timestamp')
     return df
 
@@ -31,10 +40,160 @@ def train_model(daily_energy: pd.DataFrame):
     print("Model eğitildi. Skor:", model.score(X_test, y_test))
 
     # Modeli diske kaydet
-    joblib.dump(model, "C:\\Users\\90554\\Documents\\GitHub\\Kilowizard\\ml\\bill_predictor.pkl")
-    print("Model kaydedildi: models/bill_predictor.pkl")
+    joblib.dump(model, BILL_MODEL_PATH)
+    print(f"Model kaydedildi: {BILL_MODEL_PATH}")
+
+
+# ----- Akış (out-of-core) eğitim -----
+class LinearStats:
+    """En küçük kareler için akışta biriken yeterli istatistikler.
+
+    [1, X] için X'X ve X'y toplanır; model bunlardan kapalı formda çözülür, yani
+    sonuç tüm veriye tek seferde LinearRegression.fit ile aynıdır ama bellek sabittir.
+    """
+
+    def __init__(self, n_features: int = len(FEATURES)):
+        k = n_features + 1
+        self.xtx = np.zeros((k, k))
+        self.xty = np.zeros(k)
+        self.yty = 0.0
+        self.y_sum = 0.0
+        self.n = 0
+        # "breaker/gün" bölümü -> işlenmiş son zaman damgası (ns); bölüme sonradan eklenen satırlar da katılır
+        self.marks = {}
+        self.watermark = None  # eski checkpoint'lerin tamamen işlenmiş son günü (YYYY-MM-DD)
+
+    def update(self, X: np.ndarray, y: np.ndarray, w: np.ndarray = None):
+        # w: satır ağırlığı (özet satırlarında kovadaki okuma sayısı)
+        w = np.ones(len(y)) if w is None else w
+        mask = np.isfinite(X).all(axis=1) & np.isfinite(y) & (w > 0)
+        X, y, w = X[mask], y[mask], w[mask]
+        Xa = np.column_stack([np.ones(len(X)), X])
+        self.xtx += Xa.T @ (Xa * w[:, None])
+        self.xty += Xa.T @ (y * w)
+        self.yty += float(y @ (y * w))
+        self.y_sum += float(y @ w)
+        self.n += int(round(w.sum()))
+
+    def solve(self) -> np.ndarray:
+        # Tekil matrislerde de çalışsın diye lstsq
+        return np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+
+    def r2(self, beta: np.ndarray) -> float:
+        sse = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        sst = self.yty - self.y_sum ** 2 / self.n
+        return float(1 - sse / sst) if sst > 0 else 0.0
+
+    def save(self, path: str = CHECKPOINT_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, xtx=self.xtx, xty=self.xty, yty=self.yty, y_sum=self.y_sum, n=self.n,
+                 watermark=self.watermark or "", mark_keys=np.array(list(self.marks), dtype=str),
+                 mark_values=np.array(list(self.marks.values()), dtype=np.int64))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = CHECKPOINT_PATH) -> "LinearStats":
+        stats = cls()
+        if os.path.exists(path):
+            with np.load(path) as z:
+                stats.xtx, stats.xty = z["xtx"], z["xty"]
+                stats.yty, stats.y_sum, stats.n = float(z["yty"]), float(z["y_sum"]), int(z["n"])
+                stats.watermark = str(z["watermark"]) or None
+                if "mark_keys" in z.files:
+                    stats.marks = dict(zip(z["mark_keys"].tolist(), z["mark_values"].tolist()))
+        return stats
+
+    def to_model(self) -> LinearRegression:
+        beta = self.solve()
+        model = LinearRegression()
+        model.intercept_ = float(beta[0])
+        model.coef_ = beta[1:]
+        model.n_features_in_ = len(FEATURES)
+        model.feature_names_in_ = np.array(FEATURES, dtype=object)
+        return model
+
+
+def iter_batches(store, marks: dict, batch_size: int = BATCH_SIZE, legacy_day: str = None):
+    """Bölümlerin marks'taki zaman damgasından yeni satırlarını gün sırasıyla döndürür.
+
+    Her parça (bölüm anahtarı, X, y, ağırlık, parçanın son zaman damgası) biçimindedir ve
+    en fazla batch_size satırdır; kolonlar mmap'ten dilimlendiği için bellekte bir anda tek
+    parça bulunur. legacy_day verilirse (eski checkpoint) o güne kadarki bölümler işlenmiş sayılır.
+
+    store bir TieredStore ise özet katmanlarının bölümleri de okunur: y kova başına okuma
+    enerjisi (energy / count), ağırlık count'tur. Anahtar seviyeden bağımsızdır; ham hâlinde
+    işlenmiş bir gün sıkıştırıldıktan sonra yeniden sayılmaz.
+    """
+    stores = getattr(store, "stores", [store])
+    parts = sorted((d, level, b) for level, s in enumerate(stores) for b in s.breakers() for d in s.days(b))
+    for day, level, breaker_id in parts:
+        source = stores[level]
+        columns = FEATURES + ["energy"] + (["count"] if level else [])
+        opened = source.open_partition(breaker_id, day, columns)
+        if opened is None:
+            continue
+        ts, cols = opened
+        key = f"{breaker_id}/{day}"
+        mark = marks.get(key)
+        if mark is None and legacy_day is not None and day <= legacy_day:
+            if len(ts):
+                marks[key] = int(ts[-1])
+            continue
+        lo = 0 if mark is None else int(np.searchsorted(ts, mark, side="right"))
+        for start in range(lo, len(ts), batch_size):
+            stop = min(start + batch_size, len(ts))
+            X = np.column_stack([np.asarray(cols[f][start:stop], dtype=np.float64) for f in FEATURES])
+            y = np.asarray(cols["energy"][start:stop], dtype=np.float64)
+            w = None
+            if level:
+                w = np.asarray(cols["count"][start:stop], dtype=np.float64)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    y = y / w
+            yield key, X, y, w, int(ts[stop - 1])
+
+
+def train_streaming(store=None, batch_size: int = BATCH_SIZE, resume: bool = True,
+                    checkpoint_path: str = CHECKPOINT_PATH, model_path: str = BILL_MODEL_PATH):
+    """Veriyi sabit boyutlu parçalarla tarayıp modeli artımlı eğitir.
+
+    Checkpoint her bölüm için işlenmiş son zaman damgasını tutar; yeniden eğitim yalnızca
+    yeni satırları (yeni günler, bugünün devamı, işlenmiş günlere sonradan eklenenler) ekler.
+    Checkpoint her gün bittiğinde alınır. Varsayılan depo TieredStore'dur; saklama süresi
+    dolan ham günler özet katmanlarından okunur (baştan eğitimde geçmiş kaybolmaz).
+    """
+    store = store or TieredStore()
+    stats = LinearStats.load(checkpoint_path) if resume else LinearStats()
+
+    current_day = None
+    for key, X, y, w, last in iter_batches(store, stats.marks, batch_size, legacy_day=stats.watermark):
+        day = key.rsplit("/", 1)[1]
+        if current_day is not None and day != current_day:
+            stats.save(checkpoint_path)
+        current_day = day
+        stats.update(X, y, w)
+        stats.marks[key] = last
+    stats.save(checkpoint_path)
+
+    if stats.n == 0:
+        print("Eğitim verisi yok.")
+        return None
+
+    model = stats.to_model()
+    print("Model eğitildi. Satır:", stats.n, "Skor (R², eğitim):", round(stats.r2(stats.solve()), 4))
+
+    tmp = model_path + ".tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, model_path)
+    print(f"Model kaydedildi: {model_path}")
+    return model
 
 
 if __name__ == "__main__":
-    df = load_data()
-    train_model(df)
+    # python -m ml.train            → tüm veriyi belleğe alıp eğit
+    # python -m ml.train stream     → checkpoint'ten devam ederek parça parça eğit
+    # python -m ml.train stream reset → checkpoint'i yok sayıp baştan eğit
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        train_streaming(resume=not (len(sys.argv) > 2 and sys.argv[2] == "reset"))
+    else:
+        df = load_data()
+        train_model(df)
@@ -0,0 +1,189 @@
+"""Streamlit oturumları arasında paylaşılan, salt okunur kolon önbelleği.
+
+Her oturumun JSON'u okuyup satır başına bir RawMeasurement üretmesi yerine süreç
+başına tek bir önbellek kolon deposunun gün bölümlerinin listesini ve bölüm başına
+özetlerini (enerji toplamı, son zaman damgası) tutar; pasta grafiği gibi özetler bu
+toplamlardan vektörel olarak çıkar. ``refresh()`` yalnızca yeni ya da değişen
+bölümleri yeniden okur (ingest sonrası artımlı güncelleme).
+
+Bölümler kalıcı olarak açık tutulmaz: ``query`` yalnızca aralıkla kesişen bölümleri
+o sorgu için mmap'ler ve sonucu kopyaladıktan sonra bırakır. Böylece açık eşleme
+sayısı breaker × gün × kolon ile büyüyüp vm.max_map_count sınırına dayanmaz.
+
+Depo bir data.tiers.TieredStore ise ham depo ve özet katmanlarının bölümleri birlikte
+tutulur; sıkıştırmayla kaldırılan bölümler bir sonraki taramada bırakılır.
+"""
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.store import ColumnStore, METRIC_COLUMNS, TimeLike
+
+
+REFRESH_INTERVAL = float(os.getenv("UI_CACHE_REFRESH", "5"))
+# Artımlı taramada her breaker'ın son kaç günü yeniden kontrol edilir (geç gelen veri için)
+RECHECK_DAYS = int(os.getenv("UI_CACHE_RECHECK_DAYS", "2"))
+
+
+class _Partition:
+    """Bölümün önbellekte tutulan özeti; veri kolonları burada tutulmaz."""
+    __slots__ = ("sig", "energy", "last_ts")
+
+    def __init__(self, sig: tuple, energy: float, last_ts: Optional[int]):
+        self.sig = sig
+        self.energy = energy
+        self.last_ts = last_ts
+
+    @classmethod
+    def read(cls, store: ColumnStore, breaker_id: str, day: str, sig: tuple) -> Optional["_Partition"]:
+        opened = store.open_partition(breaker_id, day, ["energy"])
+        if opened is None:
+            return None
+        ts, cols = opened
+        # Ekleme sırasında kolonlar timestamp'ten önce uzar; geçerli satırlar len(ts) kadardır
+        energy = cols["energy"][:len(ts)]
+        return cls(sig, float(np.nansum(energy)) if len(energy) else 0.0, int(ts[-1]) if len(ts) else None)
+
+
+def _signature(part_dir: str):
+    try:
+        st = os.stat(os.path.join(part_dir, "timestamp.npy"))
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class MeasurementCache:
+    def __init__(self, store: ColumnStore = None, refresh_interval: float = REFRESH_INTERVAL):
+        self.store = store or ColumnStore()
+        self.stores = getattr(self.store, "stores", [self.store])
+        self.refresh_interval = refresh_interval
+        # breaker -> {(gün, seviye): _Partition}; okuyucular kilitsiz, anlık görüntü olarak kullanır
+        self._parts = {}
+        self._days = {}   # breaker -> sıralı (gün, seviye) listesi
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self.refresh(full=True)
+
+    # ----- güncelleme -----
+    def refresh(self, force: bool = False, full: bool = False) -> int:
+        """Yeni/değişen bölümleri yükler ve yeniden açılan bölüm sayısını döndürür.
+
+        Varsayılan tarama yeni günleri ve her breaker'ın son RECHECK_DAYS gününü kontrol
+        eder; full=True tüm bölümleri yeniden kontrol eder (geçmişe dönük yükleme sonrası).
+        """
+        if not (force or full) and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return 0
+        with self._lock:
+            parts = dict(self._parts)
+            days_map = dict(self._days)
+            changed = 0
+            stores = self.stores
+            for breaker_id in sorted(set(self._parts) | set().union(*(s.breakers() for s in stores))):
+                known = parts.get(breaker_id, {})
+                listed = set()
+                updated = None
+                for level, store in enumerate(stores):
+                    days = store.days(breaker_id)
+                    listed.update((day, level) for day in days)
+                    recheck = set(days) if full else set(days[-RECHECK_DAYS:])
+                    for day in days:
+                        key = (day, level)
+                        if key in known and day not in recheck:
+                            continue
+                        sig = _signature(store._partition_dir(breaker_id, day))
+                        if sig is None or (key in known and known[key].sig == sig):
+                            continue
+                        part = _Partition.read(store, breaker_id, day, sig)
+                        if part is None:
+                            continue
+                        if updated is None:
+                            updated = dict(known)
+                        updated[key] = part
+                        changed += 1
+                # Sıkıştırılıp taşınan ya da silinen bölümler
+                removed = set(known) - listed
+                if removed:
+                    updated = updated if updated is not None else dict(known)
+                    for key in removed:
+                        del updated[key]
+                    changed += len(removed)
+                if updated is not None:
+                    if updated:
+                        parts[breaker_id] = updated
+                        days_map[breaker_id] = sorted(updated)
+                    else:
+                        parts.pop(breaker_id, None)
+                        days_map.pop(breaker_id, None)
+            # Yeni sözlükler tek atamayla yayınlanır
+            self._parts, self._days = parts, days_map
+            self._refreshed_at = time.monotonic()
+            return changed
+
+    # ----- okuma -----
+    def breakers(self) -> List[str]:
+        return sorted(self._parts)
+
+    def _overlapping(self, breaker_id: str, start_ts, end_ts):
+        keys = self._days.get(breaker_id, [])
+        days = [day for day, _ in keys]
+        first_day = start_ts.strftime("%Y-%m-%d") if start_ts is not None else None
+        last_day = end_ts.strftime("%Y-%m-%d") if end_ts is not None else None
+        lo = 0 if first_day is None else int(np.searchsorted(days, first_day, side="left"))
+        hi = len(days) if last_day is None else int(np.searchsorted(days, last_day, side="right"))
+        return keys[lo:hi]
+
+    def query(self, breakers: Optional[Iterable[str]] = None, start: TimeLike = None,
+              end: TimeLike = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """ColumnStore.query ile aynı sözleşme: [start, end) aralığı, breaker_id + timestamp + kolonlar."""
+        start_ts = pd.Timestamp(start) if start is not None else None
+        end_ts = pd.Timestamp(end) if end is not None else None
+        columns = list(columns) if columns is not None else list(METRIC_COLUMNS)
+        breakers = list(breakers) if breakers is not None else self.breakers()
+        start_ns = start_ts.value if start_ts is not None else None
+        end_ns = end_ts.value if end_ts is not None else None
+
+        ids, stamps, cols = [], [], {c: [] for c in columns}
+        for breaker_id in breakers:
+            for day, level in self._overlapping(breaker_id, start_ts, end_ts):
+                # Bölüm yalnızca bu sorgu için açılır; dilimler aşağıda kopyalanınca eşleme bırakılır
+                opened = self.stores[level].open_partition(breaker_id, day, columns)
+                if opened is None:
+                    continue  # sıkıştırılıp taşındı; bir sonraki refresh'te listeden düşer
+                ts, part_cols = opened
+                lo = 0 if start_ns is None else int(np.searchsorted(ts, start_ns, side="left"))
+                hi = len(ts) if end_ns is None else int(np.searchsorted(ts, end_ns, side="left"))
+                if hi <= lo:
+                    continue
+                stamps.append(np.array(ts[lo:hi]))
+                ids.append(np.full(hi - lo, breaker_id, dtype=object))
+                for c in columns:
+                    cols[c].append(np.array(part_cols[c][lo:hi], dtype=np.float64))
+
+        out = {
+            "breaker_id": np.concatenate(ids) if ids else np.array([], dtype=object),
+            "timestamp": (np.concatenate(stamps) if stamps else np.array([], dtype=np.int64)).view("datetime64[ns]"),
+        }
+        for c in columns:
+            out[c] = np.concatenate(cols[c]) if cols[c] else np.array([], dtype=np.float64)
+        return pd.DataFrame(out)
+
+    def max_timestamp(self, breakers: Optional[Iterable[str]] = None) -> Optional[pd.Timestamp]:
+        latest = None
+        for breaker_id in (breakers if breakers is not None else self.breakers()):
+            days = self._days.get(breaker_id)
+            if not days:
+                continue
+            last_ts = self._parts[breaker_id][days[-1]].last_ts
+            if last_ts is not None and (latest is None or last_ts > latest):
+                latest = last_ts
+        return pd.Timestamp(latest) if latest is not None else None
+
+    def energy_by_breaker(self, breakers: Optional[Iterable[str]] = None) -> dict:
+        """Breaker başına toplam enerji (kWh); bölüm toplamlarından, veri yeniden okunmadan."""
+        breakers = list(breakers) if breakers is not None else self.breakers()
+        return {b: float(sum(p.energy for p in self._parts.get(b, {}).values())) for b in breakers}
@@ -0,0 +1,103 @@
+"""Dashboard grafikleri için veri servisi.
+
+Seri, kolon deposundan breaker ve zaman penceresine göre (gün bölümleri + searchsorted)
+okunur ve grafik genişliği kadar noktaya indirgenir. Böylece çizim süresi ve veri
+boyutu breaker'ın bir haftalık mı beş yıllık mı verisi olduğundan bağımsız kalır.
+Kademeli depoda (data.tiers) pencere / nokta sayısını karşılayan en kaba katman okunur.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.tiers import TieredStore
+
+
+CHART_POINTS = int(os.getenv("CHART_POINTS", "1000"))  # ~ grafik genişliği (piksel)
+
+WINDOWS = {
+    "Son 48 Saat": pd.Timedelta(hours=48),
+    "Son 7 Gün": pd.Timedelta(days=7),
+    "Son 30 Gün": pd.Timedelta(days=30),
+}
+
+
+# ----- indirgeme -----
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Largest-Triangle-Three-Buckets: şekli koruyarak n_out noktaya indirger."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    xf = x.astype(np.float64)
+    yf = y.astype(np.float64)
+
+    # İlk ve son nokta sabit; aradaki n-2 nokta n_out-2 kovaya bölünür
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Sonraki kovanın ortalaması (son kova için son nokta)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = xf[nlo:nhi].mean(), yf[nlo:nhi].mean()
+        area = np.abs((xf[a] - cx) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (cy - yf[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Her kovadan en küçük ve en büyük değeri tutar; ani tepeler (kaçak akım vb.) kaybolmaz."""
+    n = len(x)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return x, y
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    yf = np.where(np.isnan(y), np.inf, y)
+    lo_idx = edges[:-1] + np.array([np.argmin(yf[a:b]) for a, b in zip(edges[:-1], edges[1:])])
+    yf = np.where(np.isnan(y), -np.inf, y)
+    hi_idx = edges[:-1] + np.array([np.argmax(yf[a:b]) for a, b in zip(edges[:-1], edges[1:])])
+    keep = np.unique(np.concatenate([lo_idx, hi_idx]))  # zaman sırasını korur
+    return x[keep], y[keep]
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int = CHART_POINTS, method: str = "lttb"):
+    if method == "minmax":
+        return minmax(x, y, n_out)
+    if method == "lttb":
+        return lttb(x, y, n_out)
+    raise ValueError(f"Bilinmeyen indirgeme yöntemi: {method}")
+
+
+# ----- seri -----
+def window_bounds(store, breaker_id: str, window, end=None):
+    """Pencerenin [start, end) sınırları; end verilmezse breaker'ın son ölçümü esas alınır."""
+    span = WINDOWS[window] if isinstance(window, str) else pd.Timedelta(window)
+    if end is None:
+        end = store.max_timestamp(breakers=[breaker_id])
+        if end is None:
+            return None, None
+        end = end + pd.Timedelta(1, "ns")
+    end = pd.Timestamp(end)
+    return end - span, end
+
+
+def series(breaker_id: str, metric: str, window="Son 7 Gün", end=None, points: int = CHART_POINTS,
+           method: str = "lttb", store=None) -> pd.DataFrame:
+    """Tek breaker/metrik için pencereye kırpılmış ve indirgenmiş [timestamp, metrik] serisi.
+
+    store bir ColumnStore, TieredStore ya da aynı sorgu arayüzünü sunan ui.cache.MeasurementCache olabilir.
+    """
+    store = store or TieredStore()
+    start, end = window_bounds(store, breaker_id, window, end)
+    if start is None:
+        return pd.DataFrame({"timestamp": pd.Series([], dtype="datetime64[ns]"),
+                             metric: pd.Series([], dtype="float64")})
+    # Nokta başına düşen süreden ince kovalar grafikte görünmez
+    extra = {"resolution": (end - start) / max(points, 1)} if isinstance(store, TieredStore) else {}
+    df = store.query(breakers=[breaker_id], start=start, end=end, columns=[metric], **extra)
+    x = df["timestamp"].to_numpy().view("int64")
+    y = df[metric].to_numpy(dtype=np.float64)
+    x, y = downsample(x, y, points, method)
+    return pd.DataFrame({"timestamp": x.view("datetime64[ns]"), metric: y})
@@ -0,0 +1,63 @@
+"""Collector'ın canlı akışına (SSE) tarayıcıdan abone olan grafik bileşeni.
+
+Streamlit yeniden çalıştırılmaz ve geçmiş yeniden okunmaz: bileşen ilk bağlantıda
+son ``backlog`` okumayı alır, sonrasında yalnızca deltaları grafiğe ekler.
+EventSource koparsa kendiliğinden yeniden bağlanır ve Last-Event-ID ile kaldığı
+yerden devam eder.
+"""
+import json
+import os
+from urllib.parse import urlencode
+
+
+COLLECTOR_URL = os.getenv("COLLECTOR_URL", "http://localhost:8000")
+PLOTLY_JS = "https://cdn.plot.ly/plotly-2.32.0.min.js"
+
+_TEMPLATE = """
+<div id="live-chart" style="width:100%;height:{height}px;"></div>
+<div id="live-status" style="font:12px sans-serif;color:#888;"></div>
+<script src="{plotly}"></script>
+<script>
+(function () {{
+  const cfg = {cfg};
+  const el = document.getElementById("live-chart");
+  const status = document.getElementById("live-status");
+  Plotly.newPlot(el, [{{x: [], y: [], mode: "lines", line: {{color: cfg.color, width: 1.5}}, name: cfg.label}}], {{
+    title: cfg.title, margin: {{t: 40, r: 10, b: 40, l: 50}},
+    xaxis: {{title: "Zaman"}}, yaxis: {{title: cfg.label}},
+  }}, {{responsive: true, displayModeBar: false}});
+
+  const source = new EventSource(cfg.url);
+  source.onopen = () => {{ status.textContent = "● canlı"; }};
+  source.onerror = () => {{ status.textContent = "bağlantı koptu, yeniden deneniyor…"; }};
+  source.onmessage = (event) => {{
+    const entry = JSON.parse(event.data)[cfg.breaker];
+    if (!entry) return;
+    // Sunucu yavaş istemci için deltaları birleştirir; gap=true ise aradaki okumalar atlanmıştır
+    Plotly.extendTraces(el, {{x: [entry.timestamp], y: [entry[cfg.metric]]}}, [0], cfg.maxPoints);
+    status.textContent = "● canlı — son okuma " + entry.timestamp[entry.timestamp.length - 1];
+  }};
+}})();
+</script>
+"""
+
+
+def stream_url(breaker_id: str, metric: str, backlog: int = 300, collector_url: str = COLLECTOR_URL) -> str:
+    query = urlencode({"breaker_id": breaker_id, "metric": metric, "backlog": backlog})
+    return f"{collector_url.rstrip('/')}/live/stream?{query}"
+
+
+def chart_html(breaker_id: str, metric: str, label: str, color: str = "orange", backlog: int = 300,
+               max_points: int = 2000, height: int = 320, collector_url: str = COLLECTOR_URL) -> str:
+    """streamlit.components.v1.html ile gömülecek canlı grafik."""
+    cfg = {
+        "url": stream_url(breaker_id, metric, backlog, collector_url),
+        "breaker": breaker_id,
+        "metric": metric,
+        "label": label,
+        "title": f"{label} - {breaker_id} (Canlı)",
+        "color": color,
+        "maxPoints": max_points,
+    }
+    # "</script>" gibi dizeler betiği erken kapatmasın
+    return _TEMPLATE.format(cfg=json.dumps(cfg).replace("</", "<\\/"), plotly=PLOTLY_JS, height=height)
@@ -0,0 +1,348 @@
+"""Ölçümlerin kolon bazlı toplu gösterimi: MeasurementBatch.
+
+Satır başına bir RawMeasurement (Pydantic) nesnesi üretmek yerine her alan tek bir
+NumPy dizisinde tutulur: ``breaker_id`` (object), ``timestamp`` (datetime64[ns]) ve
+her metrik için float64. Doğrulama (zaman damgası çözümleme, NaN/sonsuz, aralık
+kontrolü) diziler üzerinde vektörel yapılır; Python nesnesi yalnızca hatalı satırlar
+için, hata kaydı olarak oluşur. pandas'a dönüşüm ve pandas'tan dönüşüm kopyasızdır
+(float64 ve datetime64[ns] kolonlar için).
+"""
+import json
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.schemas import Metrics, RawMeasurement
+
+
+METRIC_FIELDS = tuple(Metrics.model_fields)
+
+# Fiziksel olarak mümkün aralıklar (dahil); dışındaki değerler hatalı satır sayılır
+LIMITS = {
+    "current": (0.0, 10_000.0),            # A
+    "voltage": (0.0, 1_000.0),             # V
+    "active_power": (-10_000.0, 10_000.0),  # kW (üretimde negatif olabilir)
+    "reactive_power": (-10_000.0, 10_000.0),
+    "apparent_power": (0.0, 10_000.0),
+    "power_factor": (-1.0, 1.0),
+    "energy": (0.0, 10_000.0),             # kWh / okuma
+    "leakage_current": (0.0, 100.0),       # A
+    "temperature": (-50.0, 200.0),         # °C
+}
+
+MAX_REPORTED_ERRORS = 1000
+REQUIRED_COLUMNS = ("breaker_id", "timestamp")
+
+
+class BatchValidationError(ValueError):
+    def __init__(self, errors: List[dict], invalid_rows: int):
+        self.errors = errors
+        self.invalid_rows = invalid_rows
+        super().__init__(f"{invalid_rows} geçersiz satır")
+
+
+def column_length(columns: dict) -> int:
+    """Kolon sözlüğünün satır sayısı.
+
+    Zorunlu kolon eksikse, bir alan dizi değilse ya da uzunluklar farklıysa ValueError;
+    bilinmeyen anahtarlar yok sayılır (from_columns da okumaz).
+    """
+    flat = {k: v for k, v in columns.items() if k != "metrics"}
+    if isinstance(columns.get("metrics"), dict):
+        flat.update(columns["metrics"])
+    missing = [c for c in REQUIRED_COLUMNS if c not in flat]
+    if missing:
+        raise ValueError(f"Eksik kolon: {', '.join(missing)}")
+    lengths = {}
+    for name in REQUIRED_COLUMNS + METRIC_FIELDS:
+        if name not in flat:
+            continue
+        values = flat[name]
+        if isinstance(values, (str, bytes, dict)) or not hasattr(values, "__len__"):
+            raise ValueError(f"'{name}' kolonu dizi değil")
+        lengths[name] = len(values)
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"Kolon uzunlukları farklı: {lengths}")
+    return lengths["breaker_id"]
+
+
+def _parse_timestamps(values) -> np.ndarray:
+    # Zaman dilimli değerler UTC'ye çevrilir, saf değerler olduğu gibi kalır
+    parsed = pd.to_datetime(pd.Series(values), errors="coerce", format="ISO8601", utc=True)
+    return parsed.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+
+
+def _to_float(values):
+    """Diziyi float64'e çevirir; sayıya çevrilemeyen (boş olmayan) girdilerin maskesini de döndürür."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "fiub":
+        return arr.astype(np.float64, copy=False), None
+    series = pd.Series(arr, dtype=object)
+    out = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+    bad = np.isnan(out) & series.notna().to_numpy()
+    return out, (bad if bad.any() else None)
+
+
+_is_str = np.frompyfunc(lambda v: isinstance(v, str), 1, 1)
+
+
+class _MetricsView:
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch, i):
+        self._batch = batch
+        self._i = i
+
+    def __getattr__(self, name):
+        try:
+            return float(self._batch.metrics[name][self._i])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def model_dump(self) -> dict:
+        return {f: float(self._batch.metrics[f][self._i]) for f in METRIC_FIELDS}
+
+
+class MeasurementRow:
+    """Tek satırlık hafif görünüm; veri kopyalanmaz, RawMeasurement gibi okunur."""
+    __slots__ = ("_batch", "_i")
+
+    def __init__(self, batch, i: int):
+        self._batch = batch
+        self._i = i
+
+    @property
+    def breaker_id(self) -> str:
+        return self._batch.breaker_id[self._i]
+
+    @property
+    def timestamp(self) -> pd.Timestamp:
+        return pd.Timestamp(self._batch.timestamp[self._i])
+
+    @property
+    def metrics(self) -> _MetricsView:
+        return _MetricsView(self._batch, self._i)
+
+    def to_model(self) -> RawMeasurement:
+        return RawMeasurement(timestamp=self.timestamp.to_pydatetime(), breaker_id=self.breaker_id,
+                              metrics=self.metrics.model_dump())
+
+    def __repr__(self):
+        return f"MeasurementRow({self.breaker_id!r}, {self.timestamp.isoformat()})"
+
+
+class MeasurementBatch:
+    __slots__ = ("breaker_id", "timestamp", "metrics", "parse_errors")
+
+    def __init__(self, breaker_id, timestamp, metrics: dict, parse_errors: dict = None):
+        self.breaker_id = np.asarray(breaker_id, dtype=object)
+        self.timestamp = np.asarray(timestamp, dtype="datetime64[ns]")
+        n = len(self.breaker_id)
+        # Eksik metrikler NaN olarak tutulur
+        self.metrics = {
+            f: np.asarray(metrics[f], dtype=np.float64) if f in metrics else np.full(n, np.nan)
+            for f in METRIC_FIELDS
+        }
+        # alan -> çözümlenemeyen satırların maskesi (zaman damgası / sayı olmayan değer)
+        self.parse_errors = parse_errors or {}
+
+    # ----- oluşturma -----
+    @classmethod
+    def from_columns(cls, columns: dict) -> "MeasurementBatch":
+        """{alan: dizi} sözlüğünden; metrikler düz ya da ``metrics`` altında olabilir.
+
+        breaker_id/timestamp eksikse ya da kolon uzunlukları farklıysa ValueError.
+        """
+        column_length(columns)
+        columns = dict(columns)
+        nested = columns.pop("metrics", None)
+        if isinstance(nested, dict):
+            columns.update(nested)
+        parse_errors = {}
+        ts = columns["timestamp"]
+        if isinstance(ts, np.ndarray) and ts.dtype.kind == "M":
+            timestamp = ts.astype("datetime64[ns]", copy=False)
+        else:
+            timestamp = _parse_timestamps(ts)
+            raw = pd.Series(ts, dtype=object)
+            bad = np.isnat(timestamp) & raw.notna().to_numpy()
+            if bad.any():
+                parse_errors["timestamp"] = bad
+        metrics = {}
+        for f in METRIC_FIELDS:
+            if f in columns:
+                metrics[f], bad = _to_float(columns[f])
+                if bad is not None:
+                    parse_errors[f] = bad
+        ids = np.asarray(columns["breaker_id"], dtype=object)
+        return cls(ids, timestamp, metrics, parse_errors)
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "MeasurementBatch":
+        """sample.json'daki düz satırlar ya da RawMeasurement biçimindeki iç içe sözlükler.
+
+        Nesne olmayan satırlar (ya da nesne olmayan ``metrics``) satır numaralarıyla
+        BatchValidationError olarak bildirilir.
+        """
+        if not isinstance(records, list):
+            raise ValueError("Satır listesi ya da kolon sözlüğü bekleniyor")
+        if not records:
+            return cls([], [], {})
+        bad = [i for i, r in enumerate(records)
+               if not isinstance(r, dict) or not isinstance(r.get("metrics") or {}, dict)]
+        if bad:
+            errors = []
+            for i in bad[:MAX_REPORTED_ERRORS]:
+                row = records[i]
+                if isinstance(row, dict):
+                    errors.append({"row": i, "field": "metrics", "value": None, "error": "metrics nesne değil"})
+                else:
+                    value = row if row is None or isinstance(row, (str, int, float, bool)) else None
+                    errors.append({"row": i, "field": None, "value": value, "error": "satır nesne değil"})
+            raise BatchValidationError(errors, len(bad))
+        if "metrics" in records[0]:
+            metrics = pd.DataFrame([r.get("metrics") or {} for r in records])
+            columns = {c: metrics[c].to_numpy() for c in metrics.columns if c in LIMITS}
+            columns["breaker_id"] = [r.get("breaker_id") for r in records]
+            columns["timestamp"] = [r.get("timestamp") for r in records]
+            return cls.from_columns(columns)
+        frame = pd.DataFrame(records)
+        columns = {c: frame[c].to_numpy() for c in frame.columns}
+        # Hiçbir satırda olmayan zorunlu alan satır bazında "eksik" olarak raporlanır
+        for c in REQUIRED_COLUMNS:
+            columns.setdefault(c, [None] * len(records))
+        return cls.from_columns(columns)
+
+    @classmethod
+    def from_json(cls, data) -> "MeasurementBatch":
+        """JSON metni/baytları: satır listesi ya da {alan: [değerler]} kolon sözlüğü."""
+        parsed = json.loads(data)
+        if isinstance(parsed, dict):
+            return cls.from_columns(parsed)
+        return cls.from_records(parsed)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "MeasurementBatch":
+        """float64 / datetime64[ns] kolonlar kopyalanmadan alınır."""
+        return cls.from_columns({c: df[c].to_numpy() for c in df.columns})
+
+    @classmethod
+    def from_models(cls, models: Iterable[RawMeasurement]) -> "MeasurementBatch":
+        models = list(models)
+        return cls(
+            [m.breaker_id for m in models],
+            _parse_timestamps([m.timestamp for m in models]),
+            {f: np.fromiter((getattr(m.metrics, f) for m in models), np.float64, len(models)) for f in METRIC_FIELDS},
+        )
+
+    @classmethod
+    def concat(cls, batches: List["MeasurementBatch"]) -> "MeasurementBatch":
+        if len(batches) == 1:
+            return batches[0]
+        parse_errors = {}
+        for f in {f for b in batches for f in b.parse_errors}:
+            parse_errors[f] = np.concatenate([b.parse_errors.get(f, np.zeros(len(b), bool)) for b in batches])
+        return cls(
+            np.concatenate([b.breaker_id for b in batches]),
+            np.concatenate([b.timestamp for b in batches]),
+            {f: np.concatenate([b.metrics[f] for b in batches]) for f in METRIC_FIELDS},
+            parse_errors,
+        )
+
+    # ----- erişim -----
+    def __len__(self) -> int:
+        return len(self.breaker_id)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            i = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= i < len(self):
+                raise IndexError(key)
+            return MeasurementRow(self, i)
+        return MeasurementBatch(
+            self.breaker_id[key], self.timestamp[key], {f: v[key] for f, v in self.metrics.items()},
+            {f: m[key] for f, m in self.parse_errors.items()},
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield MeasurementRow(self, i)
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """breaker_id, timestamp ve metrik kolonlarıyla düz DataFrame (metrikler kopyalanmaz)."""
+        columns = METRIC_FIELDS if columns is None else columns
+        data = {"breaker_id": self.breaker_id, "timestamp": self.timestamp}
+        data.update({c: self.metrics[c] for c in columns})
+        return pd.DataFrame(data, copy=False)
+
+    def to_json_lines(self) -> bytes:
+        """Satır başına bir düz JSON kaydı (segment log biçimi)."""
+        if not len(self):
+            return b""
+        text = self.to_frame().to_json(orient="records", lines=True, date_format="iso",
+                                      date_unit="us", double_precision=15)
+        return (text if text.endswith("\n") else text + "\n").encode()
+
+    # ----- doğrulama -----
+    def check(self, required: Iterable[str] = ()):
+        """Vektörel doğrulama. (geçerli satır maskesi, hata listesi) döndürür.
+
+        Hatalar {"row", "field", "value", "error"} sözlükleridir; en fazla
+        MAX_REPORTED_ERRORS tanesi raporlanır. Eksik (NaN) metrikler yalnızca
+        ``required`` içindeyse hata sayılır.
+        """
+        n = len(self)
+        required = set(required)
+        problems = []  # (alan, maske, mesaj)
+
+        for f, mask in self.parse_errors.items():
+            problems.append((f, mask, "çözümlenemeyen değer"))
+        ids_bad = pd.isna(self.breaker_id) | (self.breaker_id == "")
+        if ids_bad.any():
+            problems.append(("breaker_id", ids_bad, "breaker_id boş"))
+        # /ingest (RawMeasurement) ile aynı kural: breaker_id metin olmalı
+        ids_type = ~ids_bad & ~_is_str(self.breaker_id).astype(bool)
+        if ids_type.any():
+            problems.append(("breaker_id", ids_type, "breaker_id metin değil"))
+        ts_missing = np.isnat(self.timestamp) & ~self.parse_errors.get("timestamp", np.zeros(n, bool))
+        if ts_missing.any():
+            problems.append(("timestamp", ts_missing, "zaman damgası eksik"))
+
+        for f in METRIC_FIELDS:
+            values = self.metrics[f]
+            nan = np.isnan(values)
+            if f in required and nan.any():
+                problems.append((f, nan & ~self.parse_errors.get(f, np.zeros(n, bool)), "değer eksik"))
+            inf = np.isinf(values)
+            if inf.any():
+                problems.append((f, inf, "sonsuz değer"))
+            lo, hi = LIMITS[f]
+            with np.errstate(invalid="ignore"):
+                out = ((values < lo) | (values > hi)) & ~inf
+            if out.any():
+                problems.append((f, out, f"aralık dışında [{lo}, {hi}]"))
+
+        valid = np.ones(n, dtype=bool)
+        errors = []
+        for f, mask, message in problems:
+            valid &= ~mask
+            for i in np.flatnonzero(mask)[:MAX_REPORTED_ERRORS - len(errors)]:
+                if f == "breaker_id":
+                    value = self.breaker_id[i]
+                elif f == "timestamp":
+                    value = None if np.isnat(self.timestamp[i]) else str(self.timestamp[i])
+                else:
+                    value = None if np.isnan(self.metrics[f][i]) else float(self.metrics[f][i])
+                errors.append({"row": int(i), "field": f, "value": value, "error": message})
+        errors.sort(key=lambda e: e["row"])
+        return valid, errors
+
+    def validated(self, required: Iterable[str] = (), drop_invalid: bool = False) -> "MeasurementBatch":
+        """Geçersiz satır varsa BatchValidationError fırlatır (drop_invalid=True ise onları atar)."""
+        valid, errors = self.check(required)
+        if valid.all():
+            return self
+        if drop_invalid:
+            return self[valid]
+        raise BatchValidationError(errors, int((~valid).sum()))
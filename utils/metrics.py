@@ -0,0 +1,284 @@
+"""Hafif süreç içi metrikler (sayaç, gösterge, histogram) ve Prometheus metin çıktısı.
+
+Harici bağımlılık yoktur; FastAPI uygulamaları ``render()`` çıktısını /metrics altında sunar.
+HTTP sunucusu olmayan süreçler (Streamlit arayüzü) ``serve()`` ile ayrı bir portta sunar.
+Ayrıca üretimde çalışırken açılıp kapatılabilen örneklemeli bir profiler içerir.
+"""
+import bisect
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    # Prometheus metin biçimi: etiket değerlerinde \, " ve satır sonu kaçışlanır
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self._values = collections.defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] += amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            for key, v in self._values.items():
+                yield f"{self.name}{_format_labels(key)} {v}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self._values = {}
+        self._callback = callback  # render anında okunacak değer (örn. kuyruk derinliği)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_callback(self, callback):
+        self._callback = callback
+
+    def render(self):
+        yield from super().render()
+        if self._callback is not None:
+            yield f"{self.name} {float(self._callback())}"
+        with self._lock:
+            for key, v in self._values.items():
+                yield f"{self.name}{_format_labels(key)} {v}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket sayıları, toplam, adet]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield from super().render()
+        with self._lock:
+            for key, (counts, total, n) in self._series.items():
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    yield f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {cumulative}"
+                yield f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {n}"
+                yield f"{self.name}_sum{_format_labels(key)} {total}"
+                yield f"{self.name}_count{_format_labels(key)} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text, callback=None) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, callback=callback)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
+
+
+# ----- Ayrı portta /metrics -----
+METRICS_PORT = int(os.getenv("APP_METRICS_PORT", "9108"))
+_server = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """REGISTRY'yi arka plan thread'inde http://host:port/metrics altında sunar.
+
+    Süreç başına bir kez başlar; tekrar çağrılar (Streamlit her etkileşimde betiği yeniden
+    çalıştırır) mevcut sunucuyu döndürür. Port doluysa uyarı basılır ve None döner.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Metrik sunucusu başlatılamadı (port {port}): {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def timed(hist: Histogram, **labels):
+    """Fonksiyonun süresini verilen histograma yazan dekoratör."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with hist.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----- Örneklemeli profiler -----
+class SamplingProfiler:
+    """Belirli aralıklarla tüm thread'lerin yığınını örnekler (collapsed stack biçimi).
+
+    Yeniden deploy gerektirmeden HTTP üzerinden açılıp kapatılabilir; kapalıyken maliyeti yoktur.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks = collections.Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = None):
+        if self.running:
+            return
+        if interval:
+            self.interval = interval
+        self._stacks.clear()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.collapsed()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = traceback.extract_stack(frame, limit=self.max_depth)
+                key = ";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})" for f in stack)
+                self._stacks[key] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        # flamegraph.pl / speedscope ile açılabilen "yığın sayı" satırları
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+
+profiler = SamplingProfiler()
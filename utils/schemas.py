@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Dict, List
 from datetime import datetime
 
 class Metrics(BaseModel):
@@ -17,3 +17,10 @@ class RawMeasurement(BaseModel):
     timestamp: datetime = Field(...)
     breaker_id: str
     metrics: Metrics
+
+class AnalysisResult(BaseModel):
+    billing: Dict[str, Dict[str, float]] = {}
+    predict_result: Dict = {}
+    faults: Dict[str, List[str]] = {}
+    leakage_result: Dict[str, List[str]] = {}
+    rows: int = 0
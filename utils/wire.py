@@ -0,0 +1,166 @@
+"""Yüksek frekanslı telemetri için ikili çerçeve biçimi (Content-Type: application/x-kilowizard-frame).
+
+Çerçeve düzeni (little-endian, bölümler 8 bayta hizalı):
+
+    başlık     "<4sBBHIIq": b"KWF1", sürüm, bayraklar, alan sayısı, satır sayısı,
+               breaker sözlüğü boyutu, taban zaman damgası (µs, epoch)
+    alanlar    alan sayısı × u8        METRIC_FIELDS indeksleri (gönderilen metrikler)
+    sözlük     her breaker için u16 uzunluk + UTF-8 ad
+    id         satır sayısı × u8/u16/u32   sözlük indeksi
+    zaman      satır sayısı × int32/int64  önceki satıra göre fark (µs); ilk satır tabana göre
+    değerler   satır sayısı × alan sayısı × float32/float64 (satır düzeninde kayıtlar)
+
+Bayraklar: bit0 float32 değerler, bit1 int64 zaman farkları, bit2-3 id genişliği
+(0: u8, 1: u16, 2: u32). Eksik metrikler NaN olarak gönderilir.
+
+Çözme satır başına Python nesnesi üretmez: her bölüm ``np.frombuffer`` ile okunur ve
+doğrudan MeasurementBatch dizilerine dönüşür. Yalnızca breaker sözlüğü (farklı breaker
+sayısı kadar) Python'da çözülür. msgpack kuruluysa ``application/msgpack`` gövdeleri de
+({alan: [değerler]} kolon sözlüğü) kabul edilir.
+"""
+import struct
+from typing import Iterable, Optional
+
+import numpy as np
+
+from utils.batch import METRIC_FIELDS, MeasurementBatch
+
+try:
+    import msgpack
+except ImportError:  # msgpack yoksa yalnızca ikili çerçeve ve JSON
+    msgpack = None
+
+
+CONTENT_TYPE = "application/x-kilowizard-frame"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+MAGIC = b"KWF1"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBHIIq")
+
+FLAG_FLOAT32 = 0x01
+FLAG_TS64 = 0x02
+_ID_WIDTHS = (np.uint8, np.uint16, np.uint32)
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+# ----- kodlama (istemci tarafı) -----
+def encode(batch: MeasurementBatch, fields: Optional[Iterable[str]] = None, float32: bool = True) -> bytes:
+    """MeasurementBatch'i tek çerçeveye kodlar; fields verilmezse tüm metrikler gönderilir."""
+    fields = list(fields) if fields is not None else list(METRIC_FIELDS)
+    n = len(batch)
+    names, index = np.unique(batch.breaker_id.astype(str), return_inverse=True)
+    id_code = 0 if len(names) <= 0xFF else 1 if len(names) <= 0xFFFF else 2
+
+    if np.isnat(batch.timestamp).any():
+        raise ValueError("Zaman damgası eksik satır kodlanamaz")
+    ts_us = batch.timestamp.astype("datetime64[us]").view(np.int64)
+    base = int(ts_us[0]) if n else 0
+    deltas = np.diff(ts_us, prepend=base)
+    ts64 = bool(n) and (deltas.min() < -2**31 or deltas.max() >= 2**31)
+
+    flags = (FLAG_FLOAT32 if float32 else 0) | (FLAG_TS64 if ts64 else 0) | (id_code << 2)
+    parts = [_HEADER.pack(MAGIC, VERSION, flags, len(fields), n, len(names), base),
+             bytes(METRIC_FIELDS.index(f) for f in fields)]
+    for name in names.tolist():
+        raw = name.encode()
+        parts.append(struct.pack("<H", len(raw)) + raw)
+    parts.append(index.astype(_ID_WIDTHS[id_code]).tobytes())
+
+    body = b"".join(parts)
+    chunks = [body, b"\0" * _pad(len(body))]
+    chunks.append(deltas.astype(np.int64 if ts64 else np.int32).tobytes())
+    chunks.append(b"\0" * _pad(sum(len(c) for c in chunks)))
+    values = np.column_stack([batch.metrics[f] for f in fields]) if fields else np.empty((n, 0))
+    chunks.append(values.astype(np.float32 if float32 else np.float64).tobytes())
+    return b"".join(chunks)
+
+
+# ----- çözme (collector tarafı) -----
+def _header(view) -> tuple:
+    if len(view) < _HEADER.size:
+        raise ValueError("Çerçeve başlığı eksik")
+    magic, version, *rest = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Tanınmayan çerçeve (sihirli bayt/sürüm)")
+    return tuple(rest)
+
+
+def layout(data: bytes) -> dict:
+    """Çerçevenin alanları ve değer hassasiyeti; bölünen çerçeve aynı düzenle yeniden kodlanır."""
+    flags, n_fields, *_ = _header(memoryview(data))
+    fields = bytes(data[_HEADER.size:_HEADER.size + n_fields])
+    if len(fields) != n_fields or any(i >= len(METRIC_FIELDS) for i in fields):
+        raise ValueError("Bilinmeyen metrik alanı")
+    return {"fields": [METRIC_FIELDS[i] for i in fields], "float32": bool(flags & FLAG_FLOAT32)}
+
+
+def decode(data: bytes) -> MeasurementBatch:
+    """Çerçeveyi kolon dizilerine çözer; bozuk çerçevede ValueError."""
+    view = memoryview(data)
+    flags, n_fields, n, n_ids, base = _header(view)
+    id_code = (flags >> 2) & 0x3
+    if id_code >= len(_ID_WIDTHS):
+        raise ValueError("Geçersiz id genişliği")
+    pos = _HEADER.size
+
+    field_idx = np.frombuffer(view, np.uint8, n_fields, pos)
+    if (field_idx >= len(METRIC_FIELDS)).any():
+        raise ValueError("Bilinmeyen metrik alanı")
+    fields = [METRIC_FIELDS[i] for i in field_idx.tolist()]
+    pos += n_fields
+
+    names = []
+    for _ in range(n_ids):
+        if pos + 2 > len(view):
+            raise ValueError("Breaker sözlüğü eksik")
+        (length,) = struct.unpack_from("<H", view, pos)
+        pos += 2
+        names.append(bytes(view[pos:pos + length]).decode())
+        pos += length
+
+    id_dtype = _ID_WIDTHS[id_code]
+    index = np.frombuffer(view, id_dtype, n, pos)
+    pos += n * np.dtype(id_dtype).itemsize
+    if n and int(index.max()) >= n_ids:
+        raise ValueError("Sözlük dışı breaker indeksi")
+    pos += _pad(pos)
+
+    ts_dtype = np.int64 if flags & FLAG_TS64 else np.int32
+    deltas = np.frombuffer(view, ts_dtype, n, pos)
+    pos += n * np.dtype(ts_dtype).itemsize
+    pos += _pad(pos)
+
+    value_dtype = np.float32 if flags & FLAG_FLOAT32 else np.float64
+    expected = pos + n * n_fields * np.dtype(value_dtype).itemsize
+    if len(view) != expected:
+        raise ValueError(f"Çerçeve boyutu uyuşmuyor ({len(view)} != {expected})")
+    values = np.frombuffer(view, value_dtype, n * n_fields, pos).reshape(n, n_fields)
+
+    ts_us = base + np.cumsum(deltas, dtype=np.int64)
+    breaker_ids = np.array(names, dtype=object)[index] if n else np.array([], dtype=object)
+    metrics = {f: values[:, i].astype(np.float64) for i, f in enumerate(fields)}
+    return MeasurementBatch(breaker_ids, ts_us.astype("datetime64[us]").astype("datetime64[ns]"), metrics)
+
+
+def decode_msgpack(data: bytes) -> MeasurementBatch:
+    if msgpack is None:
+        raise UnsupportedFormat("msgpack kurulu değil")
+    return MeasurementBatch.from_columns(msgpack.unpackb(data, timestamp=3))
+
+
+def decode_body(data: bytes, content_type: Optional[str]) -> MeasurementBatch:
+    """/ingest/batch gövdesi: Content-Type'a göre ikili çerçeve, msgpack ya da JSON."""
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media == CONTENT_TYPE:
+        return decode(data)
+    if media == MSGPACK_CONTENT_TYPE:
+        return decode_msgpack(data)
+    return MeasurementBatch.from_json(data)